@@ -1,7 +1,9 @@
 import requests
+from typing import Dict, Iterator, List
 
 from kaapanapy.settings import OpensearchSettings
 from opensearchpy import OpenSearch
+from opensearchpy.exceptions import OpenSearchException
 
 
 def get_opensearch_client(access_token=None):
@@ -44,3 +46,168 @@ def get_project_user_access_token():
     r = requests.post(url, verify=False, data=payload)
     access_token = r.json()["access_token"]
     return access_token
+
+
+def iter_opensearch_query(
+    os_client,
+    query: Dict = {"match_all": {}},
+    source=dict(),
+    index: str = "meta-index",
+    sort: List = [{"0020000E SeriesInstanceUID_keyword.keyword": "desc"}],
+    page_size: int = 1000,
+    max_hits: int = None,
+    keep_alive: str = "2m",
+) -> Iterator[Dict]:
+    """
+    Lazily yield all hits of a query.
+
+    Opensearch limits a single search to 10000 hits.
+    This generator fetches the hits page by page with 'search_after' on a point in time (PIT),
+    so the results are a consistent snapshot of the index and at most one page is held in memory.
+    If no PIT can be created, pages are requested from the live index instead.
+
+    :param os_client: Opensearch client.
+    :param query: Query to execute.
+    :param source: Opensearch _source parameter, e.g. {"includes": [...]} to project fields.
+    :param index: Index on which to execute the query.
+    :param sort: Sort order, must be unique per document to paginate correctly.
+    :param page_size: Number of hits requested per page.
+    :param max_hits: Raise a ValueError if the query returns more hits.
+    :param keep_alive: How long the PIT is kept alive between two pages.
+    """
+    try:
+        pit_id = os_client.create_pit(index=index, keep_alive=keep_alive)["pit_id"]
+    except OpenSearchException:
+        pit_id = None
+
+    try:
+        search_after = None
+        hit_count = 0
+        while True:
+            body = {
+                "query": query,
+                "size": page_size,
+                "_source": source,
+                "sort": sort,
+                **({"search_after": search_after} if search_after else {}),
+            }
+            if pit_id:
+                body["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+                res = os_client.search(body=body)
+            else:
+                res = os_client.search(body=body, index=index)
+            hits = res["hits"]["hits"]
+            if not hits:
+                return
+            hit_count += len(hits)
+            if max_hits is not None and hit_count > max_hits:
+                raise ValueError(f"Query returned more than {max_hits} hits")
+            yield from hits
+            if len(hits) < page_size:
+                return
+            search_after = hits[-1]["sort"]
+    finally:
+        if pit_id:
+            try:
+                os_client.delete_pit(body={"pit_id": [pit_id]})
+            except OpenSearchException:
+                pass
+
+
+# Applies a tag delta to the current tags of a document within OpenSearch
+TAGGING_SCRIPT = """
+def current = ctx._source[params.field];
+Set tags = new LinkedHashSet();
+if (current instanceof List) {
+    tags.addAll(current);
+} else if (current != null) {
+    tags.add(current);
+}
+tags.addAll(params.tags);
+tags.removeAll(params.tags2delete);
+tags.addAll(params.tags2add);
+List updated = new ArrayList(tags);
+if (current instanceof List && updated.equals(current)) {
+    ctx.op = 'noop';
+} else {
+    ctx._source[params.field] = updated;
+}
+"""
+
+
+def update_tags(
+    os_client,
+    tag_updates: List[Dict],
+    index: str = "meta-index",
+    tag_field: str = "00000000 Tags_keyword",
+    batch_size: int = 1000,
+    max_conflict_retries: int = 3,
+) -> Dict:
+    """
+    Apply tag deltas to series documents with scripted _bulk updates.
+
+    The final tags of a series are its current tags and 'tags', without 'tags2delete', plus 'tags2add'.
+    They are computed by a painless script within OpenSearch, so the current tags are not read by the client.
+    OpenSearch writes each update only if the seq_no and primary_term of the document are unchanged since the script read it.
+    Updates failing with a version conflict are sent again, at most max_conflict_retries times.
+
+    :param os_client: Opensearch client.
+    :param tag_updates: List of {"series_instance_uid", "tags", "tags2add", "tags2delete"}, the lists are optional.
+    :param index: Index of the series documents.
+    :param tag_field: Field of the documents containing the tags.
+    :param batch_size: Number of updates sent with one _bulk request.
+    :param max_conflict_retries: Number of times updates failing with a version conflict are sent again.
+    :return: {"updated": int, "noop": int, "errors": [{"series_instance_uid", "error"}]}
+    """
+    result = {"updated": 0, "noop": 0, "errors": []}
+    pending = list(tag_updates)
+    for attempt in range(max_conflict_retries + 1):
+        conflicts = []
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+            body = []
+            for tag_update in batch:
+                body.append(
+                    {
+                        "update": {
+                            "_index": index,
+                            "_id": tag_update["series_instance_uid"],
+                        }
+                    }
+                )
+                body.append(
+                    {
+                        "script": {
+                            "source": TAGGING_SCRIPT,
+                            "lang": "painless",
+                            "params": {
+                                "field": tag_field,
+                                "tags": tag_update.get("tags") or [],
+                                "tags2add": tag_update.get("tags2add") or [],
+                                "tags2delete": tag_update.get("tags2delete") or [],
+                            },
+                        }
+                    }
+                )
+            res = os_client.bulk(body=body)
+            for tag_update, item in zip(batch, res["items"]):
+                item = item["update"]
+                error = item.get("error")
+                if error is None:
+                    result["noop" if item.get("result") == "noop" else "updated"] += 1
+                elif (
+                    error.get("type") == "version_conflict_engine_exception"
+                    and attempt < max_conflict_retries
+                ):
+                    conflicts.append(tag_update)
+                else:
+                    result["errors"].append(
+                        {
+                            "series_instance_uid": tag_update["series_instance_uid"],
+                            "error": error.get("reason", error.get("type")),
+                        }
+                    )
+        if not conflicts:
+            break
+        pending = conflicts
+    return result
@@ -12,6 +12,7 @@ from airflow.models import BaseOperator, Variable
 from airflow.sensors.base_sensor_operator import BaseSensorOperator
 from airflow.executors.base_executor import BaseExecutor
 from kaapana.blueprints.kaapana_api import kaapanaApi
+from kaapana.blueprints import kaapana_listener
 from kaapana import operators
 
 
@@ -150,3 +151,4 @@ class AirflowTestPlugin(AirflowPlugin):
     menu_links = []  # [base, meta, pacs]
     appbuilder_views = []  # [v_appbuilder_package,jip_dags_appbuilder_package]
     appbuilder_menu_items = [appbuilder_mitem]
+    listeners = [kaapana_listener]
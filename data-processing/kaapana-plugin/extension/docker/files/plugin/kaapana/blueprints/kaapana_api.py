@@ -17,10 +17,11 @@ from airflow.utils import timezone
 from flask import Blueprint, request, jsonify, Response
 from flask import current_app as app
 
-from sqlalchemy import and_
+from sqlalchemy import and_, tuple_
 from sqlalchemy.orm.exc import NoResultFound
 
 from kaapana.blueprints.kaapana_global_variables import SERVICES_NAMESPACE
+from kaapana.blueprints.kaapana_trigger import trigger_dag_runs as trigger_bulk
 from kaapana.blueprints.kaapana_utils import (
     generate_run_id,
     generate_minio_credentials,
@@ -35,12 +36,23 @@ Represents a blueprint kaapanaApi
 """
 kaapanaApi = Blueprint("kaapana", __name__, url_prefix="/kaapana")
 
+_dagbag = None
 
-@csrf.exempt
-@kaapanaApi.route("/api/trigger/<string:dag_id>", methods=["POST"])
-def trigger_dag(dag_id):
+
+def get_dagbag():
+    """
+    DagBag backed by the serialized-DAG table, as used by the Airflow webserver.
+    DAGs are deserialized on first access and only reloaded once their serialized version changed,
+    so requests do not re-parse the DAG files.
+    """
+    global _dagbag
+    if _dagbag is None:
+        _dagbag = DagBag(read_dags_from_db=True, load_op_links=False)
+    return _dagbag
+
+
+def get_trigger_conf(data):
     # headers = dict(request.headers)
-    data = request.get_json(force=True)
     # username = headers["X-Forwarded-Preferred-Username"] if "X-Forwarded-Preferred-Username" in headers else "unknown"
     if "conf" in data:
         tmp_conf = data["conf"]
@@ -64,6 +76,14 @@ def trigger_dag(dag_id):
         tmp_conf["workflow_form"] = tmp_conf["form_data"]
 
     ################################################################################################
+    return tmp_conf
+
+
+@csrf.exempt
+@kaapanaApi.route("/api/trigger/<string:dag_id>", methods=["POST"])
+def trigger_dag(dag_id):
+    data = request.get_json(force=True)
+    tmp_conf = get_trigger_conf(data)
 
     run_id = generate_run_id(dag_id)
 
@@ -89,6 +109,57 @@ def trigger_dag(dag_id):
     return response
 
 
+@csrf.exempt
+@kaapanaApi.route("/api/dagruns/trigger", methods=["POST"])
+def trigger_dag_runs():
+    """
+    Create many dag-runs in one database transaction.
+
+    Expects {"dag_runs": [{"dag_id": ..., "conf": {...}, "run_id": optional, "x_auth_token": optional}, ...]}.
+    Returns {"dag_runs": [{"dag_id": ..., "run_id": ...} or {"dag_id": ..., "error": ...}, ...]}
+    in the order of the request.
+    """
+    data = request.get_json(force=True)
+    dag_runs = [
+        {
+            "dag_id": dag_run["dag_id"],
+            "run_id": dag_run.get("run_id"),
+            "conf": get_trigger_conf(
+                {
+                    "conf": dag_run.get("conf") or {},
+                    **{
+                        key: value
+                        for key, value in dag_run.items()
+                        if key == "x_auth_token"
+                    },
+                }
+            ),
+        }
+        for dag_run in data["dag_runs"]
+    ]
+    session = settings.Session()
+    try:
+        results = trigger_bulk(dag_runs, dagbag=get_dagbag(), session=session)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        _log.error(e)
+        response = jsonify(error="{}".format(e))
+        response.status_code = 500
+        return response
+    finally:
+        session.close()
+    _log.info(
+        f"Triggered {sum('run_id' in result for result in results)} of {len(dag_runs)} dag-runs"
+    )
+    return jsonify(
+        dag_runs=[
+            {key: value for key, value in result.items() if key != "dag_run"}
+            for result in results
+        ]
+    )
+
+
 @csrf.exempt
 @kaapanaApi.route("/api/get_dagrun_tasks/<dag_id>/<run_id>", methods=["POST"])
 def get_dagrun_tasks(dag_id, run_id):
@@ -98,11 +169,8 @@ def get_dagrun_tasks(dag_id, run_id):
     - get all tasks including their states of queried dag_run
     - return tasks
     """
-    dag_objects = DagBag().dags  # returns all DAGs available on platform
-    desired_dag = dag_objects[
-        dag_id
-    ]  # filter desired_dag from all available dags via dag_id
     session = settings.Session()
+    desired_dag = get_dagbag().get_dag(dag_id, session=session)
     message = []
 
     task_ids = [
@@ -135,12 +203,8 @@ def get_dagrun_tasks(dag_id, run_id):
 def abort_dag_run(dag_id, run_id):
     # abort dag_run by executing set_dag_run_state_to_failed() (source: https://github.com/apache/airflow/blob/main/airflow/api/common/mark_tasks.py#L421)
 
-    # returns all DAGs available on platform
-    dag_objects = DagBag().dags
-    # filter desired_dag from all available dags via dag_id
-    desired_dag = dag_objects[dag_id]
-
     session = settings.Session()
+    desired_dag = get_dagbag().get_dag(dag_id, session=session)
     dag_runs_of_desired_dag = session.query(DagRun).filter(
         DagRun.dag_id == desired_dag.dag_id
     )
@@ -324,6 +388,76 @@ def getAllDagRuns():
     return jsonify(dagruns)
 
 
+@kaapanaApi.route("/api/dagruns/states", methods=["POST"])
+@csrf.exempt
+def get_dagrun_states():
+    """
+    Return the states of many dag-runs and their task-instances with a single query.
+    Expects {"dag_runs": [[dag_id, run_id], ...]} and responds with a list of
+    {"dag_id", "run_id", "state", "execution_date", "tasks": {task_id: {"state", "execution_date", "duration", "start_date"}}}.
+    Unknown dag-runs are left out of the response.
+    """
+    data = request.get_json(force=True)
+    dag_runs = [tuple(dag_run) for dag_run in data.get("dag_runs", [])]
+    if not dag_runs:
+        return jsonify([])
+
+    session = settings.Session()
+    rows = (
+        session.query(
+            DagRun.dag_id,
+            DagRun.run_id,
+            DagRun.state,
+            DagRun.execution_date,
+            TaskInstance.task_id,
+            TaskInstance.state,
+            TaskInstance.duration,
+            TaskInstance.start_date,
+        )
+        .outerjoin(
+            TaskInstance,
+            and_(
+                TaskInstance.dag_id == DagRun.dag_id,
+                TaskInstance.run_id == DagRun.run_id,
+            ),
+        )
+        .filter(tuple_(DagRun.dag_id, DagRun.run_id).in_(dag_runs))
+        .all()
+    )
+
+    time_format = "%Y-%m-%dT%H:%M:%S"
+    states = {}
+    for (
+        dag_id,
+        run_id,
+        state,
+        execution_date,
+        task_id,
+        ti_state,
+        duration,
+        start_date,
+    ) in rows:
+        dag_run = states.setdefault(
+            (dag_id, run_id),
+            {
+                "dag_id": dag_id,
+                "run_id": run_id,
+                "state": state,
+                "execution_date": execution_date.strftime(time_format),
+                "tasks": {},
+            },
+        )
+        if task_id is not None:
+            dag_run["tasks"][task_id] = {
+                "state": ti_state,
+                "execution_date": str(execution_date),
+                "duration": str(duration),
+                "start_date": str(start_date),
+            }
+
+    return jsonify(list(states.values()))
+
+
 @kaapanaApi.route("/api/getdags", methods=["GET"])
 @csrf.exempt
 def get_dags_endpoint():
@@ -333,7 +467,7 @@ def get_dags_endpoint():
     active_only = request.args.get("active_only")
     session = settings.Session()
 
-    dag_objects = DagBag().dags
+    dagbag = get_dagbag()
     dags = {}
 
     all_dags = list(session.query(DagModel).all())
@@ -345,12 +479,9 @@ def get_dags_endpoint():
             continue
 
         dag_id = dag_dict["dag_id"]
-        if (
-            dag_id in dag_objects
-            and dag_objects[dag_id] is not None
-            and hasattr(dag_objects[dag_id], "default_args")
-        ):
-            default_args = dag_objects[dag_id].default_args
+        dag = dagbag.get_dag(dag_id, session=session)
+        if dag is not None and hasattr(dag, "default_args"):
+            default_args = dag.default_args
             for default_arg in default_args.keys():
                 if default_arg[:3] == "ui_":
                     dag_dict[default_arg] = default_args[default_arg]
@@ -358,10 +489,7 @@ def get_dags_endpoint():
         del dag_dict["_sa_instance_state"]
 
         dags[dag_id] = parse_ui_dict(dag_dict)
-        try:
-            dags[dag_id]["tags"] = dag_objects[dag_id].tags
-        except KeyError as e:
-            dags[dag_id]["tags"] = []
+        dags[dag_id]["tags"] = dag.tags if dag is not None else []
 
     return jsonify(dags)
 
@@ -0,0 +1,133 @@
+"""
+Airflow listener pushing dag-run and task-instance state transitions to the kaapana-backend.
+
+Dag-run hooks run in the scheduler, task-instance hooks in the task processes.
+Both are sent in batches by a background thread, so that neither the scheduler loop
+nor a task waits for the backend. The rest of the batch is sent when the process exits.
+Transitions that cannot be delivered are dropped,
+the periodic sync of the backend reconciles them.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+import requests
+from airflow.listeners import hookimpl
+from airflow.utils.log.logging_mixin import LoggingMixin
+
+from kaapana.blueprints.kaapana_global_variables import SERVICES_NAMESPACE
+
+_log = LoggingMixin().log
+
+AIRFLOW_STATES_URL = f"http://kaapana-backend-service.{SERVICES_NAMESPACE}.svc:5000/client/airflow-states"
+FLUSH_INTERVAL_SECONDS = float(os.getenv("AIRFLOW_STATES_FLUSH_INTERVAL", 0.5))
+MAX_BATCH_SIZE = 500
+TIMEOUT_SECONDS = 5
+
+
+class StateTransitionPublisher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._thread = None
+        os.register_at_fork(after_in_child=self._reset)
+        # also runs in forked processes, with the buffer of the child
+        atexit.register(self.flush)
+
+    def _reset(self):
+        # Threads and held locks are not inherited by forked processes
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._thread = None
+
+    def publish(self, transition: dict):
+        with self._lock:
+            self._buffer.append(transition)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="kaapana-state-publisher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        for i in range(0, len(batch), MAX_BATCH_SIZE):
+            chunk = batch[i : i + MAX_BATCH_SIZE]
+            try:
+                r = requests.post(
+                    AIRFLOW_STATES_URL, json=chunk, timeout=TIMEOUT_SECONDS
+                )
+                r.raise_for_status()
+            except Exception as e:
+                _log.warning(
+                    f"Could not push {len(chunk)} state transitions to the backend: {e}"
+                )
+
+
+publisher = StateTransitionPublisher()
+
+
+def _publish_dag_run(dag_run):
+    publisher.publish(
+        {
+            "dag_id": dag_run.dag_id,
+            "run_id": dag_run.run_id,
+            "state": dag_run.state,
+            # dag-runs of backend jobs must not be taken for service dag-runs
+            "client_job": "client_job_id" in (dag_run.conf or {}),
+            "timestamp": time.time(),
+        }
+    )
+
+
+def _publish_task_instance(task_instance, state):
+    publisher.publish(
+        {
+            "dag_id": task_instance.dag_id,
+            "run_id": task_instance.run_id,
+            "task_id": task_instance.task_id,
+            "state": state,
+            "execution_date": str(task_instance.execution_date),
+            "start_date": str(task_instance.start_date),
+            "duration": str(task_instance.duration),
+            "timestamp": time.time(),
+        }
+    )
+
+
+@hookimpl
+def on_dag_run_running(dag_run, msg):
+    _publish_dag_run(dag_run)
+
+
+@hookimpl
+def on_dag_run_success(dag_run, msg):
+    _publish_dag_run(dag_run)
+
+
+@hookimpl
+def on_dag_run_failed(dag_run, msg):
+    _publish_dag_run(dag_run)
+
+
+@hookimpl
+def on_task_instance_running(previous_state, task_instance, session):
+    _publish_task_instance(task_instance, "running")
+
+
+@hookimpl
+def on_task_instance_success(previous_state, task_instance, session):
+    _publish_task_instance(task_instance, "success")
+
+
+@hookimpl
+def on_task_instance_failed(previous_state, task_instance, session):
+    _publish_task_instance(task_instance, "failed")
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from airflow.models import DagBag, DagRun
+from airflow.utils import timezone
+from airflow.utils.session import NEW_SESSION, provide_session
+from airflow.utils.state import DagRunState
+from airflow.utils.types import DagRunType
+
+
+@provide_session
+def trigger_dag_runs(dag_runs, dagbag=None, session=NEW_SESSION):
+    """
+    Create a queued dag-run for every {"dag_id", "conf", "run_id"} in dag_runs within one transaction.
+
+    run_id is optional and generated in the format of kaapana_utils.generate_run_id().
+    Every dag-run is created in a savepoint, so that a failing one does not affect the others.
+    Returns {"dag_id", "run_id", "dag_run"} or {"dag_id", "error"} for every element of dag_runs.
+    """
+    if dagbag is None:
+        dagbag = DagBag(read_dags_from_db=True, load_op_links=False)
+    results = []
+    execution_date = None
+    for dag_run in dag_runs:
+        dag_id = dag_run["dag_id"]
+        # execution dates have to be unique per dag, so they strictly increase within a batch
+        now = timezone.utcnow()
+        execution_date = (
+            now
+            if execution_date is None or now > execution_date
+            else execution_date + timedelta(microseconds=1)
+        )
+        run_id = dag_run.get("run_id") or "{}-{}".format(
+            dag_id, execution_date.strftime("%y%m%d%H%M%S%f")
+        )
+        try:
+            dag = dagbag.get_dag(dag_id, session=session)
+            if dag is None:
+                raise ValueError(f"Dag {dag_id} could not be found")
+            min_dag_start_date = (dag.default_args or {}).get("start_date")
+            if min_dag_start_date and execution_date < min_dag_start_date:
+                raise ValueError(
+                    f"The execution date {execution_date} is before the start date {min_dag_start_date} of {dag_id}"
+                )
+            if DagRun.find_duplicate(
+                dag_id=dag_id,
+                run_id=run_id,
+                execution_date=execution_date,
+                session=session,
+            ):
+                raise ValueError(f"Dag-run {run_id} of {dag_id} already exists")
+            with session.begin_nested():
+                triggered_dag_run = dag.create_dagrun(
+                    run_id=run_id,
+                    run_type=DagRunType.MANUAL,
+                    execution_date=execution_date,
+                    data_interval=dag.timetable.infer_manual_data_interval(
+                        run_after=execution_date
+                    ),
+                    state=DagRunState.QUEUED,
+                    conf=dag_run.get("conf"),
+                    external_trigger=True,
+                    dag_hash=dagbag.dags_hash.get(dag_id),
+                    session=session,
+                )
+        except Exception as e:
+            results.append({"dag_id": dag_id, "error": f"{e}"})
+            continue
+        results.append(
+            {"dag_id": dag_id, "run_id": run_id, "dag_run": triggered_dag_run}
+        )
+    return results
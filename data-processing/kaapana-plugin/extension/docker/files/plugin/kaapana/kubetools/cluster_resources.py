@@ -0,0 +1,410 @@
+import logging
+import re
+import threading
+import time
+import uuid
+from decimal import Decimal
+from functools import lru_cache
+
+# Pods in these phases do not hold resources of their node anymore
+TERMINATED_POD_PHASES = ("Succeeded", "Failed")
+POD_FIELD_SELECTOR = "status.phase!=Succeeded,status.phase!=Failed"
+GPU_RESOURCE = "nvidia.com/gpu"
+# Watches are restarted from the last resourceVersion after this time
+WATCH_TIMEOUT_SECONDS = 300
+WATCH_RETRY_SECONDS = 5
+# Pods of admitted tasks carry their reservation id, which is released once the pod is bound to its node
+RESERVATION_LABEL = "kaapana-reservation"
+# Reservations of tasks that never created a pod
+RESERVATION_TIMEOUT_SECONDS = 300
+
+QUANTITY_SUFFIXES = {
+    "Ki": Decimal(1024),
+    "Mi": Decimal(1024**2),
+    "Gi": Decimal(1024**3),
+    "Ti": Decimal(1024**4),
+    "Pi": Decimal(1024**5),
+    "Ei": Decimal(1024**6),
+    "n": Decimal("1e-9"),
+    "u": Decimal("1e-6"),
+    "m": Decimal("1e-3"),
+    "": Decimal(1),
+    "k": Decimal("1e3"),
+    "M": Decimal("1e6"),
+    "G": Decimal("1e9"),
+    "T": Decimal("1e12"),
+    "P": Decimal("1e15"),
+    "E": Decimal("1e18"),
+}
+QUANTITY_PATTERN = re.compile(r"^([+-]?[0-9.]+(?:[eE][+-]?[0-9]+)?)([a-zA-Z]*)$")
+
+
+@lru_cache(maxsize=1024)
+def parse_quantity(quantity, scale=1):
+    """
+    Parse a Kubernetes resource quantity like "500m", "2", "1.5Gi" or "1e3" into an integer of 1/scale units.
+
+    parse_quantity("250m", scale=1000) returns 250 millicores, parse_quantity("1Ki") returns 1024 bytes.
+    Fractions are rounded up, as done by Kubernetes.
+    """
+    if quantity is None:
+        return 0
+    match = QUANTITY_PATTERN.match(str(quantity).strip())
+    if match is None or match.group(2) not in QUANTITY_SUFFIXES:
+        raise ValueError(f"Invalid quantity: {quantity}")
+    value = Decimal(match.group(1)) * QUANTITY_SUFFIXES[match.group(2)] * scale
+    return int(value.to_integral_value(rounding="ROUND_CEILING"))
+
+
+def parse_cpu(quantity):
+    return parse_quantity(quantity, scale=1000)
+
+
+def pod_resources(pod):
+    """
+    Resources a pod holds on its node as (cpu_req, cpu_lmt, mem_req, mem_lmt, gpu_req)
+    in millicores, bytes and devices, summed over its containers.
+    """
+    cpu_req = cpu_lmt = mem_req = mem_lmt = gpu_req = 0
+    for container in pod.spec.containers:
+        res = container.resources
+        if res is None:
+            continue
+        requests = res.requests or {}
+        limits = res.limits or {}
+        cpu_req += parse_cpu(requests.get("cpu"))
+        cpu_lmt += parse_cpu(limits.get("cpu"))
+        mem_req += parse_quantity(requests.get("memory"))
+        mem_lmt += parse_quantity(limits.get("memory"))
+        # extended resources are requested via limits only
+        gpu_req += parse_quantity(requests.get(GPU_RESOURCE, limits.get(GPU_RESOURCE)))
+    return cpu_req, cpu_lmt, mem_req, mem_lmt, gpu_req
+
+
+class NodeResources:
+    """
+    Allocatable resources, requested totals and pressure conditions of a node.
+
+    CPU in millicores, memory in bytes, GPUs in devices.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.cpu_alloc = 0
+        self.mem_alloc = 0
+        self.gpu_dev_count = 0
+        self.memory_pressure = False
+        self.disk_pressure = False
+        self.pid_pressure = False
+        self.ready = True
+        self.unschedulable = False
+        self.reset_requests()
+        self.reserved_cpu = 0
+        self.reserved_mem = 0
+
+    def update_node(self, node):
+        allocatable = node.status.allocatable or {}
+        capacity = node.status.capacity or {}
+        self.cpu_alloc = parse_cpu(allocatable.get("cpu"))
+        self.mem_alloc = parse_quantity(allocatable.get("memory"))
+        self.gpu_dev_count = parse_quantity(capacity.get(GPU_RESOURCE))
+        conditions = {
+            condition.type: condition.status == "True"
+            for condition in node.status.conditions or []
+        }
+        self.memory_pressure = conditions.get("MemoryPressure", False)
+        self.disk_pressure = conditions.get("DiskPressure", False)
+        self.pid_pressure = conditions.get("PIDPressure", False)
+        self.ready = conditions.get("Ready", True)
+        self.unschedulable = bool(node.spec.unschedulable)
+
+    def schedulable(self):
+        return (
+            self.ready
+            and not self.unschedulable
+            and not self.memory_pressure
+            and not self.disk_pressure
+            and not self.pid_pressure
+        )
+
+    def free(self):
+        """
+        CPU and memory neither requested by pods nor reserved for admitted tasks.
+        """
+        return (
+            self.cpu_alloc - self.cpu_req - self.reserved_cpu,
+            self.mem_alloc - self.mem_req - self.reserved_mem,
+        )
+
+    def reset_requests(self):
+        self.cpu_req = 0
+        self.cpu_lmt = 0
+        self.mem_req = 0
+        self.mem_lmt = 0
+        self.gpu_req = 0
+
+    def add(self, resources, sign=1):
+        cpu_req, cpu_lmt, mem_req, mem_lmt, gpu_req = resources
+        self.cpu_req += sign * cpu_req
+        self.cpu_lmt += sign * cpu_lmt
+        self.mem_req += sign * mem_req
+        self.mem_lmt += sign * mem_lmt
+        self.gpu_req += sign * gpu_req
+
+
+class ClusterResourceModel:
+    """
+    In-memory model of the resources of all nodes, kept up to date by watching nodes and pods.
+
+    Per-node request totals are updated incrementally for every pod event,
+    so reading them does not query the Kubernetes API.
+    Only the node name and the resources of running pods are kept, by pod uid.
+    """
+
+    def __init__(self, core_v1=None, logger=logging):
+        self.core_v1 = core_v1
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.nodes = {}
+        self.pods = {}
+        self.threads = []
+        self.time_last_event = None
+        # reservation_id -> (node_name, cpu, mem, time of expiry)
+        self.reservations = {}
+
+    def node_stats(self, node_name=None):
+        """
+        Consistent copy of the resources of node_name, of the first node if it is not given.
+        """
+        with self.lock:
+            if node_name is None:
+                node_resources = next(iter(self.nodes.values()), None)
+            else:
+                node_resources = self.nodes.get(node_name)
+            return None if node_resources is None else dict(vars(node_resources))
+
+    def cluster_stats(self):
+        """
+        Totals of all schedulable nodes, pressure flags if any node is under pressure.
+        """
+        totals = {
+            "nodes": 0,
+            "cpu_alloc": 0,
+            "cpu_req": 0,
+            "cpu_lmt": 0,
+            "mem_alloc": 0,
+            "mem_req": 0,
+            "mem_lmt": 0,
+            "gpu_dev_count": 0,
+            "memory_pressure": False,
+            "disk_pressure": False,
+            "pid_pressure": False,
+        }
+        with self.lock:
+            for node_resources in self.nodes.values():
+                for pressure in ("memory_pressure", "disk_pressure", "pid_pressure"):
+                    totals[pressure] |= getattr(node_resources, pressure)
+                if not node_resources.schedulable():
+                    continue
+                totals["nodes"] += 1
+                for key in totals.keys() - {
+                    "nodes",
+                    "memory_pressure",
+                    "disk_pressure",
+                    "pid_pressure",
+                }:
+                    totals[key] += getattr(node_resources, key)
+        return totals
+
+    def admit(self, cpu_millicores=0, mem_bytes=0, node_names=None, mem_offset=0.0):
+        """
+        Bin-packing admission of a task requesting cpu_millicores and mem_bytes.
+
+        Among the schedulable nodes (restricted to node_names if given) that fit the task,
+        the one with the least memory left after placement is chosen,
+        keeping larger nodes free for larger tasks.
+        mem_offset is the fraction of the allocatable memory of a node that is kept free.
+        The resources are reserved until the pod of the task is bound to the node.
+
+        :return: (node_name, reservation_id) or None if the task does not fit on any node.
+        """
+        with self.lock:
+            self._expire_reservations(time.monotonic())
+            best = None
+            for node_resources in self.nodes.values():
+                if node_names is not None and node_resources.name not in node_names:
+                    continue
+                if not node_resources.schedulable():
+                    continue
+                cpu_free, mem_free = node_resources.free()
+                mem_left = (
+                    mem_free - round(mem_offset * node_resources.mem_alloc) - mem_bytes
+                )
+                if mem_left <= 0 or (cpu_millicores and cpu_free < cpu_millicores):
+                    continue
+                if best is None or mem_left < best[0]:
+                    best = (mem_left, node_resources)
+            if best is None:
+                return None
+            node_resources = best[1]
+            reservation_id = uuid.uuid4().hex
+            self.reservations[reservation_id] = (
+                node_resources.name,
+                cpu_millicores,
+                mem_bytes,
+                time.monotonic() + RESERVATION_TIMEOUT_SECONDS,
+            )
+            node_resources.reserved_cpu += cpu_millicores
+            node_resources.reserved_mem += mem_bytes
+            return node_resources.name, reservation_id
+
+    def release(self, reservation_id):
+        with self.lock:
+            self._release(reservation_id)
+
+    def _release(self, reservation_id):
+        reservation = self.reservations.pop(reservation_id, None)
+        if reservation is None:
+            return
+        node_name, cpu_millicores, mem_bytes, _ = reservation
+        if node_name in self.nodes:
+            self.nodes[node_name].reserved_cpu -= cpu_millicores
+            self.nodes[node_name].reserved_mem -= mem_bytes
+
+    def _expire_reservations(self, now):
+        for reservation_id, reservation in list(self.reservations.items()):
+            if reservation[3] < now:
+                self._release(reservation_id)
+
+    def apply_node_event(self, event_type, node):
+        with self.lock:
+            self._apply_node_event(event_type, node)
+
+    def apply_pod_event(self, event_type, pod):
+        with self.lock:
+            self._apply_pod_event(event_type, pod)
+
+    def replace_nodes(self, nodes):
+        with self.lock:
+            self.nodes = {}
+            for node in nodes:
+                self._apply_node_event("ADDED", node)
+
+    def replace_pods(self, pods):
+        with self.lock:
+            self.pods = {}
+            for node_resources in self.nodes.values():
+                node_resources.reset_requests()
+            for pod in pods:
+                self._apply_pod_event("ADDED", pod)
+
+    def _apply_node_event(self, event_type, node):
+        node_name = node.metadata.name
+        self.time_last_event = time.monotonic()
+        if event_type == "DELETED":
+            self.nodes.pop(node_name, None)
+            return
+        if node_name not in self.nodes:
+            node_resources = NodeResources(node_name)
+            # pods might have been bound before the node was seen
+            for pod_node_name, resources in self.pods.values():
+                if pod_node_name == node_name:
+                    node_resources.add(resources)
+            for reservation in self.reservations.values():
+                if reservation[0] == node_name:
+                    node_resources.reserved_cpu += reservation[1]
+                    node_resources.reserved_mem += reservation[2]
+            self.nodes[node_name] = node_resources
+        self.nodes[node_name].update_node(node)
+
+    def _apply_pod_event(self, event_type, pod):
+        self.time_last_event = time.monotonic()
+        previous = self.pods.pop(pod.metadata.uid, None)
+        if previous is not None and previous[0] in self.nodes:
+            self.nodes[previous[0]].add(previous[1], sign=-1)
+        node_name = pod.spec.node_name
+        if (
+            event_type == "DELETED"
+            or node_name is None
+            or (pod.status is not None and pod.status.phase in TERMINATED_POD_PHASES)
+        ):
+            return
+        # the pod is counted from now on
+        labels = pod.metadata.labels or {}
+        if RESERVATION_LABEL in labels:
+            self._release(labels[RESERVATION_LABEL])
+        resources = pod_resources(pod)
+        self.pods[pod.metadata.uid] = (node_name, resources)
+        if node_name in self.nodes:
+            self.nodes[node_name].add(resources)
+
+    def start(self):
+        """
+        List nodes and pods once and keep the model up to date with watches in daemon threads.
+        """
+        kinds = [
+            (self.core_v1.list_node, {}, self.apply_node_event, self.replace_nodes),
+            (
+                self.core_v1.list_pod_for_all_namespaces,
+                {"field_selector": POD_FIELD_SELECTOR},
+                self.apply_pod_event,
+                self.replace_pods,
+            ),
+        ]
+        for list_func, kwargs, apply, replace in kinds:
+            try:
+                resource_version = self._relist(list_func, kwargs, replace)
+            except Exception as e:
+                # retried by the watch thread
+                self.logger.error(f"{list_func.__name__} failed: {e}")
+                resource_version = None
+            thread = threading.Thread(
+                target=self._watch,
+                args=(list_func, kwargs, apply, replace, resource_version),
+                name=f"util-service-{list_func.__name__}",
+                daemon=True,
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def _relist(self, list_func, kwargs, replace):
+        result = list_func(**kwargs)
+        replace(result.items)
+        return result.metadata.resource_version
+
+    def _watch(self, list_func, kwargs, apply, replace, resource_version):
+        # imported here, the model itself does not need the kubernetes client
+        from kubernetes import watch
+        from kubernetes.client.rest import ApiException
+
+        while True:
+            try:
+                if resource_version is None:
+                    resource_version = self._relist(list_func, kwargs, replace)
+                for event in watch.Watch().stream(
+                    list_func,
+                    resource_version=resource_version,
+                    timeout_seconds=WATCH_TIMEOUT_SECONDS,
+                    allow_watch_bookmarks=True,
+                    **kwargs,
+                ):
+                    if event["type"] == "ERROR":
+                        raise ApiException(
+                            status=event["raw_object"].get("code"),
+                            reason=event["raw_object"].get("message"),
+                        )
+                    resource_version = event["object"].metadata.resource_version
+                    if event["type"] != "BOOKMARK":
+                        apply(event["type"], event["object"])
+            except ApiException as e:
+                if e.status == 410:
+                    # resourceVersion too old, events were missed
+                    self.logger.info(f"{list_func.__name__}: relisting")
+                else:
+                    self.logger.error(f"{list_func.__name__} watch failed: {e}")
+                    time.sleep(WATCH_RETRY_SECONDS)
+                resource_version = None
+            except Exception as e:
+                self.logger.error(f"{list_func.__name__} watch failed: {e}")
+                time.sleep(WATCH_RETRY_SECONDS)
+                resource_version = None
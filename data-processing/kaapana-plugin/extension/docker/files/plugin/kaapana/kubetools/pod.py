@@ -123,6 +123,10 @@ class Pod:
         if self.node_selectors is not None and len(self.node_selectors) is not 0:
             pod_spec.node_selector = self.node_selectors
 
+        # spec - affinity
+        if self.affinity:
+            pod_spec.affinity = self.affinity
+
         # spec - tolerations
         if self.tolerations is not None and len(self.tolerations) is not 0:
             pod_spec.tolerations = self.tolerations
@@ -23,12 +23,12 @@ from airflow.utils.state import State
 from datetime import datetime as dt
 from kubernetes import watch
 from kubernetes.client.rest import ApiException
-from kubernetes.stream import stream as kubernetes_stream
 from airflow import AirflowException
 from requests.exceptions import HTTPError
 from kaapana.kubetools.kube_client import get_kube_client
 from kaapana.kubetools.pod_stopper import PodStopper
 from kaapana.kubetools.pod import Pod
+from kaapana.kubetools.pod_watcher import LAUNCHER_LABEL, PodWatcher
 from pathlib import Path
 from kubernetes.client.models.v1_pod import V1Pod
 
@@ -61,6 +61,8 @@ from kubernetes.client.models.v1_pod import V1Pod
 # Unfortunately a race condition remains for UP_FOR_RETRY tasks as another scheduler can pick those up. To eliminate this the check for UP_FOR_RETRY needs to migrate from the TI to the scheduler. However, was it not for that fact that we have backfills... (see below)
 
 schedule_lockfile = Path("/kaapana/mounted/schedule_stop.lock")
+# Pod states are pushed by the watch, this only bounds the time until timeouts are checked
+POD_EVENT_TIMEOUT_SECONDS = 10
 
 
 class PodStatus(object):
@@ -79,6 +81,7 @@ class PodLauncher(LoggingMixin):
         in_cluster=True,
         cluster_context=None,
         extract_xcom=False,
+        xcom_return_file=None,
     ):
         super(PodLauncher, self).__init__()
         (
@@ -89,9 +92,17 @@ class PodLauncher(LoggingMixin):
             in_cluster=in_cluster, cluster_context=cluster_context
         )
         self._watch = watch.Watch()
+        self._watcher = None
+        self._resource_versions = {}
         self.extract_xcom = extract_xcom
+        # written by the base container on the shared workflow volume, read once it terminated
+        self.xcom_return_file = xcom_return_file
 
     def run_pod_async(self, pod: Pod):
+        if pod.kind == "Pod":
+            # started before the pod is created, so that no event is missed
+            self._watcher = PodWatcher.get(self._client, pod.namespace)
+            pod.labels = {**pod.labels, LAUNCHER_LABEL: self._watcher.launcher_id}
         req = pod.get_kube_object()
         self.log.debug(
             "Pod Creation Request: \n%s", json.dumps(req.to_dict(), indent=2)
@@ -234,7 +245,7 @@ class PodLauncher(LoggingMixin):
                     break
                     # raise AirflowException("Pod took too long to start")
 
-                time.sleep(1)
+                self.wait_for_pod_event(pod, timeout=POD_EVENT_TIMEOUT_SECONDS)
 
         if return_msg is None:
             return_msg = self._monitor_pod(pod, get_logs)
@@ -258,18 +269,14 @@ class PodLauncher(LoggingMixin):
                 for log in logs:
                     self.log.info(log)
 
-            result = None
-            if self.extract_xcom:
-                while self.base_container_is_running(pod):
-                    self.log.info("Container %s has state %s", pod.name, State.RUNNING)
-                    time.sleep(2)
-                result = self._extract_xcom(pod)
-                self.log.info(result)
-                result = json.loads(result)
             while self.pod_is_running(pod):
                 self.log.debug("Pod %s has state %s", pod.name, State.RUNNING)
-                time.sleep(2)
-            return (self._task_status(pod=pod, event=self.read_pod(pod)), result)
+                self.wait_for_pod_event(pod, timeout=POD_EVENT_TIMEOUT_SECONDS)
+            state = self._task_status(pod=pod, event=self.read_pod(pod))
+            result = None
+            if self.extract_xcom and state == State.SUCCESS:
+                result = self._extract_xcom(pod)
+            return (state, result)
         except Exception as e:
             self.log.warn(
                 f"################# ISSUE! Could not _monitor_pod: {pod.name}"
@@ -297,29 +304,40 @@ class PodLauncher(LoggingMixin):
         state = self._task_status(pod=pod, event=self.read_pod(pod))
         return state == State.RUNNING
 
-    def base_container_is_running(self, pod: Pod):
-        event = self.read_pod(pod)
-        status = next(
-            iter(filter(lambda s: s.name == "base", event.status.container_statuses)),
-            None,
-        )
-        return status.state.running is not None
+    def wait_for_pod_event(self, pod: Pod, timeout):
+        """
+        Wait until the pod changed since it was read last, at most timeout seconds.
+        """
+        if (
+            pod.kind != "Pod"
+            or self._watcher is None
+            or not self._watcher.synced.is_set()
+        ):
+            time.sleep(min(timeout, 2))
+            return
+        self._watcher.wait(pod.name, self._resource_versions.get(pod.name), timeout)
 
     def read_pod(self, pod: Pod) -> V1Pod:
         try:
             if pod.kind == "Pod":
-                return self._client.read_namespaced_pod(pod.name, pod.namespace)
+                api_pod_obj = None
+                if self._watcher is not None:
+                    api_pod_obj = self._watcher.read(pod.name)
+                if api_pod_obj is None:
+                    api_pod_obj = self._client.read_namespaced_pod(
+                        pod.name, pod.namespace
+                    )
+                self._resource_versions[pod.name] = (
+                    api_pod_obj.metadata.resource_version
+                )
+                return api_pod_obj
             elif pod.kind == "Job":
-                job_name = self._batch_client.read_namespaced_job(
-                    pod.name, pod.namespace
-                ).metadata._name
-                pod_list = self._client.list_namespaced_pod(namespace=pod.namespace)
-                for pod_running in pod_list.items:
-                    if (
-                        "job-name" in pod_running.metadata._labels
-                        and pod_running.metadata._labels["job-name"] == job_name
-                    ):
-                        return pod_running
+                # pods of a job are labeled with its name by the job controller
+                pod_list = self._client.list_namespaced_pod(
+                    namespace=pod.namespace, label_selector=f"job-name={pod.name}"
+                )
+                if len(pod_list.items) > 0:
+                    return pod_list.items[0]
             return self._client.read_namespaced_pod(pod.name, pod.namespace)
 
         except HTTPError as e:
@@ -328,42 +346,19 @@ class PodLauncher(LoggingMixin):
             )
 
     def _extract_xcom(self, pod: Pod):
-        resp = kubernetes_stream(
-            self._client.connect_get_namespaced_pod_exec,
-            pod.name,
-            pod.namespace,
-            container=self.kube_req_factory.SIDECAR_CONTAINER_NAME,
-            command=["/bin/sh"],
-            stdin=True,
-            stdout=True,
-            stderr=True,
-            tty=False,
-            _preload_content=False,
-        )
+        """
+        Read the result the base container wrote to xcom_return_file.
+        """
         try:
-            result = self._exec_pod_command(
-                resp, "cat {}/return.json".format(self.kube_req_factory.XCOM_MOUNT_PATH)
-            )
-            self._exec_pod_command(resp, "kill -s SIGINT 1")
-        finally:
-            resp.close()
-        if result is None:
-            raise AirflowException(
-                "Failed to extract xcom from pod: {}".format(pod.name)
-            )
-        return result
-
-    def _exec_pod_command(self, resp, command):
-        if resp.is_open():
-            self.log.info("Running command... %s\n" % command)
-            resp.write_stdin(command + "\n")
-            while resp.is_open():
-                resp.update(timeout=1)
-                if resp.peek_stdout():
-                    return resp.read_stdout()
-                if resp.peek_stderr():
-                    self.log.info(resp.read_stderr())
-                    break
+            with open(self.xcom_return_file, "rb") as f:
+                content = f.read()
+        except (TypeError, OSError) as e:
+            raise AirflowException(f"Failed to extract xcom from pod: {pod.name}, {e}")
+        self.log.info("Extracted xcom of pod %s: %s bytes", pod.name, len(content))
+        try:
+            return json.loads(content)
+        except ValueError as e:
+            raise AirflowException(f"Invalid xcom of pod: {pod.name}, {e}")
 
     def process_status(self, event, pod: Pod):
         af_status = "None"
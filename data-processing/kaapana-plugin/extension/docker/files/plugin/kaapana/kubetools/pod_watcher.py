@@ -0,0 +1,141 @@
+import logging
+import os
+import re
+import socket
+import threading
+import time
+
+# Pods created by a launcher are labeled with the id of its process, its watch is restricted to them
+LAUNCHER_LABEL = "kaapana-launcher"
+# Watches are restarted from the last resourceVersion after this time
+WATCH_TIMEOUT_SECONDS = 300
+WATCH_RETRY_SECONDS = 2
+
+
+def get_launcher_id():
+    # label values are limited to 63 alphanumeric characters, "-", "_" and "."
+    launcher_id = re.sub(
+        r"[^-A-Za-z0-9_.]", "", f"{os.getpid()}-{socket.gethostname()}"
+    )
+    return launcher_id[:63].rstrip("-_.")
+
+
+class PodWatcher:
+    """
+    Streams the pods of a namespace created by this process with one watch and wakes up waiting launchers.
+
+    Shared by all PodLaunchers of the process (see PodWatcher.get()), the latest state of every pod
+    is kept by pod name, so that reading it does not query the Kubernetes API.
+    """
+
+    lock = threading.Lock()
+    watchers = {}
+
+    @staticmethod
+    def get(client, namespace):
+        with PodWatcher.lock:
+            if namespace not in PodWatcher.watchers:
+                watcher = PodWatcher(client, namespace)
+                watcher.start()
+                PodWatcher.watchers[namespace] = watcher
+            return PodWatcher.watchers[namespace]
+
+    def __init__(self, client, namespace, launcher_id=None, logger=logging):
+        self.client = client
+        self.namespace = namespace
+        self.launcher_id = launcher_id or get_launcher_id()
+        self.label_selector = f"{LAUNCHER_LABEL}={self.launcher_id}"
+        self.logger = logger
+        self.condition = threading.Condition()
+        self.pods = {}
+        # set once the pods were listed, events before are not missed anymore
+        self.synced = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._watch, name=f"pod-watcher-{self.namespace}", daemon=True
+        )
+        self.thread.start()
+
+    def read(self, pod_name):
+        """
+        :return: The latest state of the pod or None if it was not seen (yet).
+        """
+        with self.condition:
+            return self.pods.get(pod_name)
+
+    def wait(self, pod_name, resource_version, timeout):
+        """
+        Wait until the pod changed from resource_version, at most timeout seconds.
+
+        :return: The latest state of the pod or None if it was not seen.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                pod = self.pods.get(pod_name)
+                if (
+                    pod is not None
+                    and pod.metadata.resource_version != resource_version
+                ):
+                    return pod
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return pod
+                self.condition.wait(remaining)
+
+    def apply(self, event_type, pod):
+        with self.condition:
+            if event_type == "DELETED":
+                self.pods.pop(pod.metadata.name, None)
+            else:
+                self.pods[pod.metadata.name] = pod
+            self.condition.notify_all()
+
+    def _relist(self):
+        result = self.client.list_namespaced_pod(
+            self.namespace, label_selector=self.label_selector
+        )
+        with self.condition:
+            self.pods = {pod.metadata.name: pod for pod in result.items}
+            self.condition.notify_all()
+        self.synced.set()
+        return result.metadata.resource_version
+
+    def _watch(self):
+        # imported here, the watcher itself does not need the kubernetes client
+        from kubernetes import watch
+        from kubernetes.client.rest import ApiException
+
+        resource_version = None
+        while True:
+            try:
+                if resource_version is None:
+                    resource_version = self._relist()
+                for event in watch.Watch().stream(
+                    self.client.list_namespaced_pod,
+                    self.namespace,
+                    label_selector=self.label_selector,
+                    resource_version=resource_version,
+                    timeout_seconds=WATCH_TIMEOUT_SECONDS,
+                    allow_watch_bookmarks=True,
+                ):
+                    if event["type"] == "ERROR":
+                        raise ApiException(
+                            status=event["raw_object"].get("code"),
+                            reason=event["raw_object"].get("message"),
+                        )
+                    resource_version = event["object"].metadata.resource_version
+                    if event["type"] != "BOOKMARK":
+                        self.apply(event["type"], event["object"])
+            except ApiException as e:
+                if e.status != 410:
+                    self.logger.error(f"Pod watch of {self.namespace} failed: {e}")
+                    time.sleep(WATCH_RETRY_SECONDS)
+                # resourceVersion too old or unknown, events might have been missed
+                resource_version = None
+            except Exception as e:
+                self.logger.error(f"Pod watch of {self.namespace} failed: {e}")
+                time.sleep(WATCH_RETRY_SECONDS)
+                resource_version = None
@@ -0,0 +1,140 @@
+import logging
+import time
+from functools import partial
+
+from airflow import settings
+from airflow.models.pool import Pool
+from airflow.stats import Stats
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+# Minimum time between two resizes of a pool
+POOL_RESIZE_DEBOUNCE_SECONDS = 60
+# Key of the cache updates in session.info, which wait for the commit of the session
+PENDING_UPDATES_KEY = "kaapana_pool_updates"
+
+
+def _apply_pending_updates(session):
+    # also emitted for released savepoints, while the outer transaction is still active
+    transaction = session.get_transaction()
+    if transaction is not None and transaction.is_active:
+        return
+    for update in session.info.pop(PENDING_UPDATES_KEY, []):
+        update()
+
+
+def _discard_pending_updates(session, transaction):
+    # updates which were not applied on commit belong to a rolled back transaction
+    if transaction.parent is None:
+        session.info.pop(PENDING_UPDATES_KEY, None)
+
+
+class PoolManager:
+    """
+    Sizes Airflow pools by updating the slot_pool table from the scheduler process.
+
+    A pool is only resized if its slots differ by more than tolerance from the requested size (hysteresis)
+    and if its last resize is older than debounce_seconds, so that fluctuations do not churn the pools.
+    Resizes are counted in the kaapana.pool.resized metric and in resizes.
+    The cached slots are only updated once the transaction with the resize is committed.
+    """
+
+    def __init__(self, debounce_seconds=POOL_RESIZE_DEBOUNCE_SECONDS):
+        self.debounce_seconds = debounce_seconds
+        # pool name -> slots in the database
+        self.slots = {}
+        self.time_last_resize = {}
+        self.resizes = {}
+
+    def set_pool(
+        self,
+        pool_name,
+        pool_slots,
+        pool_description,
+        tolerance=0,
+        session=None,
+        logger=logging,
+    ):
+        """
+        Resize or create the pool within session, a new transaction is committed if no session is given.
+
+        Inside the critical section of the scheduler the session of the scheduler has to be passed,
+        it holds the row locks of slot_pool.
+
+        :return: True if the pool has pool_slots within tolerance, False if the resize was deferred.
+        """
+        pool_slots = int(pool_slots)
+        current_slots = self.slots.get(pool_name)
+        if current_slots is not None and abs(pool_slots - current_slots) <= tolerance:
+            return True
+        now = time.monotonic()
+        time_last_resize = self.time_last_resize.get(pool_name)
+        if (
+            time_last_resize is not None
+            and now - time_last_resize < self.debounce_seconds
+        ):
+            logger.debug(f"Deferring resize of pool {pool_name} to {pool_slots}")
+            return False
+
+        if session is None:
+            with Session(bind=settings.engine) as session, session.begin():
+                slots, resized = self._write_pool(
+                    session, pool_name, pool_slots, pool_description, tolerance
+                )
+            self._update_cache(pool_name, pool_description, slots, resized, now, logger)
+        else:
+            # a failing update does not abort the transaction of the scheduler
+            with session.begin_nested():
+                slots, resized = self._write_pool(
+                    session, pool_name, pool_slots, pool_description, tolerance
+                )
+            # the transaction of the scheduler might still be rolled back, e.g. on a lock error
+            if not event.contains(session, "after_commit", _apply_pending_updates):
+                event.listen(session, "after_commit", _apply_pending_updates)
+                event.listen(session, "after_transaction_end", _discard_pending_updates)
+            session.info.setdefault(PENDING_UPDATES_KEY, []).append(
+                partial(
+                    self._update_cache,
+                    pool_name,
+                    pool_description,
+                    slots,
+                    resized,
+                    now,
+                    logger,
+                )
+            )
+        return True
+
+    def _update_cache(
+        self, pool_name, pool_description, pool_slots, resized, now, logger
+    ):
+        self.slots[pool_name] = pool_slots
+        if resized:
+            logger.info(f"Resized pool {pool_name}: {pool_slots} - {pool_description}")
+            self.time_last_resize[pool_name] = now
+            self.resizes[pool_name] = self.resizes.get(pool_name, 0) + 1
+            Stats.incr("kaapana.pool.resized", tags={"pool_name": pool_name})
+            Stats.gauge("kaapana.pool.slots", pool_slots, tags={"pool_name": pool_name})
+
+    def _write_pool(self, session, pool_name, pool_slots, pool_description, tolerance):
+        """
+        :return: Slots of the pool in the database and if they were changed.
+        """
+        pool = session.scalar(select(Pool).filter_by(pool=pool_name).with_for_update())
+        if pool is None:
+            session.add(
+                Pool(
+                    pool=pool_name,
+                    slots=pool_slots,
+                    description=pool_description,
+                    include_deferred=False,
+                )
+            )
+        elif abs(pool.slots - pool_slots) <= tolerance:
+            # e.g. after a restart of the scheduler
+            return pool.slots, False
+        else:
+            pool.slots = pool_slots
+            pool.description = pool_description
+        session.flush()
+        return pool_slots, True
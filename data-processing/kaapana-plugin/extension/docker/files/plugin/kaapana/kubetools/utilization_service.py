@@ -1,17 +1,17 @@
 import kubernetes as k8s
 from datetime import datetime
-from pint import UnitRegistry
-from collections import defaultdict
 import os
 import json
 import logging
 import time
+from kaapana.kubetools.cluster_resources import ClusterResourceModel
+from kaapana.kubetools.pool_manager import PoolManager
 from kaapana.kubetools.prometheus_query import (
     get_node_gpu_infos,
     get_node_requested_memory,
 )
-from subprocess import Popen
 from pathlib import Path
+from sqlalchemy import event
 
 # from subprocess import STDOUT, check_output
 from kubernetes.client.models.v1_container_image import V1ContainerImage
@@ -22,13 +22,18 @@ GPU_SUPPORT = True if os.getenv("GPU_SUPPORT", "False").lower() == "true" else F
 default_memory_offset_percent = 0.05
 schedule_lockfile = Path("/kaapana/mounted/schedule_stop.lock")
 schedule_lockfile_max_duration_seconds = 300
+# NODE_RAM is not resized for smaller changes of the requested memory
+pool_ram_hysteresis_mb = 512
+# Key of the reservations in session.info, which are released if the session is not committed
+PENDING_RESERVATIONS_KEY = "kaapana_pending_reservations"
 
 
 class UtilService:
     query_delay = None
     api_client = None
 
-    ureg = None
+    cluster = None
+    pool_manager = PoolManager()
     last_update = None
 
     cpu_alloc = None
@@ -66,17 +71,22 @@ class UtilService:
     node_gpu_queued_dict = {}
 
     @staticmethod
-    def create_pool(pool_name, pool_slots, pool_description, logger=logging):
-        command = [
-            "airflow",
-            "pools",
-            "set",
-            str(pool_name),
-            str(pool_slots),
-            str(pool_description),
-        ]
-        logger.info(f"Creating pool {pool_name}: {pool_slots} - {pool_description}")
-        output = Popen(command)
+    def create_pool(
+        pool_name,
+        pool_slots,
+        pool_description,
+        tolerance=0,
+        session=None,
+        logger=logging,
+    ):
+        return UtilService.pool_manager.set_pool(
+            pool_name=pool_name,
+            pool_slots=pool_slots,
+            pool_description=pool_description,
+            tolerance=tolerance,
+            session=session,
+            logger=logger,
+        )
 
     @staticmethod
     def init_util_service():
@@ -86,126 +96,52 @@ class UtilService:
         V1ContainerImage.names = V1ContainerImage.names.setter(names)
         k8s.config.load_incluster_config()
         UtilService.core_v1 = k8s.client.CoreV1Api()
-        UtilService.ureg = UnitRegistry()
-        units_file_path = os.path.join(
-            os.path.dirname(os.path.realpath(__file__)), "kubernetes_units.txt"
-        )
+        UtilService.cluster = ClusterResourceModel(core_v1=UtilService.core_v1)
+        UtilService.cluster.start()
 
-        assert os.path.isfile(units_file_path)
-        UtilService.ureg.load_definitions(units_file_path)
-        UtilService.Q_ = UtilService.ureg.Quantity
+    @staticmethod
+    def update_resources(logger=logging):
+        """
+        Read the resources of all schedulable nodes from the cluster model, which is kept up to date by watches.
+        """
+        node_info = UtilService.cluster.cluster_stats()
+        if node_info["nodes"] == 0:
+            logger.error("UtilService: no nodes found, keeping the last utilization")
+            return False
+        UtilService.cpu_alloc = node_info["cpu_alloc"]
+        UtilService.cpu_req = node_info["cpu_req"]
+        UtilService.cpu_lmt = node_info["cpu_lmt"]
+        UtilService.cpu_req_per = node_info["cpu_req"] * 100 // node_info["cpu_alloc"]
+        UtilService.cpu_lmt_per = node_info["cpu_lmt"] * 100 // node_info["cpu_alloc"]
+        UtilService.mem_alloc = node_info["mem_alloc"] // 1024 // 1024
+        UtilService.mem_req = node_info["mem_req"] // 1024 // 1024
+        UtilService.mem_lmt = node_info["mem_lmt"] // 1024 // 1024
+        UtilService.mem_req_per = node_info["mem_req"] * 100 // node_info["mem_alloc"]
+        UtilService.mem_lmt_per = node_info["mem_lmt"] * 100 // node_info["mem_alloc"]
+        UtilService.gpu_dev_count = node_info["gpu_dev_count"]
+
+        UtilService.memory_pressure = node_info["memory_pressure"]
+        UtilService.disk_pressure = node_info["disk_pressure"]
+        UtilService.pid_pressure = node_info["pid_pressure"]
+
+        UtilService.cpu_available_req = UtilService.cpu_alloc - UtilService.cpu_req
+        UtilService.cpu_available_limit = UtilService.cpu_alloc - UtilService.cpu_lmt
+        UtilService.memory_available_req = abs(
+            UtilService.mem_alloc - UtilService.mem_req
+        )
+        UtilService.memory_available_limit = abs(
+            UtilService.mem_alloc - UtilService.mem_lmt
+        )
+        return True
 
     @staticmethod
-    def get_utilization(logger=logging):
+    def get_utilization(logger=logging, session=None):
         global node_requested_memory, default_memory_offset_percent
         logger.info("UtilService -> get_utilization")
-        data = {}
         UtilService.last_update = datetime.now()
         try:
-            for node in UtilService.core_v1.list_node().items:
-                stats = {}
-                node_name = node.metadata.name
-                capacity = node.status.capacity
-                allocatable = node.status.allocatable
-                conditions = node.status.conditions
-                stats["memory_pressure"] = False
-                stats["disk_pressure"] = False
-                stats["pid_pressure"] = False
-                for condition in conditions:
-                    if condition.type == "MemoryPressure":
-                        stats["memory_pressure"] = (
-                            True if condition.status == "True" else False
-                        )
-                    elif condition.type == "DiskPressure":
-                        stats["disk_pressure"] = (
-                            True if condition.status == "True" else False
-                        )
-                    elif condition.type == "PIDPressure":
-                        stats["pid_pressure"] = (
-                            True if condition.status == "True" else False
-                        )
-
-                max_pods = int(int(allocatable["pods"]) * 1.5)
-                field_selector = (
-                    "status.phase!=Succeeded,status.phase!=Failed,"
-                    + "spec.nodeName="
-                    + node_name
-                )
-
-                stats["cpu_alloc"] = UtilService.Q_(allocatable["cpu"])
-                stats["mem_alloc"] = UtilService.Q_(allocatable["memory"])
-                stats["gpu_dev_count"] = UtilService.Q_(
-                    capacity["nvidia.com/gpu"] if "nvidia.com/gpu" in capacity else 0
-                )
-
-                pods = UtilService.core_v1.list_pod_for_all_namespaces(
-                    limit=max_pods, field_selector=field_selector
-                ).items
-                # compute the allocated resources
-                cpureqs, cpulmts, memreqs, memlmts = [], [], [], []
-                for pod in pods:
-                    for container in pod.spec.containers:
-                        res = container.resources
-                        reqs = defaultdict(lambda: 0, res.requests or {})
-                        lmts = defaultdict(lambda: 0, res.limits or {})
-                        cpureqs.append(UtilService.Q_(reqs["cpu"]))
-                        memreqs.append(UtilService.Q_(reqs["memory"]))
-                        cpulmts.append(UtilService.Q_(lmts["cpu"]))
-                        memlmts.append(UtilService.Q_(lmts["memory"]))
-
-                stats["cpu_req"] = sum(cpureqs)
-                stats["cpu_lmt"] = sum(cpulmts)
-                stats["cpu_req_per"] = stats["cpu_req"] / stats["cpu_alloc"] * 100
-                stats["cpu_lmt_per"] = stats["cpu_lmt"] / stats["cpu_alloc"] * 100
-                stats["mem_req"] = sum(memreqs)
-                stats["mem_lmt"] = sum(memlmts)
-                stats["mem_req_per"] = stats["mem_req"] / stats["mem_alloc"] * 100
-                stats["mem_lmt_per"] = stats["mem_lmt"] / stats["mem_alloc"] * 100
-                data[node_name] = stats
-
-            node_info = next(iter(data.values()))
-            UtilService.cpu_alloc = (
-                node_info["cpu_alloc"].to_base_units().magnitude * 1000
-            )
-            UtilService.cpu_req = node_info["cpu_req"].to_base_units().magnitude * 1000
-            UtilService.cpu_lmt = node_info["cpu_lmt"].to_base_units().magnitude * 1000
-            UtilService.cpu_req_per = int(
-                node_info["cpu_req_per"].to_base_units().magnitude * 1000
-            )
-            UtilService.cpu_lmt_per = int(
-                node_info["cpu_lmt_per"].to_base_units().magnitude * 1000
-            )
-            UtilService.mem_alloc = int(
-                node_info["mem_alloc"].to_base_units().magnitude // 1024 // 1024
-            )
-            UtilService.mem_req = int(
-                node_info["mem_req"].to_base_units().magnitude // 1024 // 1024
-            )
-            UtilService.mem_lmt = int(
-                node_info["mem_lmt"].to_base_units().magnitude // 1024 // 1024
-            )
-            UtilService.mem_req_per = int(
-                node_info["mem_req_per"].to_base_units().magnitude
-            )
-            UtilService.mem_lmt_per = int(
-                node_info["mem_lmt_per"].to_base_units().magnitude
-            )
-            UtilService.gpu_dev_count = int(node_info["gpu_dev_count"])
-
-            UtilService.memory_pressure = node_info["memory_pressure"]
-            UtilService.disk_pressure = node_info["disk_pressure"]
-            UtilService.pid_pressure = node_info["pid_pressure"]
-
-            UtilService.cpu_available_req = UtilService.cpu_alloc - UtilService.cpu_req
-            UtilService.cpu_available_limit = (
-                UtilService.cpu_alloc - UtilService.cpu_lmt
-            )
-            UtilService.memory_available_req = abs(
-                UtilService.mem_alloc - UtilService.mem_req
-            )
-            UtilService.memory_available_limit = abs(
-                UtilService.mem_alloc - UtilService.mem_lmt
-            )
+            if not UtilService.update_resources(logger=logger):
+                return False
             pool_id = "NODE_GPU_COUNT"
             if (
                 UtilService.pool_gpu_count == None
@@ -213,13 +149,17 @@ class UtilService:
                 or UtilService.pool_gpu_count == 0
                 and GPU_SUPPORT
             ):
-                UtilService.create_pool(
-                    pool_name=pool_id,
-                    pool_slots=UtilService.gpu_dev_count,
-                    pool_description="Pool for the GPU device count",
-                    logger=logger,
+                UtilService.pool_gpu_count = (
+                    UtilService.gpu_dev_count
+                    if UtilService.create_pool(
+                        pool_name=pool_id,
+                        pool_slots=UtilService.gpu_dev_count,
+                        pool_description="Pool for the GPU device count",
+                        session=session,
+                        logger=logger,
+                    )
+                    else None
                 )
-                UtilService.pool_gpu_count = UtilService.gpu_dev_count
 
                 if UtilService.gpu_dev_count > 0:
                     UtilService.node_gpu_list = (
@@ -231,7 +171,6 @@ class UtilService:
                         UtilService.pool_gpu_count = None
                     else:
                         for gpu_info in UtilService.node_gpu_list:
-                            node = gpu_info["node"]
                             gpu_id = gpu_info["gpu_id"]
                             pool_id = gpu_info["pool_id"]
                             gpu_name = gpu_info["gpu_name"]
@@ -246,6 +185,7 @@ class UtilService:
                                 pool_name=pool_id,
                                 pool_slots=capacity,
                                 pool_description=f"{gpu_name} capacity in MB",
+                                session=session,
                                 logger=logger,
                             )
             else:
@@ -256,7 +196,8 @@ class UtilService:
                     else []
                 )
             tmp_node_requested_memory = get_node_requested_memory(logger=logger)
-            if UtilService.node_requested_memory != tmp_node_requested_memory:
+            if tmp_node_requested_memory is not None:
+                # called on every update, deferred resizes are retried
                 new_processing_memory = abs(
                     UtilService.mem_alloc
                     - tmp_node_requested_memory
@@ -267,6 +208,8 @@ class UtilService:
                     pool_name=pool_id,
                     pool_slots=new_processing_memory,
                     pool_description="Pool for the available nodes RAM memory in MB",
+                    tolerance=pool_ram_hysteresis_mb,
+                    session=session,
                     logger=logger,
                 )
                 UtilService.node_requested_memory = tmp_node_requested_memory
@@ -288,13 +231,14 @@ class UtilService:
                 UtilService.pool_cpu == None
                 or UtilService.pool_cpu != UtilService.cpu_alloc
             ):
-                UtilService.create_pool(
+                if UtilService.create_pool(
                     pool_name=pool_id,
                     pool_slots=UtilService.cpu_alloc,
                     pool_description="Pool for the available CPU cores",
+                    session=session,
                     logger=logger,
-                )
-                UtilService.pool_cpu = UtilService.cpu_alloc
+                ):
+                    UtilService.pool_cpu = UtilService.cpu_alloc
 
             logger.debug("#####################################")
             logger.debug("#####################################")
@@ -330,7 +274,7 @@ class UtilService:
             return False
 
     @staticmethod
-    def check_operator_scheduling(task_instance, logger=logging):
+    def check_operator_scheduling(task_instance, logger=logging, session=None):
         global schedule_lockfile, schedule_lockfile_max_duration_seconds
         logger.info(f"UtilService: check_operator_scheduling {task_instance.task_id=}")
         job_scheduler_delay = 5
@@ -344,11 +288,12 @@ class UtilService:
 
         if UtilService.last_update == None:
             UtilService.init_util_service()
-            UtilService.get_utilization(logger=logger)
+            UtilService.get_utilization(logger=logger, session=session)
         elif (
             datetime.now() - UtilService.last_update
         ).total_seconds() > job_scheduler_delay:
-            UtilService.get_utilization(logger=logger)
+            # pools and GPU infos from prometheus
+            UtilService.get_utilization(logger=logger, session=session)
         logging.info(
             f"last_update: {UtilService.last_update.strftime('%Y-%m-%d %H:%M:%S.%f')}"
         )
@@ -372,6 +317,10 @@ class UtilService:
             else:
                 return False, None
 
+        ram_mem_mb = task_instance.executor_config.get("ram_mem_mb") or 0
+        cpu_millicores = task_instance.executor_config.get("cpu_millicores") or 0
+        launches_pod = task_instance.executor_config.get("launches_pod", False)
+
         if (
             "gpu_mem_mb" in task_instance.executor_config
             and task_instance.executor_config["gpu_mem_mb"] != None
@@ -383,6 +332,22 @@ class UtilService:
                 logger.info(
                     f"GPU config already set! ({task_instance.executor_config['gpu_device']=})"
                 )
+                # stays on the node of its GPU
+                node_affinity = task_instance.executor_config.get("node_affinity")
+                node_affinity = UtilService.admit(
+                    ram_mem_mb=ram_mem_mb,
+                    cpu_millicores=cpu_millicores,
+                    node_name=node_affinity["node_name"] if node_affinity else None,
+                    gpu_task=True,
+                    launches_pod=launches_pod,
+                    session=session,
+                    logger=logger,
+                )
+                if node_affinity is None:
+                    return False, None
+                return True, (
+                    {"node_affinity": node_affinity} if len(node_affinity) > 0 else {}
+                )
             else:
                 gpu_mem_mb = task_instance.executor_config["gpu_mem_mb"]
                 if len(UtilService.node_gpu_queued_dict) > 0:
@@ -427,13 +392,31 @@ class UtilService:
                         and free >= gpu_mem_mb
                         and queued_left >= gpu_mem_mb
                     ):
+                        node_affinity = UtilService.admit(
+                            ram_mem_mb=ram_mem_mb,
+                            cpu_millicores=cpu_millicores,
+                            node_name=gpu_info["node"],
+                            gpu_task=True,
+                            launches_pod=launches_pod,
+                            session=session,
+                            logger=logger,
+                        )
+                        if node_affinity is None:
+                            continue
                         UtilService.node_gpu_queued_dict[pool_id] += 1
                         UtilService.node_gpu_list[i]["queued_count"] += 1
                         UtilService.node_gpu_list[i]["queued_mb"] += gpu_mem_mb
                         logger.error(
                             f"1) Identified GPU for TI: {gpu_id=} {gpu_mem_mb=}"
                         )
-                        return True, {"gpu_id": gpu_id, "gpu_mem": gpu_mem_mb}
+                        return True, {
+                            "gpu_device": {"gpu_id": gpu_id, "gpu_mem": gpu_mem_mb},
+                            **(
+                                {"node_affinity": node_affinity}
+                                if len(node_affinity) > 0
+                                else {}
+                            ),
+                        }
 
                 for i in range(0, len(UtilService.node_gpu_list)):  # Check for capacity
                     gpu_info = UtilService.node_gpu_list[i]
@@ -444,47 +427,135 @@ class UtilService:
 
                     logger.error(json.dumps(gpu_info, indent=4))
                     if capacity >= gpu_mem_mb:
+                        node_affinity = UtilService.admit(
+                            ram_mem_mb=ram_mem_mb,
+                            cpu_millicores=cpu_millicores,
+                            node_name=gpu_info["node"],
+                            gpu_task=True,
+                            launches_pod=launches_pod,
+                            session=session,
+                            logger=logger,
+                        )
+                        if node_affinity is None:
+                            continue
                         UtilService.node_gpu_queued_dict[pool_id] += 1
                         UtilService.node_gpu_list[i]["queued_count"] += 1
                         UtilService.node_gpu_list[i]["queued_mb"] += gpu_mem_mb
                         logger.error(
                             f"2) Identified GPU for TI: {pool_id=} {gpu_mem_mb=}"
                         )
-                        return True, {"gpu_id": gpu_id, "gpu_mem": gpu_mem_mb}
+                        return True, {
+                            "gpu_device": {"gpu_id": gpu_id, "gpu_mem": gpu_mem_mb},
+                            **(
+                                {"node_affinity": node_affinity}
+                                if len(node_affinity) > 0
+                                else {}
+                            ),
+                        }
 
                 logger.error(f"No GPU for the TI found! -> Not scheduling !")
                 return False, None
 
-        if UtilService.memory_pressure:
-            logger.error("UtilService.memory_pressure == TRUE -> not scheduling!")
+        node_affinity = UtilService.admit(
+            ram_mem_mb=ram_mem_mb,
+            cpu_millicores=cpu_millicores,
+            launches_pod=launches_pod,
+            session=session,
+            logger=logger,
+        )
+        if node_affinity is None:
             return False, None
+        return True, (
+            {"node_affinity": node_affinity} if len(node_affinity) > 0 else {}
+        )
+
+    @staticmethod
+    def admit(
+        ram_mem_mb,
+        cpu_millicores,
+        node_name=None,
+        gpu_task=False,
+        launches_pod=True,
+        session=None,
+        logger=logging,
+    ):
+        """
+        Find a node with enough free RAM and CPU for the task and reserve them.
+
+        Nodes under memory, disk or PID pressure are skipped.
+        A node_name unknown to the cluster (e.g. a GPU hostname) does not restrict the choice.
+        GPU tasks must run on the node of their GPU, if node_name is unknown or not given,
+        nothing is reserved and the task is not pinned to a node.
+        Tasks which run in the worker process (launches_pod=False) never bind a pod, which would release a reservation,
+        they are only checked against the free memory of the cluster.
+        The reservation is released again if session is not committed.
+
+        :return: {"node_name", "reservation_id"} for the executor_config, {} for unpinned tasks or None.
+        """
+        if not launches_pod:
+            return {} if UtilService.check_memory(ram_mem_mb, logger=logger) else None
+        node_names = None
+        if node_name is not None and UtilService.cluster.node_stats(node_name):
+            node_names = [node_name]
+        elif gpu_task:
+            logger.warning(
+                f"UtilService: node {node_name=} of the GPU is unknown -> not pinning the task!"
+            )
+            return {}
+        admission = UtilService.cluster.admit(
+            cpu_millicores=cpu_millicores,
+            mem_bytes=ram_mem_mb * 1024 * 1024,
+            node_names=node_names,
+            mem_offset=default_memory_offset_percent,
+        )
+        if admission is None:
+            logger.error(
+                f"No node with {ram_mem_mb=} and {cpu_millicores=} available -> not scheduling!"
+            )
+            return None
+        node_name, reservation_id = admission
+        if session is not None:
+            # the scheduler might still roll back its critical section
+            if not event.contains(session, "after_commit", _keep_reservations):
+                event.listen(session, "after_commit", _keep_reservations)
+                event.listen(session, "after_transaction_end", _release_reservations)
+            session.info.setdefault(PENDING_RESERVATIONS_KEY, []).append(reservation_id)
+        logger.info(f"UtilService: admitted on {node_name=}")
+        return {"node_name": node_name, "reservation_id": reservation_id}
 
+    @staticmethod
+    def check_memory(ram_mem_mb, logger=logging):
+        """
+        Check the free memory of the cluster for a task without reserving it.
+        """
+        if UtilService.memory_pressure:
+            logger.error("UtilService.memory_pressure == TRUE -> not scheduling!")
+            return False
         if UtilService.disk_pressure:
             logger.error("UtilService.disk_pressure == TRUE -> not scheduling!")
-            return False, None
-
+            return False
         if UtilService.pid_pressure:
             logger.error("UtilService.pid_pressure == TRUE -> not scheduling!")
-            return False, None
+            return False
+        mem_offset = round(UtilService.mem_alloc * default_memory_offset_percent)
+        if ram_mem_mb >= UtilService.memory_available_req - mem_offset:
+            logger.error(
+                "TI ram_mem_mb > UtilService.memory_available_req -> not scheduling!"
+            )
+            return False
+        return True
 
-        if (
-            "cpu_millicores" in task_instance.executor_config
-            and task_instance.executor_config["cpu_millicores"] != None
-        ):
-            # TODO
-            pass
 
-        if (
-            "ram_mem_mb" in task_instance.executor_config
-            and task_instance.executor_config["ram_mem_mb"] != None
-        ):
-            mem_offset = round(UtilService.mem_alloc * default_memory_offset_percent)
-            if task_instance.executor_config["ram_mem_mb"] >= (
-                UtilService.memory_available_req - mem_offset
-            ):
-                logger.error(
-                    "TI ram_mem_mb > UtilService.memory_available_req -> not scheduling!"
-                )
-                return False, None
+def _keep_reservations(session):
+    # also emitted for released savepoints, while the outer transaction is still active
+    transaction = session.get_transaction()
+    if transaction is not None and transaction.is_active:
+        return
+    session.info.pop(PENDING_RESERVATIONS_KEY, None)
+
 
-        return True, None
+def _release_reservations(session, transaction):
+    # reservations which were not kept on commit belong to a rolled back transaction
+    if transaction.parent is None:
+        for reservation_id in session.info.pop(PENDING_RESERVATIONS_KEY, []):
+            UtilService.cluster.release(reservation_id)
@@ -1,6 +1,8 @@
 import os
 import json
 import logging
+import traceback
+from functools import lru_cache
 import pytz
 from dateutil import parser
 from datetime import datetime
@@ -18,13 +20,18 @@ class Dcm2MetaJsonConverter:
         format_date_time: str = "%Y-%m-%d %H:%M:%S.%f",
         exception_on_error: bool = True,
         dict_path: str = None,
+        cache_size: int = 4096,
     ):
+        """
+        :param cache_size: Number of distinct date, time and datetime values memoized per conversion. 0 disables the memoization.
+        """
         self.format_time = format_time
         self.format_date = format_date
         self.format_date_time = format_date_time
         self.exit_on_error = exception_on_error
         self.log = logging.getLogger(__name__)
 
+        self.dict_path = dict_path
         if not dict_path:
             if "DICT_PATH" in os.environ:
                 self.dict_path = os.getenv("DICT_PATH")
@@ -34,8 +41,33 @@ class Dcm2MetaJsonConverter:
         with open(self.dict_path, encoding="utf-8") as dict_data:
             self.dictionary = json.load(dict_data)
 
+        # Resolved keywords of all tags seen so far, including the unknown ones
+        self.key_table = {}
+
+        # Values like study dates or times repeat across most documents of an archive,
+        # so the parsing results are memoized per converter instance.
+        self.get_time = lru_cache(maxsize=cache_size)(self.get_time)
+        self.parse_date = lru_cache(maxsize=cache_size)(self.parse_date)
+        self.parse_date_time = lru_cache(maxsize=cache_size)(self.parse_date_time)
+        self.convert_time_to_utc = lru_cache(maxsize=cache_size)(
+            self.convert_time_to_utc
+        )
+
+    def cache_stats(self):
+        return {
+            name: getattr(self, name).cache_info()
+            for name in (
+                "get_time",
+                "parse_date",
+                "parse_date_time",
+                "convert_time_to_utc",
+            )
+        }
+
     def get_new_key(self, key):
-        new_key = ""
+        new_key = self.key_table.get(key)
+        if new_key is not None:
+            return new_key
 
         if key in self.dictionary:
             new_key = self.dictionary[key]
@@ -47,6 +79,7 @@ class Dcm2MetaJsonConverter:
             )
             new_key = key
 
+        self.key_table[key] = new_key
         return new_key
 
     def get_time(self, time_str):
@@ -110,13 +143,10 @@ class Dcm2MetaJsonConverter:
                 obj = int(obj)
                 return obj
             elif isinstance(obj, list):
+                if val_type is float or val_type is int:
+                    return list(map(val_type, obj))
                 for element in obj:
-                    if val_type is float:
-                        element = float(element)
-                    elif val_type is int:
-                        element = int(element)
-
-                    elif not isinstance(element, val_type):
+                    if not isinstance(element, val_type):
                         self.log.warn("Error list entry value type!")
                         self.log.warn("Needed-Type: {}".format(val_type))
                         self.log.warn("List: {}".format(str(obj)))
@@ -139,6 +169,49 @@ class Dcm2MetaJsonConverter:
 
         return obj
 
+    def parse_date(self, date_str):
+        return parser.parse(date_str).strftime(self.format_date)
+
+    def parse_date_time(self, value_str):
+        """
+        Convert a DICOM DT value to format_date_time in UTC.
+
+        :return: The formatted value or None if the format is not supported.
+        """
+        date_time_string = None
+
+        if len(value_str) == 21 and "." in value_str:
+            date_time_string = parser.parse(value_str.split(".")[0]).strftime(
+                "%Y-%m-%d %H:%M:%S.%f"
+            )
+
+        elif len(value_str) == 8:
+            self.log.warn("DATE ONLY FOUND")
+            datestr_date = parser.parse(value_str).strftime("%Y%m%d")
+            datestr_time = parser.parse("01:00:00").strftime("%H:%M:%S")
+            date_time_string = datestr_date + " " + datestr_time
+
+        elif len(value_str) == 16:
+            self.log.info("DATETIME FOUND")
+            datestr_date = str(value_str)[:8]
+            datestr_time = str(value_str)[8:]
+            datestr_date = parser.parse(datestr_date).strftime(self.format_date)
+            datestr_time = parser.parse(datestr_time).strftime(self.format_time)
+            date_time_string = datestr_date + " " + datestr_time
+
+        if date_time_string is None:
+            return None
+
+        date_time_formatted = parser.parse(date_time_string).strftime(
+            self.format_date_time
+        )
+        date_time_formatted = self.convert_time_to_utc(
+            date_time_formatted, self.format_date_time
+        )
+        self.log.warn("Value: {}".format(value_str))
+        self.log.warn("DATETIME: {}".format(date_time_formatted))
+        return date_time_formatted
+
     def convert_time_to_utc(self, time_berlin, date_format):
         local = pytz.timezone("Europe/Berlin")
         naive = datetime.strptime(time_berlin, date_format)
@@ -237,19 +310,11 @@ class Dcm2MetaJsonConverter:
                         # See also DT VR in this table.
                         try:
                             if isinstance(value_str, list):
-                                date_formatted = []
-                                for date_str in value_str:
-                                    if date_str == "":
-                                        continue
-                                    date_formatted.append(
-                                        parser.parse(date_str).strftime(
-                                            self.format_date
-                                        )
-                                    )
-                            else:
-                                date_formatted = parser.parse(value_str).strftime(
-                                    self.format_date
+                                date_formatted = list(
+                                    map(self.parse_date, filter(None, value_str))
                                 )
+                            else:
+                                date_formatted = self.parse_date(value_str)
 
                             new_key = new_key + "_date"
                             new_meta_data[new_key] = date_formatted
@@ -294,36 +359,17 @@ class Dcm2MetaJsonConverter:
                         # 20020904000000.000000
                         # "%Y-%m-%d %H:%M:%S.%f"
                         try:
-                            date_time_string = None
-
-                            if len(value_str) == 21 and "." in value_str:
-                                date_time_string = parser.parse(
-                                    value_str.split(".")[0]
-                                ).strftime("%Y-%m-%d %H:%M:%S.%f")
-
-                            elif len(value_str) == 8:
-                                self.log.warn("DATE ONLY FOUND")
-                                datestr_date = parser.parse(value_str).strftime(
-                                    "%Y%m%d"
-                                )
-                                datestr_time = parser.parse("01:00:00").strftime(
-                                    "%H:%M:%S"
-                                )
-                                date_time_string = datestr_date + " " + datestr_time
-
-                            elif len(value_str) == 16:
-                                self.log.info("DATETIME FOUND")
-                                datestr_date = str(value_str)[:8]
-                                datestr_time = str(value_str)[8:]
-                                datestr_date = parser.parse(datestr_date).strftime(
-                                    self.format_date
-                                )
-                                datestr_time = parser.parse(datestr_time).strftime(
-                                    self.format_time
-                                )
-                                date_time_string = datestr_date + " " + datestr_time
-
+                            if isinstance(value_str, list):
+                                date_time_formatted = [
+                                    self.parse_date_time(date_time_str)
+                                    for date_time_str in filter(None, value_str)
+                                ]
+                                if None in date_time_formatted:
+                                    date_time_formatted = None
                             else:
+                                date_time_formatted = self.parse_date_time(value_str)
+
+                            if date_time_formatted is None:
                                 self.log.warn(
                                     "+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++"
                                 )
@@ -339,21 +385,8 @@ class Dcm2MetaJsonConverter:
                                 )
                                 if self.exit_on_error:
                                     raise Dcm2MetaJsonConversionException()
-
-                            if date_time_string is not None:
-                                date_time_formatted = parser.parse(
-                                    date_time_string
-                                ).strftime(self.format_date_time)
-                                date_time_formatted = self.convert_time_to_utc(
-                                    date_time_formatted, self.format_date_time
-                                )
-
+                            else:
                                 new_key = new_key + "_datetime"
-
-                                self.log.warn("Value: {}".format(value_str))
-                                self.log.warn(
-                                    "DATETIME: {}".format(date_time_formatted)
-                                )
                                 new_meta_data[new_key] = date_time_formatted
 
                         except Exception as e:
@@ -591,11 +624,9 @@ class Dcm2MetaJsonConverter:
                         # The SS component may have a value of 60 only for a leap second.
 
                         if isinstance(value_str, list):
-                            time_formatted = []
-                            for time_str in value_str:
-                                if time_str == "" or time_str is None:
-                                    continue
-                                time_formatted.append(self.get_time(time_str))
+                            time_formatted = list(
+                                map(self.get_time, filter(None, value_str))
+                            )
                         else:
                             time_formatted = self.get_time(value_str)
 
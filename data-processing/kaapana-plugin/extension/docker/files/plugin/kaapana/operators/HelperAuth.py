@@ -0,0 +1,204 @@
+import base64
+import json
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+import requests
+
+from kaapana.blueprints.kaapana_global_variables import (
+    ADMIN_NAMESPACE,
+    OIDC_CLIENT_SECRET,
+    SERVICES_NAMESPACE,
+    SYSTEM_USER_PASSWORD,
+)
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_USER = "system"
+CLIENT_ID = "kaapana"
+KEYCLOAK_TOKEN_URL = f"http://keycloak-external-service.{ADMIN_NAMESPACE}.svc:80/auth/realms/{CLIENT_ID}/protocol/openid-connect/token"
+MINIO_STS_URL = f"http://minio-service.{SERVICES_NAMESPACE}.svc:9000"
+STS_NAMESPACE = "{https://sts.amazonaws.com/doc/2011-06-15/}"
+# Credentials are refreshed this many seconds before they expire
+REFRESH_MARGIN_SECONDS = 60
+# Lifetime assumed for credentials that do not state an expiry
+DEFAULT_LIFETIME_SECONDS = 300
+
+
+class CredentialCache:
+    """
+    Thread-safe cache for credentials that expire.
+
+    Every entry is refreshed as soon as it is within REFRESH_MARGIN_SECONDS of its expiry.
+    Concurrent requests for the same missing key only trigger a single fetch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> [lock, number of threads using it], removed when the last thread is done
+        self._key_locks = {}
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fetch):
+        """
+        Return the cached value for key or fetch a new one.
+
+        :param key: Hashable cache key.
+        :param fetch: Callable returning a tuple (value, expires_at) where expires_at is a unix timestamp.
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if (
+                        entry is not None
+                        and entry[1] - REFRESH_MARGIN_SECONDS > time.time()
+                    ):
+                        self.hits += 1
+                        return entry[0]
+                    self.misses += 1
+                value, expires_at = fetch()
+                with self._lock:
+                    now = time.time()
+                    for expired_key in [
+                        k for k, (_, exp) in self._entries.items() if exp < now
+                    ]:
+                        del self._entries[expired_key]
+                    self._entries[key] = (value, expires_at)
+                return value
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    del self._key_locks[key]
+
+    def invalidate(self, key=None):
+        """
+        Remove key or, if no key is given, all entries from the cache.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+
+credential_cache = CredentialCache()
+
+
+def get_token_expiry(access_token: str) -> float:
+    """
+    Read the 'exp' claim of a JWT without verifying its signature.
+    """
+    try:
+        payload = access_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, ValueError):
+        return time.time() + DEFAULT_LIFETIME_SECONDS
+
+
+def _request_token(data: dict, ssl_check=False):
+    r = requests.post(KEYCLOAK_TOKEN_URL, verify=ssl_check, data=data)
+    r.raise_for_status()
+    access_token = r.json()["access_token"]
+    return access_token, get_token_expiry(access_token)
+
+
+def get_system_user_token():
+    """
+    Get an access token for the system user.
+    """
+    return credential_cache.get(
+        ("token", SYSTEM_USER),
+        lambda: _request_token(
+            {
+                "username": SYSTEM_USER,
+                "password": SYSTEM_USER_PASSWORD,
+                "client_id": CLIENT_ID,
+                "client_secret": OIDC_CLIENT_SECRET,
+                "grant_type": "password",
+            }
+        ),
+    )
+
+
+def get_user_token(username: str):
+    """
+    Get an access token for username via token exchange.
+    """
+    if username == SYSTEM_USER:
+        return get_system_user_token()
+    return credential_cache.get(
+        ("token", username),
+        lambda: _request_token(
+            {
+                "client_id": CLIENT_ID,
+                "client_secret": OIDC_CLIENT_SECRET,
+                "grant_type": "urn:ietf:params:oauth:grant-type:token-exchange",
+                "subject_token": get_system_user_token(),
+                "requested_token_type": "urn:ietf:params:oauth:token-type:access_token",
+                "audience": CLIENT_ID,
+                "requested_subject": username,
+            }
+        ),
+    )
+
+
+def _request_minio_credentials(access_token: str):
+    r = requests.post(
+        f"{MINIO_STS_URL}?Action=AssumeRoleWithWebIdentity&WebIdentityToken={access_token}&Version=2011-06-15"
+    )
+    root = ET.fromstring(r.text)
+    credentials = root.find(f".//{STS_NAMESPACE}Credentials")
+    access_key_id = credentials.find(f".//{STS_NAMESPACE}AccessKeyId").text
+    secret_access_key = credentials.find(f".//{STS_NAMESPACE}SecretAccessKey").text
+    session_token = credentials.find(f".//{STS_NAMESPACE}SessionToken").text
+    expiration = credentials.find(f".//{STS_NAMESPACE}Expiration")
+    if expiration is not None:
+        expires_at = datetime.fromisoformat(
+            expiration.text.replace("Z", "+00:00")
+        ).timestamp()
+    else:
+        expires_at = time.time() + DEFAULT_LIFETIME_SECONDS
+    # The STS credentials must not outlive the token they were issued for
+    expires_at = min(expires_at, get_token_expiry(access_token))
+    return (access_key_id, secret_access_key, session_token), expires_at
+
+
+def get_minio_credentials(access_token: str):
+    """
+    Get temporary MinIO credentials for an access token.
+
+    :return: Tuple (access_key, secret_key, session_token)
+    """
+    return credential_cache.get(
+        ("minio", access_token),
+        lambda: _request_minio_credentials(access_token),
+    )
+
+
+def log_credential_cache_stats():
+    stats = credential_cache.stats()
+    logger.info(
+        "Credential cache: %d hits, %d misses, %d entries",
+        stats["hits"],
+        stats["misses"],
+        stats["size"],
+    )
@@ -1,10 +1,20 @@
 import os
+import io
 import glob
+import json
+import time
+import hashlib
 import functools
 import shutil
 import requests
+from minio.error import S3Error
 from kaapana.blueprints.kaapana_global_variables import SERVICES_NAMESPACE
-from kaapana.operators.HelperMinio import HelperMinio
+from kaapana.operators.HelperMinio import (
+    HelperMinio,
+    MULTIPART_PART_SIZE,
+    MULTIPART_PARALLEL_UPLOADS,
+)
+from kaapana.operators.HelperAuth import log_credential_cache_stats
 from kaapana.operators.HelperFederated import raise_kaapana_connection_error
 from kaapana.blueprints.kaapana_utils import (
     get_operator_properties,
@@ -18,34 +28,320 @@ JOB_API_URL = f"http://kaapana-backend-service.{SERVICES_NAMESPACE}.svc:5000/cli
 TIMEOUT_SEC = 5
 TIMEOUT = Timeout(TIMEOUT_SEC)
 
+CACHE_BUCKET = "cache"
+CACHE_MANIFEST_PREFIX = "manifests/"
+CACHE_OBJECT_PREFIX = "objects/"
+CACHE_MAX_AGE_DAYS = float(os.getenv("CACHE_MAX_AGE_DAYS", "30"))
+CACHE_MAX_SIZE_GB = float(os.getenv("CACHE_MAX_SIZE_GB", "100"))
+HASH_CHUNK_SIZE = 1024 * 1024
+# Operator attributes which do not influence the output of an operator
+CACHE_KEY_IGNORED_ATTRIBUTES = {
+    "manage_cache",
+    "pool",
+    "pool_slots",
+    "priority_weight",
+    "retries",
+    "delete_input_on_success",
+    "delete_output_on_start",
+}
+# Fields the backend adds to the workflow form of every workflow, they identify the run and not its parameters
+CACHE_KEY_IGNORED_FORM_FIELDS = {
+    "username",
+    "workflow_id",
+    "workflow_name",
+    "involved_instances",
+    "runner_instances",
+}
 
-def cache_action(batch_name, cache_operator_dirs, action, dag_run_dir, dag_run):
-    loaded_from_cache = True
-    batch_folders = sorted(
-        [f for f in glob.glob(os.path.join(dag_run_dir, batch_name, "*"))]
+
+def file_md5(file_path):
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def list_files(root_dir):
+    """
+    Relative paths of all files below root_dir in a stable order.
+    """
+    file_paths = []
+    for path, _, files in os.walk(root_dir):
+        for name in files:
+            file_paths.append(os.path.relpath(os.path.join(path, name), root_dir))
+    return sorted(file_paths)
+
+
+def get_params_digest(operator, conf):
+    """
+    Hash of everything besides the input files that determines the output of an operator:
+    its class, task id, static parameters and the workflow form of the dag run
+    without the fields identifying the workflow.
+    """
+    params = {}
+    for name, value in sorted(vars(operator).items()):
+        if name.startswith("_") or name in CACHE_KEY_IGNORED_ATTRIBUTES:
+            continue
+        try:
+            params[name] = json.dumps(value, sort_keys=True)
+        except (TypeError, ValueError):
+            continue
+    conf = conf or {}
+    key_data = {
+        "operator": type(operator).__name__,
+        "task_id": operator.task_id,
+        "params": params,
+        "workflow_form": get_form_params(conf.get("workflow_form")),
+        "form_data": get_form_params(conf.get("form_data")),
+    }
+    return hashlib.sha256(
+        json.dumps(key_data, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def get_form_params(form):
+    if not isinstance(form, dict):
+        return form
+    return {
+        key: value
+        for key, value in form.items()
+        if key not in CACHE_KEY_IGNORED_FORM_FIELDS
+    }
+
+
+def get_cache_key(params_digest, batch_element_dir, operator_in_dir):
+    """
+    Content address of the output of an operator for one batch element.
+
+    The key covers the params digest and the content of the operator input directory,
+    so identical series processed with identical parameters share a cache entry across dag runs.
+    Operators without an input directory are addressed by the name of the batch element.
+    """
+    key = hashlib.sha256(params_digest.encode())
+    input_dir = (
+        os.path.join(batch_element_dir, operator_in_dir) if operator_in_dir else None
     )
-    if not batch_folders:
-        loaded_from_cache = False
-
-    local_root_dir = os.path.join(dag_run_dir, batch_name)
-    for batch_element_dir in batch_folders:
-        for cache_operator_dir in cache_operator_dirs:
-            element_output_dir = os.path.join(batch_element_dir, cache_operator_dir)
-            rel_dir = os.path.relpath(element_output_dir, local_root_dir)
-            rel_dir = "" if rel_dir == "." else rel_dir
-            object_dirs = [rel_dir]
-            minioClient = HelperMinio(dag_run=dag_run)
-            minioClient.apply_action_to_object_dirs(
-                action,
-                "cache",
-                local_root_dir,
-                object_dirs=object_dirs,
+    if input_dir is not None and os.path.isdir(input_dir):
+        for rel_path in list_files(input_dir):
+            key.update(rel_path.encode())
+            key.update(file_md5(os.path.join(input_dir, rel_path)).encode())
+    else:
+        key.update(os.path.basename(batch_element_dir).encode())
+    return key.hexdigest()
+
+
+def load_manifest(minioClient, cache_key):
+    try:
+        response = minioClient.get_object(
+            CACHE_BUCKET, f"{CACHE_MANIFEST_PREFIX}{cache_key}.json"
+        )
+    except S3Error:
+        return None
+    try:
+        return json.loads(response.read())
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def transfer_cache_object(minioClient, action, object_name, file_path, md5):
+    """
+    Transfer a single cache object unless the target already has the same content.
+
+    :return: The number of transferred bytes or None if the object was skipped.
+    """
+    if action == "get":
+        if os.path.isfile(file_path) and file_md5(file_path) == md5:
+            return None
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        return minioClient.fget_object(CACHE_BUCKET, object_name, file_path).size
+
+    try:
+        stat = minioClient.stat_object(CACHE_BUCKET, object_name)
+        # Multipart uploads have no md5 ETag, so the md5 is stored as user metadata as well
+        if md5 in (stat.etag, stat.metadata.get("x-amz-meta-md5")):
+            return None
+    except S3Error:
+        pass
+    minioClient.fput_object(
+        CACHE_BUCKET,
+        object_name,
+        file_path,
+        metadata={"md5": md5},
+        part_size=MULTIPART_PART_SIZE,
+        num_parallel_uploads=MULTIPART_PARALLEL_UPLOADS,
+    )
+    return os.path.getsize(file_path)
+
+
+def transfer_cache_objects(minioClient, action, transfers):
+    """
+    Run transfer_cache_object for all (object_name, file_path, md5) tuples in parallel.
+    """
+    minioClient.map_transfers(
+        f"Cache {action}",
+        lambda transfer: transfer_cache_object(minioClient, action, *transfer),
+        transfers,
+    )
+
+
+def put_cache_entry(minioClient, cache_key, output_dir):
+    """
+    Upload the output of a batch element and its manifest.
+    """
+    files = [
+        {
+            "path": rel_path,
+            "md5": file_md5(os.path.join(output_dir, rel_path)),
+            "size": os.path.getsize(os.path.join(output_dir, rel_path)),
+        }
+        for rel_path in list_files(output_dir)
+    ]
+    transfer_cache_objects(
+        minioClient,
+        "put",
+        [
+            (
+                f"{CACHE_OBJECT_PREFIX}{cache_key}/{entry['path']}",
+                os.path.join(output_dir, entry["path"]),
+                entry["md5"],
             )
-            try:
-                if len(os.listdir(element_output_dir)) == 0:
-                    loaded_from_cache = False
-            except FileNotFoundError:
+            for entry in files
+        ],
+    )
+    manifest = json.dumps(
+        {"cache_key": cache_key, "created": time.time(), "files": files}
+    ).encode()
+    minioClient.put_object(
+        CACHE_BUCKET,
+        f"{CACHE_MANIFEST_PREFIX}{cache_key}.json",
+        io.BytesIO(manifest),
+        len(manifest),
+        content_type="application/json",
+        metadata={"size": str(sum(entry["size"] for entry in files))},
+    )
+
+
+def get_cache_entry(minioClient, manifest, output_dir):
+    """
+    Download the output of a batch element listed in its manifest.
+    """
+    transfer_cache_objects(
+        minioClient,
+        "get",
+        [
+            (
+                f"{CACHE_OBJECT_PREFIX}{manifest['cache_key']}/{entry['path']}",
+                os.path.join(output_dir, entry["path"]),
+                entry["md5"],
+            )
+            for entry in manifest["files"]
+        ],
+    )
+
+
+def remove_cache_entries(minioClient, cache_keys):
+    object_names = []
+    for cache_key in cache_keys:
+        object_names.append(f"{CACHE_MANIFEST_PREFIX}{cache_key}.json")
+        object_names.extend(
+            obj.object_name
+            for obj in minioClient.list_objects(
+                CACHE_BUCKET,
+                prefix=f"{CACHE_OBJECT_PREFIX}{cache_key}/",
+                recursive=True,
+            )
+        )
+    minioClient.remove_files(CACHE_BUCKET, object_names)
+
+
+def evict_cache(minioClient):
+    """
+    Remove cache entries older than CACHE_MAX_AGE_DAYS and, oldest first,
+    as many entries as needed to keep the cache below CACHE_MAX_SIZE_GB.
+    """
+    entries = []
+    for obj in minioClient.list_objects(
+        CACHE_BUCKET, prefix=CACHE_MANIFEST_PREFIX, include_user_meta=True
+    ):
+        metadata = obj.metadata or {}
+        size = int(metadata.get("X-Amz-Meta-Size", metadata.get("x-amz-meta-size", 0)))
+        cache_key = obj.object_name[len(CACHE_MANIFEST_PREFIX) : -len(".json")]
+        entries.append((obj.last_modified.timestamp(), size, cache_key))
+    entries.sort()
+
+    min_timestamp = time.time() - CACHE_MAX_AGE_DAYS * 24 * 60 * 60
+    max_size = CACHE_MAX_SIZE_GB * 1024**3
+    total_size = sum(size for _, size, _ in entries)
+    evicted = []
+    for timestamp, size, cache_key in entries:
+        if timestamp >= min_timestamp and total_size <= max_size:
+            break
+        evicted.append(cache_key)
+        total_size -= size
+    if evicted:
+        print(f"Evicting {len(evicted)} cache entries")
+        remove_cache_entries(minioClient, evicted)
+
+
+def get_cache_keys(operator, dag_run_dir, dag_run):
+    """
+    Cache keys of all batch elements of the dag run, see get_cache_key().
+    """
+    batch_folders = sorted(
+        [f for f in glob.glob(os.path.join(dag_run_dir, operator.batch_name, "*"))]
+    )
+    params_digest = get_params_digest(operator, dag_run.conf)
+    operator_in_dir = getattr(operator, "operator_in_dir", None)
+    cache_keys = {
+        batch_element_dir: get_cache_key(
+            params_digest, batch_element_dir, operator_in_dir
+        )
+        for batch_element_dir in batch_folders
+    }
+    print(f"Cache keys: {json.dumps(cache_keys, indent=4)}")
+    return cache_keys
+
+
+def cache_action(minioClient, cache_keys, operator_out_dir, action):
+    """
+    Apply action ('get', 'put' or 'remove') to the cached output of all batch elements.
+
+    :return: For 'get', True if the output of every batch element was loaded from the cache.
+    """
+    if not cache_keys:
+        return False
+
+    loaded_from_cache = True
+    if action == "get":
+        manifests = {}
+        for batch_element_dir, cache_key in cache_keys.items():
+            manifest = load_manifest(minioClient, cache_key)
+            if manifest is None or not manifest["files"]:
+                print(f"Cache miss for {batch_element_dir}")
                 loaded_from_cache = False
+                break
+            manifests[batch_element_dir] = manifest
+        if loaded_from_cache:
+            for batch_element_dir, manifest in manifests.items():
+                get_cache_entry(
+                    minioClient,
+                    manifest,
+                    os.path.join(batch_element_dir, operator_out_dir),
+                )
+    elif action == "put":
+        for batch_element_dir, cache_key in cache_keys.items():
+            output_dir = os.path.join(batch_element_dir, operator_out_dir)
+            if os.path.isdir(output_dir):
+                put_cache_entry(minioClient, cache_key, output_dir)
+        evict_cache(minioClient)
+    elif action == "remove":
+        remove_cache_entries(minioClient, cache_keys.values())
+    else:
+        raise NameError("You need to define an action: get, remove or put!")
+
+    log_credential_cache_stats()
     return loaded_from_cache
 
 
@@ -183,17 +479,19 @@ def cache_operator_output(func):
                 )
                 return
 
+        if self.manage_cache != "ignore":
+            minioClient = HelperMinio(dag_run=dag_run)
+            minioClient.make_bucket(CACHE_BUCKET)
+            # Computed before the operator runs, as it may modify its input
+            cache_keys = get_cache_keys(self, dag_run_dir, dag_run)
+
         if self.manage_cache == "overwrite" or self.manage_cache == "clear":
-            cache_action(
-                self.batch_name, cache_operator_dirs, "remove", dag_run_dir, dag_run
-            )
+            cache_action(minioClient, cache_keys, self.operator_out_dir, "remove")
             print("Clearing cache")
 
         if self.manage_cache == "cache":
             if (
-                cache_action(
-                    self.batch_name, cache_operator_dirs, "get", dag_run_dir, dag_run
-                )
+                cache_action(minioClient, cache_keys, self.operator_out_dir, "get")
                 is True
             ):
                 print(f'{", ".join(cache_operator_dirs)} output loaded from cache')
@@ -205,9 +503,9 @@ def cache_operator_output(func):
             raise e
 
         if self.manage_cache == "cache" or self.manage_cache == "overwrite":
-            cache_action(
-                self.batch_name, cache_operator_dirs, "put", dag_run_dir, dag_run
-            )
+            # the operator may have run for hours, the client is created with fresh credentials
+            minioClient = HelperMinio(dag_run=dag_run)
+            cache_action(minioClient, cache_keys, self.operator_out_dir, "put")
             print(f'{", ".join(cache_operator_dirs)} output saved to cache')
         else:
             print("Caching is not used!")
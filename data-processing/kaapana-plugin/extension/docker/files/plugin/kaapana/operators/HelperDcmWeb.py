@@ -1,14 +1,19 @@
 import requests
+import base64
+import hashlib
 import logging
 import os
 import tempfile
 import time
 import pydicom
+from multiprocessing.pool import ThreadPool
 from dicomweb_client.api import DICOMwebClient
 from typing import List
 from os.path import join
 from pathlib import Path
 from glob import glob
+from kaapana.operators.HelperMultipart import write_multipart_dicom
+from kaapana.operators import HelperAuth
 from kaapana.blueprints.kaapana_global_variables import (
     SERVICES_NAMESPACE,
     OIDC_CLIENT_SECRET,
@@ -18,11 +23,31 @@ from kaapana.blueprints.kaapana_global_variables import (
 
 logger = logging.getLogger(__name__)
 
+# Size of the chunks in which instances are streamed from the archive to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Connections kept open to the archive, requests of further threads would wait for a free connection
+DEFAULT_MAX_CONNECTIONS = 10
+
 
 class DcmWebException(Exception):
     pass
 
 
+class DcmWebAuth(requests.auth.AuthBase):
+    """
+    Sets the current access token on every request, so that a long-lived session does not use an expired token.
+    """
+
+    def __init__(self, get_access_token):
+        self.get_access_token = get_access_token
+
+    def __call__(self, request):
+        access_token = self.get_access_token()
+        request.headers["Authorization"] = f"Bearer {access_token}"
+        request.headers["x-forwarded-access-token"] = access_token
+        return request
+
+
 class HelperDcmWeb:
     """
     Helper class for making authorized requests against a dcm4chee archive.
@@ -34,12 +59,14 @@ class HelperDcmWeb:
         dag_run=None,
         username: str = None,
         access_token: str = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
     ):
         """
         :param application_entity: Title of the application entity to communicate with
         :param dag_run: Airflow dag object.
         :param username: Username of the keycloak user that wants to communicate with dcm4chee.
         :access_token: Access token that should be used for communication with dcm4chee.
+        :param max_connections: Size of the connection pool, should match the number of threads using the helper.
         """
         assert dag_run or username or access_token
         self.dcmweb_endpoint = (
@@ -68,61 +95,44 @@ class HelperDcmWeb:
             self.username = None
 
         ### Set access token for requests to dcm4chee
-        if access_token:
-            self.access_token = access_token
+        self.fixed_access_token = access_token
+        self.access_token = self.get_access_token()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.auth = DcmWebAuth(self.get_access_token)
+        self.client = DICOMwebClient(
+            url=f"{self.dcmweb_endpoint}/{self.application_entity}/rs",
+            session=self.session,
+        )
+
+    def get_access_token(self):
+        """
+        Get the access token for the next request.
+
+        Tokens from the process-wide credential cache are refreshed before they expire,
+        a given access token is used as is.
+        """
+        if self.fixed_access_token:
+            self.access_token = self.fixed_access_token
         elif self.username == self.system_user:
             self.access_token = self.get_system_user_token()
         else:
             self.access_token = self.impersonate_user()
-        self.auth_headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "x-forwarded-access-token": self.access_token,
-        }
-        self.client = DICOMwebClient(
-            url=f"{self.dcmweb_endpoint}/{self.application_entity}/rs",
-            headers=self.auth_headers,
-        )
-        self.session = requests.Session()
-        self.session.headers.update(self.auth_headers)
+        return self.access_token
 
-    def get_system_user_token(
-        self,
-        ssl_check=False,
-    ):
+    def get_system_user_token(self):
         """
-        Get access token for the system user.
+        Get access token for the system user from the process-wide credential cache.
         """
-        payload = {
-            "username": self.system_user,
-            "password": self.system_user_password,
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "grant_type": "password",
-        }
-        url = f"http://keycloak-external-service.admin.svc:80/auth/realms/{self.client_id}/protocol/openid-connect/token"
-        r = requests.post(url, verify=ssl_check, data=payload)
-        access_token = r.json()["access_token"]
-        return access_token
+        return HelperAuth.get_system_user_token()
 
     def impersonate_user(self):
         """
-        Get access token for a user via token exchange.
+        Get access token for a user via token exchange from the process-wide credential cache.
         """
-        admin_access_token = self.get_system_user_token()
-        url = f"http://keycloak-external-service.admin.svc:80/auth/realms/{self.client_id}/protocol/openid-connect/token"
-        data = {
-            "client_id": self.client_id,
-            "client_secret": OIDC_CLIENT_SECRET,
-            "grant_type": "urn:ietf:params:oauth:grant-type:token-exchange",
-            "subject_token": admin_access_token,  # Replace with your actual subject_token
-            "requested_token_type": "urn:ietf:params:oauth:token-type:access_token",
-            "audience": "kaapana",
-            "requested_subject": self.username,
-        }
-
-        r = requests.post(url, data=data, verify=False)
-        impersonated_access_token = r.json()["access_token"]
-        return impersonated_access_token
+        return HelperAuth.get_user_token(self.username)
 
     def check_if_series_in_archive(self, seriesUID):
         """
@@ -154,7 +164,25 @@ class HelperDcmWeb:
         target_dir,
         expected_object_count=None,
         include_series_dir=False,
+        parallel_instance_downloads=4,
+        retrieval_mode="instances",
     ):
+        """
+        Download all instances of a series into target_dir.
+
+        With retrieval_mode 'instances' every instance is requested via WADO-URI and streamed to disk by a bounded pool of threads.
+        With retrieval_mode 'series' the whole series is requested with a single WADO-RS request and the multipart response is written to disk while it is received.
+        Instances that already exist in target_dir are verified and skipped, so an interrupted download can be resumed by calling this method again.
+        Partially received instances are removed if the download fails.
+        If the series retrieval fails, the instances which were not received completely are requested one by one.
+
+        :param series_uid: SeriesInstanceUID of the series to download.
+        :param target_dir: Directory the instances are written to.
+        :param expected_object_count: Number of objects that must be present in the archive.
+        :param include_series_dir: Whether to create a sub directory named series_uid in target_dir.
+        :param parallel_instance_downloads: Number of instances that are downloaded in parallel.
+        :param retrieval_mode: 'instances' (WADO-URI per instance) or 'series' (single WADO-RS request).
+        """
         payload = {"SeriesInstanceUID": series_uid}
         url = f"{self.dcmweb_endpoint}/{self.application_entity}/rs/instances"
         httpResponse = self.session.get(url, params=payload)
@@ -201,18 +229,48 @@ class HelperDcmWeb:
                     f"expected_object_count {expected_object_count} <= len(objectUIDList) {len(objectUIDList)} --> success!"
                 )
 
-            for object_uid in objectUIDList:
-                study_uid = object_uid[0]
-                object_uid = object_uid[1]
-                result = self.downloadObject(
-                    study_uid=study_uid,
+            if retrieval_mode == "series":
+                if self.downloadSeriesMultipart(
+                    study_uid=objectUIDList[0][0],
                     series_uid=series_uid,
-                    object_uid=object_uid,
                     target_dir=target_dir,
+                    object_uids=[object_uid for _, object_uid, _ in objectUIDList],
+                ):
+                    return True
+                # complete instances are kept and skipped by the instance downloads
+                self.remove_partial_files(target_dir)
+                logger.warning(
+                    "Retrieval of series %s failed -> downloading its instances",
+                    series_uid,
                 )
-                if not result:
-                    return False
 
+            download_list = [
+                {
+                    "study_uid": study_uid,
+                    "series_uid": series_uid,
+                    "object_uid": object_uid,
+                    "target_dir": target_dir,
+                }
+                for study_uid, object_uid, _ in objectUIDList
+            ]
+            start_time = time.time()
+            with ThreadPool(max(1, parallel_instance_downloads)) as threadpool:
+                # all downloads are awaited, so that no thread writes into target_dir anymore
+                results = list(
+                    threadpool.imap_unordered(
+                        lambda kwargs: self.downloadObject(**kwargs), download_list
+                    )
+                )
+            if not all(results):
+                return False
+            duration = time.time() - start_time
+            logger.info(
+                "Downloaded %d instances of series %s in %.2fs (%.1f instances/s)",
+                len(download_list),
+                series_uid,
+                duration,
+                len(download_list) / duration if duration > 0 else 0,
+            )
             return True
         else:
             print("################################")
@@ -224,7 +282,106 @@ class HelperDcmWeb:
             print("################################")
             return False
 
+    def downloadSeriesMultipart(self, study_uid, series_uid, target_dir, object_uids):
+        """
+        Retrieve a series with a single WADO-RS request and write the multipart response into target_dir.
+
+        The response is parsed incrementally, so memory usage does not depend on the size of the series.
+        """
+        if all(
+            self.is_complete_instance(
+                os.path.join(target_dir, f"{object_uid}.dcm"), object_uid
+            )
+            for object_uid in object_uids
+        ):
+            logger.info("Series %s already exists -> skipping", series_uid)
+            return True
+
+        url = f"{self.dcmweb_endpoint}/{self.application_entity}/rs/studies/{study_uid}/series/{series_uid}"
+        # transfer-syntax=* returns the instances as stored instead of transcoding them
+        headers = {
+            "Accept": 'multipart/related; type="application/dicom"; transfer-syntax=*'
+        }
+        start_time = time.time()
+        with self.session.get(url, headers=headers, stream=True) as response:
+            if response.status_code != 200:
+                print("################################")
+                print("#")
+                print("# Download of requested series was not successful!")
+                print(f"# seriesUID: {series_uid}")
+                print(f"# studyUID: {study_uid}")
+                print(f"# Status code: {response.status_code}")
+                print("#")
+                print("################################")
+                return False
+            try:
+                written_files = write_multipart_dicom(
+                    chunks=response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE),
+                    content_type=response.headers["Content-Type"],
+                    target_dir=target_dir,
+                )
+            except (
+                KeyError,
+                ValueError,
+                pydicom.errors.InvalidDicomError,
+                requests.RequestException,
+            ) as e:
+                # e.g. a ChunkedEncodingError of a connection that broke while the series was streamed
+                logger.error("Could not receive multipart response: %s", e)
+                return False
+
+        written_uids = [Path(file_path).stem for file_path in written_files]
+        if sorted(written_uids) != sorted(object_uids):
+            for file_path in written_files:
+                if Path(file_path).stem not in object_uids:
+                    os.remove(file_path)
+            print("################################")
+            print("#")
+            print("# Received instances do not match the archive!")
+            print(f"# seriesUID: {series_uid}")
+            print(f"# Received instances: {len(written_files)}")
+            print(f"# Expected instances: {len(object_uids)}")
+            print(f"# Missing: {sorted(set(object_uids) - set(written_uids))}")
+            print(f"# Unexpected: {sorted(set(written_uids) - set(object_uids))}")
+            print("#")
+            print("################################")
+            return False
+
+        duration = time.time() - start_time
+        logger.info(
+            "Downloaded %d instances of series %s in %.2fs (%.1f instances/s)",
+            len(written_files),
+            series_uid,
+            duration,
+            len(written_files) / duration if duration > 0 else 0,
+        )
+        return True
+
     def downloadObject(self, study_uid, series_uid, object_uid, target_dir):
+        """
+        Stream a single instance via WADO-URI into target_dir.
+
+        The instance is written to a temporary ".part" file and only renamed to "<object_uid>.dcm"
+        after the number of received bytes and, if provided by the archive, the Content-MD5 checksum have been verified.
+        Already existing instances are verified and not downloaded again.
+        """
+        fileName = object_uid + ".dcm"
+        filePath = os.path.join(target_dir, fileName)
+        if self.is_complete_instance(filePath, object_uid):
+            logger.debug("Instance %s already exists -> skipping", filePath)
+            return True
+
+        try:
+            return self._download_object(study_uid, series_uid, object_uid, filePath)
+        except Exception as e:
+            # e.g. a connection that broke while the instance was streamed
+            logger.error("Download of instance %s failed: %s", object_uid, e)
+            if os.path.isfile(filePath + ".part"):
+                os.remove(filePath + ".part")
+            return False
+
+    def _download_object(self, study_uid, series_uid, object_uid, filePath):
+
         payload = {
             "requestType": "WADO",
             "studyUID": study_uid,
@@ -233,27 +390,87 @@ class HelperDcmWeb:
             "contentType": "application/dicom",
         }
         url = f"{self.dcmweb_endpoint}/{self.application_entity}/wado"
-        response = self.session.get(url, params=payload)
-        if response.status_code == 200:
-            fileName = object_uid + ".dcm"
-            filePath = os.path.join(target_dir, fileName)
-            with open(filePath, "wb") as f:
-                f.write(response.content)
+        with self.session.get(url, params=payload, stream=True) as response:
+            if response.status_code == 200:
+                partPath = filePath + ".part"
+                md5 = hashlib.md5()
+                received_bytes = 0
+                with open(partPath, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        md5.update(chunk)
+                        received_bytes += len(chunk)
+
+                # Content-Length refers to the encoded body if a Content-Encoding is used
+                expected_bytes = (
+                    response.headers.get("Content-Length")
+                    if "Content-Encoding" not in response.headers
+                    else None
+                )
+                expected_md5 = response.headers.get("Content-MD5")
+                if (
+                    expected_bytes is not None and int(expected_bytes) != received_bytes
+                ) or (
+                    expected_md5 is not None
+                    and base64.b64decode(expected_md5) != md5.digest()
+                ):
+                    os.remove(partPath)
+                    print("################################")
+                    print("#")
+                    print("# Checksum verification of requested objectUID failed!")
+                    print(f"# seriesUID: {series_uid}")
+                    print(f"# objectUID: {object_uid}")
+                    print(f"# Received bytes: {received_bytes}")
+                    print(f"# Expected bytes: {expected_bytes}")
+                    print("#")
+                    print("################################")
+                    return False
 
-            return True
+                os.replace(partPath, filePath)
+                return True
 
-        else:
-            print("################################")
-            print("#")
-            print("# Download of requested objectUID was not successful!")
-            print(f"# seriesUID: {series_uid}")
-            print(f"# studyUID: {study_uid}")
-            print(f"# objectUID: {object_uid}")
-            print(f"# Status code: {response.status_code}")
-            print(f"# Response content: {response.content}")
-            print("#")
-            print("################################")
+            else:
+                print("################################")
+                print("#")
+                print("# Download of requested objectUID was not successful!")
+                print(f"# seriesUID: {series_uid}")
+                print(f"# studyUID: {study_uid}")
+                print(f"# objectUID: {object_uid}")
+                print(f"# Status code: {response.status_code}")
+                print(f"# Response content: {response.content}")
+                print("#")
+                print("################################")
+                return False
+
+    @staticmethod
+    def is_complete_instance(file_path, object_uid):
+        """
+        Check if file_path is a DICOM file of the instance object_uid.
+
+        Invalid files are removed, so that they are downloaded again.
+        """
+        if not os.path.isfile(file_path):
             return False
+        try:
+            sop_instance_uid = pydicom.dcmread(
+                file_path, stop_before_pixels=True, specific_tags=["SOPInstanceUID"]
+            ).SOPInstanceUID
+        except Exception as e:
+            sop_instance_uid = None
+            logger.warning("Could not read existing instance %s: %s", file_path, e)
+        if sop_instance_uid != object_uid:
+            logger.warning("Removing invalid instance %s", file_path)
+            os.remove(file_path)
+            return False
+        return True
+
+    @staticmethod
+    def remove_partial_files(target_dir):
+        """
+        Remove the parts a failed multipart retrieval left in target_dir.
+        """
+        for part_path in glob(os.path.join(target_dir, "*.part")):
+            os.remove(part_path)
 
     def reject_study(self, study_uid: str, application_entity: str = None):
         """
@@ -317,7 +534,7 @@ class HelperDcmWeb:
         """
         application_entity = application_entity or self.application_entity
         url = f"{self.dcmweb_endpoint}/{application_entity}/rs/studies/{study_uid}/instances"
-        response = requests.get(url, headers=self.auth_headers)
+        response = self.session.get(url)
         if response.status_code == 404:
             return None
         elif response.status_code == 204:
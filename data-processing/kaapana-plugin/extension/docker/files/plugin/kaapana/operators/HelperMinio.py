@@ -1,22 +1,87 @@
 import os
 import pathlib
+import threading
+import time
 from datetime import timedelta
+from multiprocessing.pool import ThreadPool
 import logging
-import requests
-import xml.etree.ElementTree as ET
 
 from minio import Minio
+from minio.credentials import Credentials, Provider
+from minio.deleteobjects import DeleteObject
 from minio.error import InvalidResponseError, S3Error
 
 from kaapana.blueprints.kaapana_global_variables import (
     SERVICES_NAMESPACE,
     OIDC_CLIENT_SECRET,
     SYSTEM_USER_PASSWORD,
-    ADMIN_NAMESPACE,
 )
+from kaapana.operators import HelperAuth
 
 logger = logging.getLogger(__name__)
 
+# Number of objects transferred concurrently by apply_action_to_object_names/-dirs
+TRANSFER_THREADS = 8
+# Files larger than this are uploaded as multipart upload with parts of this size
+MULTIPART_PART_SIZE = 64 * 1024 * 1024
+MULTIPART_PARALLEL_UPLOADS = 4
+PROGRESS_LOG_INTERVAL_SECONDS = 10
+
+
+class TransferStats:
+    """
+    Thread-safe progress and throughput metrics of a batch of object transfers.
+    """
+
+    def __init__(self, action, total):
+        self.action = action
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.start_time = time.time()
+        self._last_log = self.start_time
+        self._lock = threading.Lock()
+
+    def add(self, transferred_bytes):
+        """
+        :param transferred_bytes: Size of the transferred object or None if it was skipped.
+        """
+        with self._lock:
+            self.done += 1
+            if transferred_bytes is None:
+                self.skipped += 1
+            else:
+                self.bytes += transferred_bytes
+            now = time.time()
+            if now - self._last_log >= PROGRESS_LOG_INTERVAL_SECONDS:
+                self._last_log = now
+                logger.info(
+                    "%s: %d/%d objects (%s)", self.action, self.done, self.total, self
+                )
+
+    def __str__(self):
+        duration = max(time.time() - self.start_time, 1e-6)
+        return (
+            f"{self.done - self.skipped} transferred, {self.skipped} skipped, "
+            f"{self.bytes / 1024**2:.1f} MiB in {duration:.2f}s, "
+            f"{self.bytes / 1024**2 / duration:.1f} MiB/s, {self.done / duration:.1f} objects/s"
+        )
+
+
+class HelperMinioCredentials(Provider):
+    """
+    Provides the current credentials of a HelperMinio for every request,
+    so that a long-lived client does not use expired credentials.
+    """
+
+    def __init__(self, helper):
+        self.helper = helper
+
+    def retrieve(self):
+        access_key, secret_key, session_token = self.helper.minio_credentials()
+        return Credentials(access_key, secret_key, session_token)
+
 
 class HelperMinio(Minio):
     """
@@ -57,98 +122,74 @@ class HelperMinio(Minio):
             self.username = None
 
         ### Set access token for requests to minio
-        if access_token:
-            self.access_token = access_token
-        elif self.username == self.system_user:
-            self.access_token = self.get_system_user_token()
-        else:
-            self.access_token = self.impersonate_user()
-
-        access_key, secret_key, session_token = self.minio_credentials()
+        self.fixed_access_token = access_token
+        # fails early if no credentials can be obtained, they are retrieved again for every request
+        self.minio_credentials()
+        # Buckets which are known to exist, so that make_bucket is called once per bucket
+        self.existing_buckets = set()
 
         super().__init__(
             f"minio-service.{SERVICES_NAMESPACE}.svc:9000",
-            access_key=access_key,
-            secret_key=secret_key,
-            session_token=session_token,
+            credentials=HelperMinioCredentials(self),
             secure=False,
         )
 
-    def get_system_user_token(
-        self,
-        ssl_check=False,
-    ):
+    def get_access_token(self):
+        """
+        Get the access token for the next request.
+
+        Tokens from the process-wide credential cache are refreshed before they expire,
+        a given access token is used as is.
+        """
+        if self.fixed_access_token:
+            self.access_token = self.fixed_access_token
+        elif self.username == self.system_user:
+            self.access_token = self.get_system_user_token()
+        else:
+            self.access_token = self.impersonate_user()
+        return self.access_token
+
+    def get_system_user_token(self):
         """
-        Get access token for the system user.
+        Get access token for the system user from the process-wide credential cache.
         """
-        payload = {
-            "username": self.system_user,
-            "password": self.system_user_password,
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "grant_type": "password",
-        }
-        url = f"http://keycloak-external-service.{ADMIN_NAMESPACE}.svc:80/auth/realms/{self.client_id}/protocol/openid-connect/token"
-        r = requests.post(url, verify=ssl_check, data=payload)
-        access_token = r.json()["access_token"]
-        return access_token
+        return HelperAuth.get_system_user_token()
 
     def impersonate_user(self):
         """
-        Get access token for a user via token exchange.
+        Get access token for a user via token exchange from the process-wide credential cache.
         """
-        admin_access_token = self.get_system_user_token()
-        url = f"http://keycloak-external-service.{ADMIN_NAMESPACE}.svc:80/auth/realms/{self.client_id}/protocol/openid-connect/token"
-        data = {
-            "client_id": self.client_id,
-            "client_secret": OIDC_CLIENT_SECRET,
-            "grant_type": "urn:ietf:params:oauth:grant-type:token-exchange",
-            "subject_token": admin_access_token,  # Replace with your actual subject_token
-            "requested_token_type": "urn:ietf:params:oauth:token-type:access_token",
-            "audience": "kaapana",
-            "requested_subject": self.username,
-        }
-
-        r = requests.post(url, data=data, verify=False)
-        impersonated_access_token = r.json()["access_token"]
-        return impersonated_access_token
+        return HelperAuth.get_user_token(self.username)
 
     def minio_credentials(self):
-        r = requests.post(
-            f"http://minio-service.{SERVICES_NAMESPACE}.svc:9000?Action=AssumeRoleWithWebIdentity&WebIdentityToken={self.access_token}&Version=2011-06-15"
-        )
-        xml_response = r.text
-        root = ET.fromstring(xml_response)
-        credentials = root.find(
-            ".//{https://sts.amazonaws.com/doc/2011-06-15/}Credentials"
-        )
-        access_key_id = credentials.find(
-            ".//{https://sts.amazonaws.com/doc/2011-06-15/}AccessKeyId"
-        ).text
-        secret_access_key = credentials.find(
-            ".//{https://sts.amazonaws.com/doc/2011-06-15/}SecretAccessKey"
-        ).text
-        session_token = credentials.find(
-            ".//{https://sts.amazonaws.com/doc/2011-06-15/}SessionToken"
-        ).text
-        return access_key_id, secret_access_key, session_token
+        """
+        Get temporary MinIO credentials for the access token from the process-wide credential cache.
+        """
+        return HelperAuth.get_minio_credentials(self.get_access_token())
 
     def put_file(self, bucket_name, object_name, file_path):
-        print(f"Creating bucket {bucket_name} if it does not already exist.")
-        self.make_bucket(bucket_name)
+        if bucket_name not in self.existing_buckets:
+            print(f"Creating bucket {bucket_name} if it does not already exist.")
+            self.make_bucket(bucket_name)
         print(f"Putting file: {file_path} to {bucket_name} to {object_name}")
         try:
-            super().fput_object(bucket_name, object_name, file_path)
+            super().fput_object(
+                bucket_name,
+                object_name,
+                file_path,
+                part_size=MULTIPART_PART_SIZE,
+                num_parallel_uploads=MULTIPART_PARALLEL_UPLOADS,
+            )
         except InvalidResponseError as err:
             print(err)
             raise
+        return os.path.getsize(file_path)
 
     def get_file(self, bucket_name, object_name, file_path):
         print(f"Getting file: {object_name} from {bucket_name} to {file_path}")
         try:
-            super().stat_object(bucket_name, object_name)
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            super().fget_object(bucket_name, object_name, file_path)
+            return super().fget_object(bucket_name, object_name, file_path).size
         except S3Error as err:
             print(f"Skipping object {object_name} since it doe not exists in Minio")
         except InvalidResponseError as err:
@@ -162,26 +203,86 @@ class HelperMinio(Minio):
             print(err)
             raise
 
-    def apply_action_to_file(
-        self, action, bucket_name, object_name, file_path, file_white_tuples=None
-    ):
-        print(file_path)
+    def remove_files(self, bucket_name, object_names):
+        """
+        Remove objects with bulk delete requests.
+        """
+        object_names = list(object_names)
+        print(f"Removing {len(object_names)} files from {bucket_name}")
+        errors = list(
+            self.remove_objects(
+                bucket_name, (DeleteObject(name) for name in object_names)
+            )
+        )
+        for error in errors:
+            print(f"Could not remove {error.name}: {error.message}")
+        if errors:
+            raise InvalidResponseError(
+                500, None, f"{len(errors)} objects could not be removed"
+            )
+
+    def is_whitelisted(self, file_path, file_white_tuples=None):
         if file_white_tuples is not None and not file_path.lower().endswith(
             file_white_tuples
         ):
             print(
-                f"Not applying action to object {object_name}, since this action is only allowed for files that end with {file_white_tuples}!"
+                f"Not applying action to {file_path}, since this action is only allowed for files that end with {file_white_tuples}!"
             )
+            return False
+        return True
+
+    def apply_action_to_file(
+        self, action, bucket_name, object_name, file_path, file_white_tuples=None
+    ):
+        print(file_path)
+        if not self.is_whitelisted(file_path, file_white_tuples):
             return
         if action == "get":
-            self.get_file(bucket_name, object_name, file_path)
+            return self.get_file(bucket_name, object_name, file_path)
         elif action == "remove":
             self.remove_file(bucket_name, object_name)
         elif action == "put":
-            self.put_file(bucket_name, object_name, file_path)
+            return self.put_file(bucket_name, object_name, file_path)
         else:
             raise NameError("You need to define an action: get, remove or put!")
 
+    def map_transfers(self, action, transfer, transfers):
+        """
+        Run transfer for all items of transfers in a thread pool and log progress and throughput.
+
+        :param transfer: Callable returning the number of transferred bytes or None if the item was skipped.
+        :return: TransferStats of the batch.
+        """
+        stats = TransferStats(action, len(transfers))
+        if not transfers:
+            return stats
+        with ThreadPool(min(TRANSFER_THREADS, len(transfers))) as threadpool:
+            for transferred_bytes in threadpool.imap_unordered(transfer, transfers):
+                stats.add(transferred_bytes)
+        logger.info("%s finished: %s", action, stats)
+        return stats
+
+    def apply_action_to_files(self, action, bucket_name, files):
+        """
+        Apply action to a batch of (object_name, file_path) tuples.
+
+        Removals are sent as bulk delete requests, gets and puts run in parallel.
+        """
+        if action == "remove":
+            self.remove_files(bucket_name, (object_name for object_name, _ in files))
+            return
+        if action == "put" and files and bucket_name not in self.existing_buckets:
+            print(f"Creating bucket {bucket_name} if it does not already exist.")
+            self.make_bucket(bucket_name)
+        if action not in ("get", "put"):
+            raise NameError("You need to define an action: get, remove or put!")
+        transfer_file = self.get_file if action == "get" else self.put_file
+        self.map_transfers(
+            action,
+            lambda file: transfer_file(bucket_name, *file),
+            files,
+        )
+
     def apply_action_to_object_names(
         self,
         action,
@@ -190,16 +291,14 @@ class HelperMinio(Minio):
         object_names=None,
         file_white_tuples=None,
     ):
+        files = []
         for object_name in object_names:
             file_path = os.path.join(local_root_dir, object_name)
-            if action != "put" or os.path.isfile(file_path):
-                self.apply_action_to_file(
-                    action,
-                    bucket_name,
-                    object_name,
-                    file_path,
-                    file_white_tuples,
-                )
+            if (action != "put" or os.path.isfile(file_path)) and self.is_whitelisted(
+                file_path, file_white_tuples
+            ):
+                files.append((object_name, file_path))
+        self.apply_action_to_files(action, bucket_name, files)
 
     def apply_action_to_object_dirs(
         self,
@@ -210,24 +309,22 @@ class HelperMinio(Minio):
         file_white_tuples=None,
     ):
         object_dirs = object_dirs or []
+        files = []
         if action == "put":
             if not object_dirs:
                 print(f"Uploading everything from {local_root_dir}")
                 object_dirs = [""]
             for object_dir in object_dirs:
-                for path, _, files in os.walk(os.path.join(local_root_dir, object_dir)):
-                    for name in files:
+                for path, _, file_names in os.walk(
+                    os.path.join(local_root_dir, object_dir)
+                ):
+                    for name in file_names:
                         file_path = os.path.join(path, name)
                         rel_dir = os.path.relpath(path, local_root_dir)
                         rel_dir = "" if rel_dir == "." else rel_dir
                         object_name = os.path.join(rel_dir, name)
-                        self.apply_action_to_file(
-                            action,
-                            bucket_name,
-                            object_name,
-                            file_path,
-                            file_white_tuples,
-                        )
+                        if self.is_whitelisted(file_path, file_white_tuples):
+                            files.append((object_name, file_path))
         else:
             try:
                 for bucket_obj in self.list_objects(bucket_name, recursive=True):
@@ -237,15 +334,12 @@ class HelperMinio(Minio):
                     if not object_dirs or str(path_object_name.parents[0]).startswith(
                         tuple(object_dirs)
                     ):
-                        self.apply_action_to_file(
-                            action,
-                            bucket_name,
-                            object_name,
-                            file_path,
-                            file_white_tuples,
-                        )
+                        if self.is_whitelisted(file_path, file_white_tuples):
+                            files.append((object_name, file_path))
             except S3Error as err:
                 print(f"Skipping since bucket {bucket_name} does not exist")
+                return
+        self.apply_action_to_files(action, bucket_name, files)
 
     def make_bucket(self, bucket_name):
         try:
@@ -256,6 +350,7 @@ class HelperMinio(Minio):
         except InvalidResponseError as err:
             print(err)
             raise
+        self.existing_buckets.add(bucket_name)
 
     def get_presigned_link(self, bucket_name, object_name, expires=timedelta(days=2)):
         print("Generating link...")
@@ -0,0 +1,173 @@
+import logging
+import os
+from typing import Iterable, List
+
+import pydicom
+
+logger = logging.getLogger(__name__)
+
+
+def get_multipart_boundary(content_type: str) -> bytes:
+    """
+    Extract the boundary parameter from a multipart Content-Type header.
+
+    :param content_type: Value of the Content-Type header, e.g. 'multipart/related; type="application/dicom"; boundary=abc'
+    :return: The boundary as bytes.
+    """
+    for parameter in content_type.split(";")[1:]:
+        key, _, value = parameter.strip().partition("=")
+        if key.strip().lower() == "boundary":
+            return value.strip().strip('"').encode()
+    raise ValueError(f"No boundary found in Content-Type: {content_type}")
+
+
+class MultipartDicomWriter:
+    """
+    Incremental parser for multipart/related responses containing DICOM instances.
+
+    Chunks of the response body are passed to feed().
+    The body of every part is written directly to a file in target_dir while it is received,
+    so that at most one chunk plus the length of the boundary is held in memory at any time.
+    Finished parts are named after their SOPInstanceUID.
+    """
+
+    def __init__(self, boundary: bytes, target_dir: str):
+        """
+        :param boundary: Multipart boundary of the response, see get_multipart_boundary().
+        :param target_dir: Directory the DICOM instances are written to.
+        """
+        # Prepending CRLF lets the first boundary be matched with the same delimiter as all following ones
+        self.delimiter = b"\r\n--" + boundary
+        self.target_dir = target_dir
+        self.buffer = bytearray(b"\r\n")
+        self.state = "preamble"
+        self.part_count = 0
+        self.part_file = None
+        self.part_path = None
+        self.written_files = []
+
+    def feed(self, chunk: bytes):
+        """
+        Consume the next chunk of the response body.
+        """
+        self.buffer += chunk
+        while self._process():
+            pass
+
+    def close(self) -> List[str]:
+        """
+        Finish parsing.
+
+        :return: Paths of all written DICOM files.
+        :raises ValueError: If the response ended before the closing boundary.
+        """
+        if self.state != "epilogue":
+            if self.part_file is not None:
+                self.part_file.close()
+                os.remove(self.part_path)
+            raise ValueError(
+                f"Multipart response ended unexpectedly after {self.part_count} parts"
+            )
+        return self.written_files
+
+    def _process(self) -> bool:
+        """
+        Advance the parser by one step.
+
+        :return: True if the buffer may contain data for another step.
+        """
+        if self.state == "preamble":
+            index = self.buffer.find(self.delimiter)
+            if index == -1:
+                del self.buffer[: -len(self.delimiter) + 1]
+                return False
+            del self.buffer[: index + len(self.delimiter)]
+            self.state = "delimiter"
+            return True
+
+        if self.state == "delimiter":
+            if len(self.buffer) < 2:
+                return False
+            if self.buffer.startswith(b"--"):
+                self.state = "epilogue"
+                return True
+            index = self.buffer.find(b"\r\n")
+            if index == -1:
+                return False
+            del self.buffer[: index + 2]
+            self.state = "headers"
+            return True
+
+        if self.state == "headers":
+            if self.buffer.startswith(b"\r\n"):
+                header_end, header_length = 0, 2
+            else:
+                header_end, header_length = self.buffer.find(b"\r\n\r\n"), 4
+                if header_end == -1:
+                    return False
+            headers = bytes(self.buffer[:header_end]).decode("latin-1")
+            del self.buffer[: header_end + header_length]
+            self._open_part(headers)
+            self.state = "body"
+            return True
+
+        if self.state == "body":
+            index = self.buffer.find(self.delimiter)
+            if index == -1:
+                flush_length = len(self.buffer) - len(self.delimiter) + 1
+                if flush_length > 0:
+                    with memoryview(self.buffer) as view:
+                        self.part_file.write(view[:flush_length])
+                    del self.buffer[:flush_length]
+                return False
+            with memoryview(self.buffer) as view:
+                self.part_file.write(view[:index])
+            del self.buffer[: index + len(self.delimiter)]
+            self._close_part()
+            self.state = "delimiter"
+            return True
+
+        # epilogue
+        self.buffer.clear()
+        return False
+
+    def _open_part(self, headers: str):
+        for header in headers.split("\r\n"):
+            name, _, value = header.partition(":")
+            if (
+                name.strip().lower() == "content-type"
+                and "application/dicom" not in value.lower()
+            ):
+                raise ValueError(f"Unsupported content type of multipart part: {value}")
+        self.part_count += 1
+        self.part_path = os.path.join(self.target_dir, f"part_{self.part_count}.part")
+        self.part_file = open(self.part_path, "wb")
+
+    def _close_part(self):
+        self.part_file.close()
+        self.part_file = None
+        sop_instance_uid = pydicom.dcmread(
+            self.part_path, stop_before_pixels=True, specific_tags=["SOPInstanceUID"]
+        ).SOPInstanceUID
+        file_path = os.path.join(self.target_dir, f"{sop_instance_uid}.dcm")
+        os.replace(self.part_path, file_path)
+        self.written_files.append(file_path)
+
+
+def write_multipart_dicom(
+    chunks: Iterable[bytes], content_type: str, target_dir: str
+) -> List[str]:
+    """
+    Write all DICOM instances of a multipart/related response body into target_dir.
+
+    :param chunks: Iterable over the raw response body, e.g. response.iter_content(chunk_size).
+    :param content_type: Content-Type header of the response.
+    :param target_dir: Directory the instances are written to.
+    :return: Paths of all written DICOM files.
+    """
+    writer = MultipartDicomWriter(
+        boundary=get_multipart_boundary(content_type), target_dir=target_dir
+    )
+    for chunk in chunks:
+        writer.feed(chunk)
+    return writer.close()
@@ -1,6 +1,6 @@
-from typing import List, Dict
+from typing import List, Dict, Iterator
 from kaapana.blueprints.kaapana_global_variables import SERVICES_NAMESPACE
-from kaapanapy.helper import get_opensearch_client
+from kaapanapy.helper import get_opensearch_client, iter_opensearch_query
 from kaapanapy.logger import get_logger
 
 logger = get_logger(__name__)
@@ -59,16 +59,45 @@ class HelperOpensearch:
         }
 
         try:
-            hits = HelperOpensearch.execute_opensearch_query(**query_dict)
+            hits = HelperOpensearch.iter_opensearch_query(**query_dict)
+            if only_uids:
+                return [hit["_id"] for hit in hits]
+            else:
+                return list(hits)
         except Exception as e:
             print("ERROR in search!")
             print(e)
             return None
 
-        if only_uids:
-            return [hit["_id"] for hit in hits]
-        else:
-            return hits
+    @staticmethod
+    def iter_opensearch_query(
+        query: Dict = dict(),
+        source=dict(),
+        index="meta-index",
+        sort=[{"0020000E SeriesInstanceUID_keyword.keyword": "desc"}],
+        page_size=1000,
+        max_hits=None,
+    ) -> Iterator[Dict]:
+        """
+        Lazily yield all hits of a query from a consistent point-in-time snapshot.
+        See kaapanapy.helper.iter_opensearch_query.
+
+        :param query: query to execute
+        :param source: opensearch _source parameter
+        :param index: index on which to execute the query
+        :param sort: sort order, must be unique per document
+        :param page_size: number of hits fetched per request
+        :param max_hits: raise a ValueError if the query returns more hits
+        """
+        return iter_opensearch_query(
+            HelperOpensearch.os_client,
+            query=query,
+            source=source,
+            index=index,
+            sort=sort,
+            page_size=page_size,
+            max_hits=max_hits,
+        )
 
     @staticmethod
     def execute_opensearch_query(
@@ -79,49 +108,38 @@ class HelperOpensearch:
         scroll=False,
     ) -> List:
         """
-        TODO: This is currently a duplicate to kaapana-backend/docker/files/app/datasets/utils.py
-        Since Opensearch has a strict size limit of 10000 but sometimes scrolling or
-        pagination is not desirable, this helper function aggregates paginated results
-        into a single one.
-
-        Caution: Removing or adding entries between requests will lead to inconsistencies.
-        Opensearch offers the 'scroll' functionality which prevents this, but creating
-        the required sessions takes too much time for most requests.
-        Therefore, it is not implemented yet
+        Aggregate all hits of a query into a single list.
+        Prefer iter_opensearch_query for large result sets.
 
         :param query: query to execute
         :param source: opensearch _source parameter
         :param index: index on which to execute the query
-        :param sort: TODO
-        :param scroll: use scrolling or pagination -> scrolling currently not impelmented
+        :param sort: sort order, must be unique per document
+        :param scroll: unused, kept for backwards compatibility
         :return: aggregated search results
         """
-
-        def _execute_opensearch_query(search_after=None, size=10000) -> List:
-            res = HelperOpensearch.os_client.search(
-                body={
-                    "query": query,
-                    "size": size,
-                    "_source": source,
-                    "sort": sort,
-                    **({"search_after": search_after} if search_after else {}),
-                },
-                index=index,
+        return list(
+            HelperOpensearch.iter_opensearch_query(
+                query=query, source=source, index=index, sort=sort
             )
-            if len(res["hits"]["hits"]) > 0:
-                return [
-                    *res["hits"]["hits"],
-                    *_execute_opensearch_query(res["hits"]["hits"][-1]["sort"], size),
-                ]
-            else:
-                return res["hits"]["hits"]
-
-        return _execute_opensearch_query()
+        )
 
     @staticmethod
     def get_dcm_uid_objects(
         series_instance_uids, include_custom_tag="", exclude_custom_tag=""
     ):
+        return list(
+            HelperOpensearch.iter_dcm_uid_objects(
+                series_instance_uids,
+                include_custom_tag=include_custom_tag,
+                exclude_custom_tag=exclude_custom_tag,
+            )
+        )
+
+    @staticmethod
+    def iter_dcm_uid_objects(
+        series_instance_uids, include_custom_tag="", exclude_custom_tag=""
+    ) -> Iterator[Dict]:
         # defauly query for fetching via identifiers
         query = {"bool": {"must": [{"ids": {"values": series_instance_uids}}]}}
         # must have custom tag
@@ -140,7 +158,7 @@ class HelperOpensearch:
                     {"term": {"00000000 Tags_keyword.keyword": exclude_custom_tag}}
                 ]
 
-        res = HelperOpensearch.execute_opensearch_query(
+        hits = HelperOpensearch.iter_opensearch_query(
             query=query,
             index=HelperOpensearch.index,
             source={
@@ -154,7 +172,7 @@ class HelperOpensearch:
             },
         )
 
-        return [
+        return (
             {
                 "dcm-uid": {
                     "study-uid": hit["_source"][HelperOpensearch.study_uid_tag],
@@ -165,8 +183,8 @@ class HelperOpensearch:
                     ],
                 }
             }
-            for hit in res
-        ]
+            for hit in hits
+        )
 
     @staticmethod
     def get_series_metadata(series_instance_uid, index=None):
@@ -13,6 +13,7 @@ from kaapana.kubetools.volume_mount import VolumeMount
 from kaapana.kubetools.volume import Volume
 from kaapana.kubetools.pod import Pod
 from kaapana.kubetools.pod_stopper import PodStopper
+from kaapana.kubetools.cluster_resources import RESERVATION_LABEL
 from airflow.models.skipmixin import SkipMixin
 from kaapana.kubetools.resources import Resources as PodResources
 from datetime import datetime, timedelta
@@ -94,8 +95,8 @@ class KaapanaBaseOperator(BaseOperator, SkipMixin):
     :type node_selectors: list[V1Toleration]
     :param config_file: The path to the Kublernetes config file
     :type config_file: str
-    :param xcom_push: If xcom_push is True, the content of the file
-        /airflow/xcom/return.json in the container will also be pushed to an
+    :param xcom_push: If xcom_push is True, the JSON the container writes to the
+        file $XCOM_RETURN_FILE on the workflow volume will also be pushed to an
         XCom when the container completes.
     :type xcom_push: bool
     """
@@ -202,6 +203,8 @@ class KaapanaBaseOperator(BaseOperator, SkipMixin):
             delete_output_on_start=delete_output_on_start,
             priority_class_name=priority_class_name,
         )
+        # node resources are only reserved by the UtilService for tasks which launch a pod
+        self.executor_config["launches_pod"] = True
 
         # Airflow
         self.retries = retries
@@ -482,6 +485,29 @@ class KaapanaBaseOperator(BaseOperator, SkipMixin):
         else:
             self.env_vars.update({"CUDA_VISIBLE_DEVICES": ""})
 
+        if "node_affinity" in context["task_instance"].executor_config:
+            node_affinity = context["task_instance"].executor_config["node_affinity"]
+            # node and resources chosen by the UtilService of the scheduler
+            self.labels[RESERVATION_LABEL] = node_affinity["reservation_id"]
+            self.affinity.setdefault(
+                "nodeAffinity",
+                {
+                    "requiredDuringSchedulingIgnoredDuringExecution": {
+                        "nodeSelectorTerms": [
+                            {
+                                "matchFields": [
+                                    {
+                                        "key": "metadata.name",
+                                        "operator": "In",
+                                        "values": [node_affinity["node_name"]],
+                                    }
+                                ]
+                            }
+                        ]
+                    }
+                },
+            )
+
         if (
             context["dag_run"].conf is not None
             and "form_data" in context["dag_run"].conf
@@ -505,6 +531,22 @@ class KaapanaBaseOperator(BaseOperator, SkipMixin):
             }
         )
 
+        xcom_return_file = None
+        if self.xcom_push:
+            # read by the pod launcher from the same volume once the container terminated
+            xcom_return_file = os.path.join(
+                self.airflow_workflow_dir,
+                context["run_id"],
+                self.operator_out_dir,
+                "return.json",
+            )
+            os.makedirs(os.path.dirname(xcom_return_file), exist_ok=True)
+            if os.path.exists(xcom_return_file):
+                os.remove(xcom_return_file)
+            self.env_vars[
+                "XCOM_RETURN_FILE"
+            ] = f"{PROCESSING_WORKFLOW_DIR}/{context['run_id']}/{self.operator_out_dir}/return.json"
+
         logging.info("CONTAINER ENVS:")
         logging.info(json.dumps(self.env_vars, indent=4, sort_keys=True))
         if self.dev_server is not None:
@@ -629,7 +671,9 @@ class KaapanaBaseOperator(BaseOperator, SkipMixin):
                 annotations=self.annotations,
                 affinity=self.affinity,
             )
-            launcher = pod_launcher.PodLauncher(extract_xcom=self.xcom_push)
+            launcher = pod_launcher.PodLauncher(
+                extract_xcom=self.xcom_push, xcom_return_file=xcom_return_file
+            )
 
             launcher_return = launcher.run_pod(
                 pod=pod,
@@ -658,7 +702,7 @@ class KaapanaBaseOperator(BaseOperator, SkipMixin):
                         context["run_id"], self.operator_in_dir
                     )
             if self.xcom_push:
-                return result
+                return message
 
     def on_kill(self) -> None:
         logging.info(
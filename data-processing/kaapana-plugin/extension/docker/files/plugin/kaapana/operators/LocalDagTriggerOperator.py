@@ -2,6 +2,7 @@ from kaapana.operators.HelperMinio import HelperMinio
 from kaapana.operators.HelperOpensearch import HelperOpensearch
 from kaapana.operators.KaapanaPythonBaseOperator import KaapanaPythonBaseOperator
 
+from kaapana.blueprints.kaapana_trigger import trigger_dag_runs
 from kaapana.blueprints.kaapana_utils import generate_run_id
 from airflow.api.common.trigger_dag import trigger_dag as trigger
 from os.path import join
@@ -282,6 +283,7 @@ class LocalDagTriggerOperator(KaapanaPythonBaseOperator):
                 replace_microseconds=False,
             )
 
+        dag_runs = []
         for element in trigger_series_list:
             self_conf_copy = self.conf.copy()
             if "inputs" in self_conf_copy:
@@ -291,14 +293,12 @@ class LocalDagTriggerOperator(KaapanaPythonBaseOperator):
                 "inputs": element,
                 # "conf": self.conf
             }
-            dag_run_id = generate_run_id(self.trigger_dag_id)
-            triggered_dag = trigger(
-                dag_id=self.trigger_dag_id,
-                run_id=dag_run_id,
-                conf=conf,
-                replace_microseconds=False,
-            )
-            pending_dags.append(triggered_dag)
+            dag_runs.append({"dag_id": self.trigger_dag_id, "conf": conf})
+        # the dag-runs of all series are created in one transaction, run_ids are generated unique
+        for triggered_dag in trigger_dag_runs(dag_runs):
+            if "error" in triggered_dag:
+                raise ValueError(triggered_dag["error"])
+            pending_dags.append(triggered_dag["dag_run"])
 
         return pending_dags
 
@@ -1,6 +1,9 @@
 import os
 import json
-from typing import Any, Dict, List, Union
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from typing import Any, Dict, List, Tuple, Union
 import pydicom
 from pydicom.tag import Tag
 from pathlib import Path
@@ -19,115 +22,180 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 
-class LocalDcm2JsonOperator(KaapanaPythonBaseOperator):
-    """
-    Operator to convert DICOM files to JSON.
-    Additionally some keywords and values are transformed to increase the usability to find/search key-values.
-
-    **Inputs:**
+KAAPANA_TIME_FORMAT = "%H:%M:%S.%f"
+KAAPANA_DATE_FORMAT = "%Y-%m-%d"
+KAAPANA_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+DCM_DATETIME_FORMAT = "%Y%m%d%H%M%S.%f"
+DCM_DATE_FORMAT = "%Y%m%d"
+DCM_TIME_FORMAT = "%H%M%S.%f"
+# Number of distinct date/time values memoized per process
+PARSE_CACHE_SIZE = 8192
 
-    * exit_on_error: exit with error, when some key/values are missing or mismatching.
-    * delete_pixel_data: uses dcmtk's dcmodify to remove some specific to be known private tags
-    * bulk: process all files of a series or only the first one (default)
 
-    **Outputs:**
+class Dcm2JsonConverter:
+    """
+    Converts the DICOM files of a batch element into a single normalized JSON document.
 
-    * json file: output json file. DICOM tags are converted to a json file.
+    The converter only holds plain data (the DICOM tag dictionary and the options),
+    so that one instance per worker process can be reused for all batch elements it processes.
     """
 
     MODALITY_TAG = "00080060 Modality_keyword"
     IMAGE_TYPE_TAG = "00080008 ImageType_keyword"
-    KAAPANA_TIME_FORMAT = "%H:%M:%S.%f"
-    KAAPANA_DATE_FORMAT = "%Y-%m-%d"
-    KAAPANA_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
-    DCM_DATETIME_FORMAT = "%Y%m%d%H%M%S.%f"
-    DCM_DATE_FORMAT = "%Y%m%d"
-    DCM_TIME_FORMAT = "%H%M%S.%f"
-
-    def load_dicom_tag_dict(self):
-        dicom_tag_dict_path = os.getenv("DICT_PATH", None)
-        if dicom_tag_dict_path is None:
-            raise KeyError("DICT_PATH ENV NOT FOUND")
-
-        else:
-            with open(dicom_tag_dict_path, encoding="utf-8") as dict_data:
-                self.dicom_tag_dict = json.load(dict_data)
+    KAAPANA_TIME_FORMAT = KAAPANA_TIME_FORMAT
+    KAAPANA_DATE_FORMAT = KAAPANA_DATE_FORMAT
+    KAAPANA_DATETIME_FORMAT = KAAPANA_DATETIME_FORMAT
+    DCM_DATETIME_FORMAT = DCM_DATETIME_FORMAT
+    DCM_DATE_FORMAT = DCM_DATE_FORMAT
+    DCM_TIME_FORMAT = DCM_TIME_FORMAT
+
+    # VR -> type suffix of the normalized tag
+    VR_TYPES = {
+        **{
+            vr: "keyword"
+            for vr in (
+                "AE",
+                "AS",
+                "AT",
+                "CS",
+                "LO",
+                "LT",
+                "OB",
+                "OW",
+                "SH",
+                "ST",
+                "UC",
+                "UI",
+                "UN",
+                "UT",
+            )
+        },
+        "DT": "datetime",
+        "DA": "date",
+        "TM": "time",
+        **{vr: "float" for vr in ("DS", "FL", "FD", "OD", "OF")},
+        **{vr: "integer" for vr in ("IS", "SL", "SS", "UL", "US")},
+        "SQ": "object",
+        "PN": "personname",
+    }
 
     def __init__(
         self,
-        dag,
+        dicom_tag_dict: Dict = None,
         exit_on_error=False,
         delete_pixel_data=True,
         bulk=False,
-        **kwargs,
     ):
         """
-        :param exit_on_error: 'True' or 'False' (default). Exit with error, when some key/values are missing or mismatching.
-        :param delete_pixel_data: 'True' (default) or 'False'. removes pixel-data from DICOM.
-        :param bulk: 'True' or 'False' (default). Process all files of a series or only the first one.
+        :param dicom_tag_dict: Mapping of DICOM tags to their keywords. Loaded from DICT_PATH if not given.
+        :param exit_on_error: Exit with error, when some key/values are missing or mismatching.
+        :param delete_pixel_data: Remove pixel-data from DICOM.
+        :param bulk: Aggregate all files of a series into the document or only use the first one.
         """
-
         self.bulk = bulk
         self.exit_on_error = exit_on_error
         self.delete_pixel_data = delete_pixel_data
 
-        os.environ["PYTHONIOENCODING"] = "utf-8"
-        self.load_dicom_tag_dict()
+        if dicom_tag_dict is None:
+            self.load_dicom_tag_dict()
+        else:
+            self.dicom_tag_dict = dicom_tag_dict
 
-        super().__init__(
-            dag=dag,
-            name="dcm2json",
-            python_callable=self.start,
-            ram_mem_mb=10,
-            **kwargs,
-        )
+    def load_dicom_tag_dict(self):
+        dicom_tag_dict_path = os.getenv("DICT_PATH", None)
+        if dicom_tag_dict_path is None:
+            raise KeyError("DICT_PATH ENV NOT FOUND")
+
+        else:
+            with open(dicom_tag_dict_path, encoding="utf-8") as dict_data:
+                self.dicom_tag_dict = json.load(dict_data)
 
     def _is_radiotherapy_modality(self, metadata: Dict) -> bool:
         """Check if the modality is either RTSTRUCT or SEG."""
         modality_tag = metadata.get("00080060")
         return bool(modality_tag and modality_tag["Value"][0] in ("RTSTRUCT", "SEG"))
 
-    @cache_operator_output
-    def start(self, **kwargs):
-        logger.info("Starting module dcm2json...")
+    def convert_batch_element(
+        self, batch_element_dir: Path, operator_in_dir: str, operator_out_dir: str
+    ) -> Path:
+        """
+        Write the JSON document of a batch element to <operator_out_dir>/<batch element>.json.
 
-        run_dir: Path = Path(self.airflow_workflow_dir, kwargs["dag_run"].run_id)
-        batch_folder: List[Path] = list((run_dir / self.batch_name).glob("*"))
+        In bulk mode the instances of the series are aggregated into this one document, see _merge_instance_metadata().
+        """
+        dcm_files: List[Path] = sorted(
+            list((batch_element_dir / operator_in_dir).rglob("*.dcm"))
+        )
+
+        if len(dcm_files) == 0:
+            raise ValueError("No dicom file found!")
+
+        logger.info(f"length {len(dcm_files)}")
+        if not self.bulk:
+            dcm_files = dcm_files[:1]
 
-        for batch_element_dir in batch_folder:
-            dcm_files: List[Path] = sorted(
-                list((batch_element_dir / self.operator_in_dir).rglob("*.dcm"))
+        json_dict = None
+        aggregated_values = {}
+        for dcm_file_path in dcm_files:
+            logger.info(f"Extracting metadata: {dcm_file_path}")
+            metadata = self._read_metadata(dcm_file_path)
+            if json_dict is None:
+                json_dict = self._clean_json(metadata)
+            else:
+                self._merge_instance_metadata(
+                    json_dict, self._normalize_tags(metadata), aggregated_values
+                )
+        for new_tag, (values, _) in aggregated_values.items():
+            json_dict[new_tag] = values[0] if len(values) == 1 else values
+
+        target_dir: Path = batch_element_dir / operator_out_dir
+        target_dir.mkdir(exist_ok=True)
+        json_file_path = target_dir / f"{batch_element_dir.name}.json"
+        with open(json_file_path, "w", encoding="utf-8") as jsonData:
+            json.dump(
+                json_dict,
+                jsonData,
+                indent=4,
+                sort_keys=True,
+                ensure_ascii=True,
             )
+        return json_file_path
 
-            if len(dcm_files) == 0:
-                raise ValueError("No dicom file found!")
-
-            logger.info(f"length {len(dcm_files)}")
-            for dcm_file_path in dcm_files:
-                logger.info(f"Extracting metadata: {dcm_file_path}")
-
-                target_dir: Path = batch_element_dir / self.operator_out_dir
-                target_dir.mkdir(exist_ok=True)
-                json_file_path = target_dir / f"{batch_element_dir.name}.json"
-
-                dcm = pydicom.read_file(dcm_file_path, stop_before_pixels=True)
-                if self.delete_pixel_data:
-                    dcm = self._delete_pixel_data(dcm)
-                json_dict = dcm.to_json_dict()
-                del dcm
-
-                json_dict = self._clean_json(json_dict)
-                with open(json_file_path, "w", encoding="utf-8") as jsonData:
-                    json.dump(
-                        json_dict,
-                        jsonData,
-                        indent=4,
-                        sort_keys=True,
-                        ensure_ascii=True,
+    def _read_metadata(self, dcm_file_path: Path) -> Dict:
+        dcm = pydicom.read_file(dcm_file_path, stop_before_pixels=True)
+        if self.delete_pixel_data:
+            dcm = self._delete_pixel_data(dcm)
+        return dcm.to_json_dict()
+
+    def _merge_instance_metadata(
+        self, json_dict: Dict, metadata: Dict, aggregated_values: Dict
+    ):
+        """
+        Merge the normalized tags of a further instance of the series into json_dict.
+
+        Values which are equal for all instances are kept as they are.
+        Differing values are collected in aggregated_values as list of their distinct values in instance order.
+        Values of multi-valued tags are kept as a whole, e.g. ImagePositionPatient becomes a list of coordinate lists.
+        Sequences and the derived tags are taken from the first instance only.
+        """
+        for new_tag, value in metadata.items():
+            if isinstance(value, dict) or json_dict.get(new_tag) == value:
+                continue
+            if new_tag not in aggregated_values:
+                aggregated_values[new_tag] = ([], set())
+                if new_tag in json_dict:
+                    self._add_distinct_values(
+                        aggregated_values[new_tag], json_dict[new_tag]
                     )
+            self._add_distinct_values(aggregated_values[new_tag], value)
 
-                if not self.bulk:
-                    break
+    @staticmethod
+    def _add_distinct_values(aggregated: tuple, value: Any):
+        values, seen = aggregated
+        key = json.dumps(value, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            values.append(value)
 
     def _delete_pixel_data(self, dcm: pydicom.Dataset) -> pydicom.Dataset:
         # (0014,3080) Bad Pixel Image
@@ -222,62 +290,48 @@ class LocalDcm2JsonOperator(KaapanaPythonBaseOperator):
     def _normalize_tag(
         self, new_tag: str, vr: str, value_str: Any, metadata: Dict
     ) -> Dict:
-        if vr in (
-            "AE",
-            "AS",
-            "AT",
-            "CS",
-            "LO",
-            "LT",
-            "OB",
-            "OW",
-            "SH",
-            "ST",
-            "UC",
-            "UI",
-            "UN",
-            "UT",
-        ):
+        vr_type = self.VR_TYPES.get(vr)
+        if vr_type == "keyword":
             new_tag += "_keyword"
             metadata[new_tag] = value_str
 
-        elif vr == "DT":
+        elif vr_type == "datetime":
             datetime_formatted = self._format_datetime_value(new_tag, value_str)
             if datetime_formatted is not None:
                 new_tag += "_datetime"
                 metadata[new_tag] = datetime_formatted
 
-        elif vr == "DA":
+        elif vr_type == "date":
             date_formatted = self._format_date_value(value_str)
             if date_formatted is not None:
                 new_tag += "_date"
                 metadata[new_tag] = date_formatted
 
-        elif vr == "TM":
+        elif vr_type == "time":
             time_formatted = self._format_time_value(value_str)
             if time_formatted is not None:
                 new_tag += "_time"
                 metadata[new_tag] = time_formatted
 
-        elif vr in ("DS", "FL", "FD", "OD", "OF"):
+        elif vr_type == "float":
             checked_val = convert(value_str, float)
             if checked_val is not None:
                 new_tag += "_float"
                 metadata[new_tag] = checked_val
 
-        elif vr in ("IS", "SL", "SS", "UL", "US"):
+        elif vr_type == "integer":
             checked_val = convert(value_str, int)
             if checked_val is not None:
                 new_tag += "_integer"
                 metadata[new_tag] = checked_val
 
-        elif vr == "SQ":
+        elif vr_type == "object":
             checked_val = self._process_sequence_value(value_str)
             if checked_val is not None:
                 new_tag += "_object"
                 metadata[new_tag] = checked_val
 
-        elif vr == "PN":
+        elif vr_type == "personname":
             # Person Name
             # A character string encoded using a 5 component convention. The character code 5CH (the BACKSLASH "\"
             # in ISO-IR 6) shall not be present, as it is used as the delimiter between values in multiple valued data
@@ -509,33 +563,7 @@ class LocalDcm2JsonOperator(KaapanaPythonBaseOperator):
         # 20020904000000.000000
         # "%Y-%m-%d %H:%M:%S.%f"
         try:
-            datetime_formatted = None
-            if validate_format(value_str, self.DCM_DATETIME_FORMAT):
-                datetime_formatted = datetime.strptime(
-                    value_str, self.DCM_DATETIME_FORMAT
-                ).strftime(self.KAAPANA_DATETIME_FORMAT)
-            else:
-                logger.info(f"Value: {value_str} not complete dcm date time.")
-                logger.info(f"Dicom Standard Format: {self.DCM_DATETIME_FORMAT}")
-
-            if datetime_formatted is None:
-                if len(value_str) > 8:
-                    logger.info("Trying to parse long datetime format.")
-                    datetime_formatted = parser.parse(value_str).strftime(
-                        self.KAAPANA_DATETIME_FORMAT
-                    )
-                else:
-                    logger.info("Trying to parse short date format with default time.")
-                    date = parser.parse(value_str).date()
-                    time = parser.parse("01:00:00").time()
-                    datetime_formatted = datetime.combine(date, time).strftime(
-                        self.KAAPANA_DATETIME_FORMAT
-                    )
-
-            datetime_formatted = self.convert_time_to_utc(
-                datetime_formatted, self.KAAPANA_DATETIME_FORMAT
-            )
-            return datetime_formatted
+            return format_dicom_datetime(value_str)
         except Exception as e:
             logger.error(highlight_message("COULD NOT EXTRACT DATETIME"))
             logger.error(f"Tag  : {new_tag}")
@@ -560,14 +588,12 @@ class LocalDcm2JsonOperator(KaapanaPythonBaseOperator):
         try:
             if isinstance(value_str, list):
                 date_formatted = [
-                    parser.parse(date_str).strftime(self.KAAPANA_DATE_FORMAT)
+                    format_dicom_date(date_str)
                     for date_str in value_str
                     if date_str != ""
                 ]
             elif isinstance(value_str, str):
-                date_formatted = parser.parse(value_str).strftime(
-                    self.KAAPANA_DATE_FORMAT
-                )
+                date_formatted = format_dicom_date(value_str)
             else:
                 raise TypeError(
                     f"Not supported type {type(value_str)} of value {value_str}"
@@ -614,42 +640,14 @@ class LocalDcm2JsonOperator(KaapanaPythonBaseOperator):
         return time_formatted
 
     def _get_time(self, time_str):
-        if validate_format(time_str, self.DCM_TIME_FORMAT):
-            return datetime.strptime(time_str, self.DCM_TIME_FORMAT).strftime(
-                self.KAAPANA_TIME_FORMAT
-            )
-
-        hour = 0
-        minute = 0
-        sec = 0
-        fsec = 0
-        if "." in time_str:
-            time_str = time_str.split(".")
-            if time_str[1] != "":
-                fsec = int(time_str[1])
-            time_str = time_str[0]
-
-        if len(time_str) == 6:
-            hour = int(time_str[:2])
-            minute = int(time_str[2:4])
-            sec = int(time_str[4:6])
-        elif len(time_str) == 4:
-            hour = int(time_str[:2])
-            minute = int(time_str[2:4])
-        elif len(time_str) == 2:
-            hour = int(time_str)
-
-        else:
+        time_formatted, complete = format_dicom_time(time_str)
+        if not complete:
             logger.error(highlight_message("COULD NOT EXTRACT TIME"))
             logger.error(f"Value: {time_str}")
 
             if self.exit_on_error:
                 raise ValueError("COULD NOT EXTRACT TIME")
 
-        # HH:mm:ss.SSSSS
-        time_string = f"{hour:02}:{minute:02}:{sec:02}.{fsec:06}"
-        time_formatted = parser.parse(time_string).strftime(self.KAAPANA_TIME_FORMAT)
-
         return time_formatted
 
     def _process_sequence_value(self, value_str):
@@ -695,12 +693,115 @@ class LocalDcm2JsonOperator(KaapanaPythonBaseOperator):
 
     @staticmethod
     def convert_time_to_utc(time_berlin: str, date_format: str):
-        local = pytz.timezone("Europe/Berlin")
-        naive = datetime.strptime(time_berlin, date_format)
-        local_dt = local.localize(naive, is_dst=None)
-        utc_dt = local_dt.astimezone(pytz.utc)
+        return convert_time_to_utc(time_berlin, date_format)
 
-        return utc_dt.strftime(date_format)
+
+class LocalDcm2JsonOperator(KaapanaPythonBaseOperator, Dcm2JsonConverter):
+    """
+    Operator to convert DICOM files to JSON.
+    Additionally some keywords and values are transformed to increase the usability to find/search key-values.
+
+    **Inputs:**
+
+    * exit_on_error: exit with error, when some key/values are missing or mismatching.
+    * delete_pixel_data: uses dcmtk's dcmodify to remove some specific to be known private tags
+    * bulk: aggregate all files of a series into the json file or only use the first one (default)
+    * parallel_processes: number of batch elements converted in parallel worker processes
+
+    **Outputs:**
+
+    * json file: output json file. DICOM tags are converted to a json file.
+    """
+
+    def __init__(
+        self,
+        dag,
+        exit_on_error=False,
+        delete_pixel_data=True,
+        bulk=False,
+        parallel_processes=1,
+        **kwargs,
+    ):
+        """
+        :param exit_on_error: 'True' or 'False' (default). Exit with error, when some key/values are missing or mismatching.
+        :param delete_pixel_data: 'True' (default) or 'False'. removes pixel-data from DICOM.
+        :param bulk: 'True' or 'False' (default). Aggregate all files of a series into one document or only use the first one.
+        :param parallel_processes: Number of worker processes converting batch elements. 1 (default) converts them in the task process.
+        """
+
+        self.parallel_processes = parallel_processes
+
+        os.environ["PYTHONIOENCODING"] = "utf-8"
+        Dcm2JsonConverter.__init__(
+            self,
+            exit_on_error=exit_on_error,
+            delete_pixel_data=delete_pixel_data,
+            bulk=bulk,
+        )
+
+        super().__init__(
+            dag=dag,
+            name="dcm2json",
+            python_callable=self.start,
+            ram_mem_mb=10,
+            **kwargs,
+        )
+
+    @cache_operator_output
+    def start(self, **kwargs):
+        logger.info("Starting module dcm2json...")
+
+        run_dir: Path = Path(self.airflow_workflow_dir, kwargs["dag_run"].run_id)
+        batch_folder: List[Path] = list((run_dir / self.batch_name).glob("*"))
+
+        if self.parallel_processes > 1 and len(batch_folder) > 1:
+            logger.info(
+                f"Converting {len(batch_folder)} batch elements with {self.parallel_processes} processes"
+            )
+            with ProcessPoolExecutor(
+                max_workers=self.parallel_processes,
+                initializer=init_worker_converter,
+                initargs=(
+                    self.dicom_tag_dict,
+                    self.exit_on_error,
+                    self.delete_pixel_data,
+                    self.bulk,
+                ),
+            ) as executor:
+                for json_file_path in executor.map(
+                    convert_batch_element,
+                    batch_folder,
+                    repeat(self.operator_in_dir),
+                    repeat(self.operator_out_dir),
+                ):
+                    logger.info(f"Written: {json_file_path}")
+        else:
+            for batch_element_dir in batch_folder:
+                self.convert_batch_element(
+                    batch_element_dir, self.operator_in_dir, self.operator_out_dir
+                )
+
+
+# Converter of the current worker process, see init_worker_converter()
+worker_converter = None
+
+
+def init_worker_converter(dicom_tag_dict, exit_on_error, delete_pixel_data, bulk):
+    global worker_converter
+    worker_converter = Dcm2JsonConverter(
+        dicom_tag_dict=dicom_tag_dict,
+        exit_on_error=exit_on_error,
+        delete_pixel_data=delete_pixel_data,
+        bulk=bulk,
+    )
+
+
+def convert_batch_element(
+    batch_element_dir: Path, operator_in_dir: str, operator_out_dir: str
+) -> Path:
+    return worker_converter.convert_batch_element(
+        batch_element_dir, operator_in_dir, operator_out_dir
+    )
 
 
 def handle_incomplete_tag_metadata(tag_metadata: Dict):
@@ -763,6 +864,95 @@ def convert(obj: Any, val_type: type):
     return obj
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def convert_time_to_utc(time_berlin: str, date_format: str) -> str:
+    local = pytz.timezone("Europe/Berlin")
+    naive = datetime.strptime(time_berlin, date_format)
+    local_dt = local.localize(naive, is_dst=None)
+    utc_dt = local_dt.astimezone(pytz.utc)
+
+    return utc_dt.strftime(date_format)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def format_dicom_datetime(value_str: str) -> str:
+    """
+    Convert a DICOM DT value to KAAPANA_DATETIME_FORMAT in UTC.
+
+    :raises ValueError: If the value can not be parsed.
+    """
+    datetime_formatted = None
+    if validate_format(value_str, DCM_DATETIME_FORMAT):
+        datetime_formatted = datetime.strptime(value_str, DCM_DATETIME_FORMAT).strftime(
+            KAAPANA_DATETIME_FORMAT
+        )
+    else:
+        logger.info(f"Value: {value_str} not complete dcm date time.")
+        logger.info(f"Dicom Standard Format: {DCM_DATETIME_FORMAT}")
+
+    if datetime_formatted is None:
+        if len(value_str) > 8:
+            logger.info("Trying to parse long datetime format.")
+            datetime_formatted = parser.parse(value_str).strftime(
+                KAAPANA_DATETIME_FORMAT
+            )
+        else:
+            logger.info("Trying to parse short date format with default time.")
+            date = parser.parse(value_str).date()
+            time = parser.parse("01:00:00").time()
+            datetime_formatted = datetime.combine(date, time).strftime(
+                KAAPANA_DATETIME_FORMAT
+            )
+
+    return convert_time_to_utc(datetime_formatted, KAAPANA_DATETIME_FORMAT)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def format_dicom_date(date_str: str) -> str:
+    return parser.parse(date_str).strftime(KAAPANA_DATE_FORMAT)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def format_dicom_time(time_str: str) -> Tuple[str, bool]:
+    """
+    Convert a DICOM TM value to KAAPANA_TIME_FORMAT.
+
+    :return: Tuple of the formatted time and whether the hour, minute and second components could be extracted.
+    """
+    if validate_format(time_str, DCM_TIME_FORMAT):
+        return (
+            datetime.strptime(time_str, DCM_TIME_FORMAT).strftime(KAAPANA_TIME_FORMAT),
+            True,
+        )
+
+    hour = 0
+    minute = 0
+    sec = 0
+    fsec = 0
+    complete = True
+    if "." in time_str:
+        time_str = time_str.split(".")
+        if time_str[1] != "":
+            fsec = int(time_str[1])
+        time_str = time_str[0]
+
+    if len(time_str) == 6:
+        hour = int(time_str[:2])
+        minute = int(time_str[2:4])
+        sec = int(time_str[4:6])
+    elif len(time_str) == 4:
+        hour = int(time_str[:2])
+        minute = int(time_str[2:4])
+    elif len(time_str) == 2:
+        hour = int(time_str)
+    else:
+        complete = False
+
+    # HH:mm:ss.SSSSS
+    time_string = f"{hour:02}:{minute:02}:{sec:02}.{fsec:06}"
+    return parser.parse(time_string).strftime(KAAPANA_TIME_FORMAT), complete
+
+
 def validate_format(value_str, format_str):
     try:
         datetime.strptime(value_str, format_str)
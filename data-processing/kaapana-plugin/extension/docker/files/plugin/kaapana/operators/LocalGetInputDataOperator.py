@@ -3,6 +3,7 @@
 import os
 import json
 from datetime import timedelta
+from itertools import islice
 from kaapana.operators.KaapanaPythonBaseOperator import KaapanaPythonBaseOperator
 from kaapana.operators.HelperDcmWeb import HelperDcmWeb
 from kaapana.operators.HelperOpensearch import HelperOpensearch
@@ -94,7 +95,10 @@ class LocalGetInputDataOperator(KaapanaPythonBaseOperator):
 
         if self.data_type == "dicom":
             download_successful = self.dcmweb_helper.downloadSeries(
-                series_uid=seriesUID, target_dir=target_dir
+                series_uid=seriesUID,
+                target_dir=target_dir,
+                parallel_instance_downloads=self.parallel_instance_downloads,
+                retrieval_mode=self.retrieval_mode,
             )
             if not download_successful:
                 print("Could not download DICOM data!")
@@ -227,11 +231,6 @@ class LocalGetInputDataOperator(KaapanaPythonBaseOperator):
             )
             exit(1)
         if "query" in self.data_form:
-            print(
-                HelperOpensearch.get_query_dataset(
-                    self.data_form["query"], only_uids=True
-                )
-            )
             self.data_form["identifiers"] = HelperOpensearch.get_query_dataset(
                 self.data_form["query"], only_uids=True
             )
@@ -259,7 +258,7 @@ class LocalGetInputDataOperator(KaapanaPythonBaseOperator):
                 exclude_custom_tag = self.conf["workflow_form"][
                     self.exclude_custom_tag_property
                 ]
-            self.dicom_data_infos = HelperOpensearch.get_dcm_uid_objects(
+            self.dicom_data_infos = HelperOpensearch.iter_dcm_uid_objects(
                 self.data_form["identifiers"],
                 include_custom_tag=include_custom_tag,
                 exclude_custom_tag=exclude_custom_tag,
@@ -271,13 +270,9 @@ class LocalGetInputDataOperator(KaapanaPythonBaseOperator):
         print(f"# Dataset-limit: {self.dataset_limit}")
         print("#")
         print("#")
-        print("# Dicom data information:")
-        print("#")
-        print(json.dumps(self.dicom_data_infos, indent=4, sort_keys=True))
-        print("#")
-        print("#")
         download_list = []
-        for dicom_data_info in self.dicom_data_infos:
+        # The search results are consumed lazily and only up to the dataset limit
+        for dicom_data_info in islice(self.dicom_data_infos, self.dataset_limit):
             if "dcm-uid" in dicom_data_info:
                 dcm_uid = dicom_data_info["dcm-uid"]
 
@@ -318,15 +313,8 @@ class LocalGetInputDataOperator(KaapanaPythonBaseOperator):
                 print("Dag-conf: {}".format(self.conf))
                 raise ValueError("ERROR")
 
-        print("")
-        print(f"## SERIES FOUND: {len(download_list)}")
         print("")
         print(f"## SERIES LIMIT: {self.dataset_limit}")
-        download_list = (
-            download_list[: self.dataset_limit]
-            if self.dataset_limit is not None
-            else download_list
-        )
         print("")
         print(f"## SERIES TO LOAD: {len(download_list)}")
         print("")
@@ -339,7 +327,9 @@ class LocalGetInputDataOperator(KaapanaPythonBaseOperator):
             raise ValueError("ERROR")
         series_download_fail = []
         self.dcmweb_helper = HelperDcmWeb(
-            application_entity="KAAPANA", dag_run=kwargs["dag_run"]
+            application_entity="KAAPANA",
+            dag_run=kwargs["dag_run"],
+            max_connections=self.parallel_downloads * self.parallel_instance_downloads,
         )
         with ThreadPool(self.parallel_downloads) as threadpool:
             results = threadpool.imap_unordered(self.get_data, download_list)
@@ -368,6 +358,8 @@ class LocalGetInputDataOperator(KaapanaPythonBaseOperator):
         check_modality=False,
         dataset_limit=None,
         parallel_downloads=3,
+        parallel_instance_downloads=4,
+        retrieval_mode="series",
         include_custom_tag_property="",
         exclude_custom_tag_property="",
         batch_name=None,
@@ -381,6 +373,8 @@ class LocalGetInputDataOperator(KaapanaPythonBaseOperator):
         :param include_custom_tag_property: key in workflow_form for filtering with tags that must exist
         :param exclude_custom_tag_property: key in workflow_form for filtering with tags that must not exist
         :param parallel_downloads: default 3, number of parallel downloads
+        :param parallel_instance_downloads: default 4, number of instances downloaded in parallel per series
+        :param retrieval_mode: default 'series', 'series' (single WADO-RS request) or 'instances' (WADO-URI per instance)
         """
 
         self.data_type = data_type
@@ -388,6 +382,8 @@ class LocalGetInputDataOperator(KaapanaPythonBaseOperator):
         self.dataset_limit = dataset_limit
         self.check_modality = check_modality
         self.parallel_downloads = parallel_downloads
+        self.parallel_instance_downloads = parallel_instance_downloads
+        self.retrieval_mode = retrieval_mode
 
         self.include_custom_tag_property = include_custom_tag_property
         self.exclude_custom_tag_property = exclude_custom_tag_property
@@ -29,6 +29,8 @@ class LocalGetRefSeriesOperator(KaapanaPythonBaseOperator):
                     series_uid=series["reference_series_uid"],
                     target_dir=series["target_dir"],
                     expected_object_count=series["expected_object_count"],
+                    parallel_instance_downloads=self.parallel_instance_downloads,
+                    retrieval_mode=self.retrieval_mode,
                 )
                 if not download_successful:
                     raise ValueError("ERROR")
@@ -57,7 +59,9 @@ class LocalGetRefSeriesOperator(KaapanaPythonBaseOperator):
     def get_files(self, ds, **kwargs):
         print("# Starting module LocalGetRefSeriesOperator")
         self.dcmweb_helper = HelperDcmWeb(
-            application_entity=self.aetitle, dag_run=kwargs["dag_run"]
+            application_entity=self.aetitle,
+            dag_run=kwargs["dag_run"],
+            max_connections=self.parallel_downloads * self.parallel_instance_downloads,
         )
 
         run_dir = join(self.airflow_workflow_dir, kwargs["dag_run"].run_id)
@@ -362,6 +366,8 @@ class LocalGetRefSeriesOperator(KaapanaPythonBaseOperator):
         expected_file_count="all",  # int or 'all'
         limit_file_count=None,
         parallel_downloads=3,
+        parallel_instance_downloads=4,
+        retrieval_mode="series",
         pacs_dcmweb_host=f"http://dcm4chee-service.{SERVICES_NAMESPACE}.svc",
         pacs_dcmweb_port="8080",
         aetitle="KAAPANA",
@@ -378,6 +384,8 @@ class LocalGetRefSeriesOperator(KaapanaPythonBaseOperator):
         :param expected_file_count: either number of files (type: int) or "all"
         :param limit_file_count: to limit number of files
         :param parallel_downloads: number of files to download in parallel (default: 3)
+        :param parallel_instance_downloads: number of instances per series to download in parallel (default: 4)
+        :param retrieval_mode: 'series' (single WADO-RS request) or 'instances' (WADO-URI per instance) (default: 'series')
         :param pacs_dcmweb_host: "http://dcm4chee-service.{SERVICES_NAMESPACE}.svc" (default)
         :param pacs_dcmweb_port: 8080 (default)
         :param aetitle: "KAAPANA" (default)
@@ -402,6 +410,8 @@ class LocalGetRefSeriesOperator(KaapanaPythonBaseOperator):
             + aetitle.upper()
         )
         self.parallel_downloads = parallel_downloads
+        self.parallel_instance_downloads = parallel_instance_downloads
+        self.retrieval_mode = retrieval_mode
         self.batch_name = batch_name
 
         super().__init__(
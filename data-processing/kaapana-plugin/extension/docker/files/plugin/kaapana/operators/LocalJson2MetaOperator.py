@@ -8,6 +8,7 @@ import errno
 import time
 
 import requests
+from opensearchpy.helpers import streaming_bulk
 
 from kaapana.operators.HelperDcmWeb import HelperDcmWeb
 from kaapana.operators.KaapanaPythonBaseOperator import KaapanaPythonBaseOperator
@@ -34,15 +35,18 @@ class LocalJson2MetaOperator(KaapanaPythonBaseOperator):
 
     """
 
-    def push_json(self, json_dict):
-        print("# Pushing JSON ...")
+    def get_document_id(self, json_dict):
         if "0020000E SeriesInstanceUID_keyword" in json_dict:
-            id = json_dict["0020000E SeriesInstanceUID_keyword"]
+            return json_dict["0020000E SeriesInstanceUID_keyword"]
         elif self.instanceUID is not None:
-            id = self.instanceUID
+            return self.instanceUID
         else:
             print("# No ID found! - exit")
             exit(1)
+
+    def push_json(self, json_dict):
+        print("# Pushing JSON ...")
+        id = self.get_document_id(json_dict)
         try:
             json_dict = self.produce_inserts(json_dict)
             response = HelperOpensearch.os_client.index(
@@ -59,6 +63,72 @@ class LocalJson2MetaOperator(KaapanaPythonBaseOperator):
         print("# Success")
         print("#")
 
+    def produce_bulk_action(self, new_json):
+        """
+        Translate a JSON document into a bulk action.
+
+        Without no_update the document is merged into an existing one via a partial update with doc_as_upsert,
+        which replaces the separate get and index requests of produce_inserts.
+        With no_update an existing document is replaced.
+        """
+        id = self.get_document_id(new_json)
+        new_json = self.rename_bpr_key(new_json)
+        if self.no_update:
+            return {
+                "_op_type": "index",
+                "_index": HelperOpensearch.index,
+                "_id": id,
+                "_source": new_json,
+            }
+        return {
+            "_op_type": "update",
+            "_index": HelperOpensearch.index,
+            "_id": id,
+            "doc": new_json,
+            "doc_as_upsert": True,
+        }
+
+    def push_json_bulk(self, json_dicts):
+        """
+        Push JSON documents in batches of bulk_batch_size via the _bulk API and refresh the index once at the end.
+        """
+        print("# Pushing JSON via bulk requests ...")
+        success_count = 0
+        errors = []
+        for ok, item in streaming_bulk(
+            HelperOpensearch.os_client,
+            (self.produce_bulk_action(json_dict) for json_dict in json_dicts),
+            chunk_size=self.bulk_batch_size,
+            raise_on_error=False,
+            max_retries=3,
+        ):
+            if ok:
+                success_count += 1
+            else:
+                errors.append(item)
+        HelperOpensearch.os_client.indices.refresh(index=HelperOpensearch.index)
+
+        print("#")
+        print(f"# Pushed documents: {success_count}")
+        print(f"# Failed documents: {len(errors)}")
+        print("#")
+        if errors:
+            for error in errors:
+                print(json.dumps(error, indent=4, default=str))
+            print("#")
+            print("# Error while pushing JSON ...")
+            print("#")
+            exit(1)
+
+    def rename_bpr_key(self, new_json):
+        # special treatment for bodypart regression since keywords don't match
+        bpr_algorithm_name = "predicted_bodypart_string"
+        bpr_key = "00000000 PredictedBodypart_keyword"
+        if bpr_algorithm_name in new_json:
+            new_json[bpr_key] = new_json[bpr_algorithm_name]
+            del new_json[bpr_algorithm_name]
+        return new_json
+
     def produce_inserts(self, new_json):
         print("INFO: get old json from index.")
         try:
@@ -73,12 +143,7 @@ class LocalJson2MetaOperator(KaapanaPythonBaseOperator):
             print(e)
             old_json = {}
 
-        # special treatment for bodypart regression since keywords don't match
-        bpr_algorithm_name = "predicted_bodypart_string"
-        bpr_key = "00000000 PredictedBodypart_keyword"
-        if bpr_algorithm_name in new_json:
-            new_json[bpr_key] = new_json[bpr_algorithm_name]
-            del new_json[bpr_algorithm_name]
+        new_json = self.rename_bpr_key(new_json)
 
         for new_key in new_json:
             new_value = new_json[new_key]
@@ -108,6 +173,16 @@ class LocalJson2MetaOperator(KaapanaPythonBaseOperator):
         self.run_id = kwargs["dag_run"].run_id
         print(("RUN_ID: %s" % self.run_id))
 
+        if self.bulk_batch_size:
+            self.push_json_bulk(self.iter_json(batch_folder))
+        else:
+            for json_dict in self.iter_json(batch_folder):
+                self.push_json(json_dict)
+
+    def iter_json(self, batch_folder):
+        """
+        Yield all JSON documents of the batch elements that should be pushed.
+        """
         for batch_element_dir in batch_folder:
             if self.jsonl_operator:
                 json_dir = os.path.join(
@@ -118,8 +193,7 @@ class LocalJson2MetaOperator(KaapanaPythonBaseOperator):
                     print(f"Pushing file: {json_file} to META!")
                     with open(json_file, encoding="utf-8") as f:
                         for line in f:
-                            obj = json.loads(line)
-                            self.push_json(obj)
+                            yield json.loads(line)
             else:
                 # TODO: is this dcm check necessary? InstanceID is set in upload
                 dcm_files = sorted(
@@ -145,8 +219,7 @@ class LocalJson2MetaOperator(KaapanaPythonBaseOperator):
                 for json_file in json_list:
                     print(f"Pushing file: {json_file} to META!")
                     with open(json_file, encoding="utf-8") as f:
-                        new_json = json.load(f)
-                    self.push_json(new_json)
+                        yield json.load(f)
 
     def set_id(self, dcm_file=None):
         if dcm_file is not None:
@@ -189,6 +262,7 @@ class LocalJson2MetaOperator(KaapanaPythonBaseOperator):
         avalability_check_delay: int = 10,
         avalability_check_max_tries: int = 15,
         check_in_pacs: bool = True,
+        bulk_batch_size: int = 500,
         **kwargs,
     ):
         """
@@ -200,6 +274,7 @@ class LocalJson2MetaOperator(KaapanaPythonBaseOperator):
         :param avalability_check_delay: When checking for series availability in PACS, this parameter determines how many seconds are waited between checks in case series is not found.
         :param avalability_check_max_tries: When checking for series availability in PACS, this parameter determines how often to check for series in case it is not found.
         :param check_in_pacs: Determines whether or not to search for series in PACS. If set to True and series is not found in PACS, the data will not be put into OpenSearch.
+        :param bulk_batch_size: Number of documents sent per _bulk request, the index is refreshed once after all documents are pushed. Set to None to push and refresh every document separately.
         """
 
         self.dicom_operator = dicom_operator
@@ -212,6 +287,7 @@ class LocalJson2MetaOperator(KaapanaPythonBaseOperator):
         self.no_update = no_update
         self.instanceUID = None
         self.check_in_pacs = check_in_pacs
+        self.bulk_batch_size = bulk_batch_size
 
         super().__init__(
             dag=dag,
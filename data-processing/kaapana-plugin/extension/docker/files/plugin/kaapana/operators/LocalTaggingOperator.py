@@ -6,6 +6,7 @@ from typing import List
 from kaapana.operators.KaapanaPythonBaseOperator import KaapanaPythonBaseOperator
 from kaapana.blueprints.kaapana_global_variables import SERVICES_NAMESPACE
 from kaapana.operators.HelperOpensearch import HelperOpensearch
+from kaapanapy.helper import update_tags
 
 
 class LocalTaggingOperator(KaapanaPythonBaseOperator):
@@ -14,35 +15,22 @@ class LocalTaggingOperator(KaapanaPythonBaseOperator):
         DELETE = "delete"
         ADD_FROM_FILE = "add_from_file"
 
-    def tagging(
-        self,
-        series_instance_uid: str,
-        tags: List[str],
-        tags2add: List[str] = [],
-        tags2delete: List[str] = [],
-    ):
-        print(series_instance_uid)
-        print(f"Tags 2 add: {tags2add}")
-        print(f"Tags 2 delete: {tags2delete}")
-
-        # Read Tags
-        os_client = HelperOpensearch.os_client
-
-        doc = os_client.get(index=self.opensearch_index, id=series_instance_uid)
-        print(doc)
-        index_tags = doc["_source"].get(self.tag_field, [])
-
-        final_tags = list(
-            set(tags)
-            .union(set(index_tags))
-            .difference(set(tags2delete))
-            .union(set(tags2add))
+    def tagging(self, tag_updates: List[dict]):
+        """
+        Apply the tag deltas of all series with scripted _bulk updates, see kaapanapy.helper.update_tags.
+        """
+        print(f"Tagging {len(tag_updates)} series")
+        result = update_tags(
+            HelperOpensearch.os_client,
+            tag_updates,
+            index=self.opensearch_index,
+            tag_field=self.tag_field,
+            batch_size=self.batch_size,
         )
-        print(f"Final tags: {final_tags}")
-
-        # Write Tags back
-        body = {"doc": {self.tag_field: final_tags}}
-        os_client.update(index=self.opensearch_index, id=series_instance_uid, body=body)
+        print(f"Updated: {result['updated']}, unchanged: {result['noop']}")
+        if len(result["errors"]) > 0:
+            print(json.dumps(result["errors"], indent=2))
+            raise ValueError(f"Tagging failed for {len(result['errors'])} series")
 
     def start(self, ds, **kwargs):
         print("Start tagging")
@@ -66,6 +54,8 @@ class LocalTaggingOperator(KaapanaPythonBaseOperator):
             f for f in glob.glob(os.path.join(run_dir, self.batch_name, "*"))
         ]
 
+        tag_updates = []
+
         for batch_element_dir in batch_folder:
             json_files = sorted(
                 glob.glob(
@@ -88,12 +78,19 @@ class LocalTaggingOperator(KaapanaPythonBaseOperator):
                             if value:
                                 file_tags.extend(value)
 
+                    tag_update = {
+                        "series_instance_uid": series_uid,
+                        "tags": existing_tags,
+                    }
                     if action == self.Action.ADD_FROM_FILE:
-                        self.tagging(series_uid, tags=existing_tags, tags2add=file_tags)
+                        tag_update["tags2add"] = file_tags
                     elif action == self.Action.ADD:
-                        self.tagging(series_uid, tags=existing_tags, tags2add=tags)
+                        tag_update["tags2add"] = tags
                     elif action == self.Action.DELETE:
-                        self.tagging(series_uid, tags=existing_tags, tags2delete=tags)
+                        tag_update["tags2delete"] = tags
+                    tag_updates.append(tag_update)
+
+        self.tagging(tag_updates)
 
     def __init__(
         self,
@@ -105,6 +102,7 @@ class LocalTaggingOperator(KaapanaPythonBaseOperator):
         opensearch_host=f"opensearch-service.{SERVICES_NAMESPACE}.svc",
         opensearch_port=9200,
         opensearch_index="meta-index",
+        batch_size: int = 1000,
         *args,
         **kwargs,
     ):
@@ -112,6 +110,7 @@ class LocalTaggingOperator(KaapanaPythonBaseOperator):
         :param tag_field: the field of the opensearch object where the tags are stored
         :param add_tags_from_file: determines if the content of the fields specified by tags_to_add_from_file are added as tags
         :param tags_to_add_from_file: a list of fields form the input json where the values are added as tags if add_tags_from_file is true
+        :param batch_size: the number of series updated with one opensearch _bulk request
         """
 
         self.tag_field = tag_field
@@ -120,5 +119,6 @@ class LocalTaggingOperator(KaapanaPythonBaseOperator):
         self.opensearch_host = opensearch_host
         self.opensearch_port = opensearch_port
         self.opensearch_index = opensearch_index
+        self.batch_size = batch_size
 
         super().__init__(dag=dag, name=name, python_callable=self.start, **kwargs)
@@ -1,110 +1,61 @@
 from fastapi import APIRouter, HTTPException, Body, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from app.datasets.utils import (
+    aggregation_cache,
     get_metadata,
-    execute_opensearch_query,
+    iter_opensearch_query,
     get_field_mapping,
+    get_structured_series,
+    iter_structured_series_ndjson,
 )
 from app.dependencies import get_opensearch
+from app.logger import get_logger
+from kaapanapy.helper import update_tags
+
+logger = get_logger(__name__)
 
 router = APIRouter(tags=["datasets"])
 
 
 @router.post("/tag")
-async def tag_data(data: list = Body(...), os_client=Depends(get_opensearch)):
-    from typing import List
-
-    def tagging(
-        os_client,
-        series_instance_uid: str,
-        tags: List[str],
-        tags2add: List[str] = [],
-        tags2delete: List[str] = [],
-    ):
-        print(series_instance_uid)
-        print(f"Tags 2 add: {tags2add}")
-        print(f"Tags 2 delete: {tags2delete}")
-
-        # Read Tags
-        doc = os_client.get(index="meta-index", id=series_instance_uid)
-        print(doc)
-        index_tags = doc["_source"].get("00000000 Tags_keyword", [])
-
-        final_tags = list(
-            set(tags)
-            .union(set(index_tags))
-            .difference(set(tags2delete))
-            .union(set(tags2add))
-        )
-        print(f"Final tags: {final_tags}")
-
-        # Write Tags back
-        body = {"doc": {"00000000 Tags_keyword": final_tags}}
-        os_client.update(index="meta-index", id=series_instance_uid, body=body)
-
+def tag_data(
+    data: list = Body(...), batch_size: int = 1000, os_client=Depends(get_opensearch)
+):
+    """
+    Apply the tag deltas of [{"series_instance_uid", "tags", "tags2add", "tags2delete"}, ...]
+    with scripted _bulk updates of batch_size series.
+    """
     try:
-        for series in data:
-            tagging(
-                os_client,
-                series["series_instance_uid"],
-                series["tags"],
-                series["tags2add"],
-                series["tags2delete"],
-            )
-        return JSONResponse({})
-
+        result = update_tags(os_client, data, batch_size=batch_size)
     except Exception as e:
-        print("ERROR!")
-        raise HTTPException(500, e)
+        logger.error(f"Tagging failed: {e}")
+        raise HTTPException(500, str(e))
+    if len(result["errors"]) > 0:
+        logger.error(f"Tagging failed for {len(result['errors'])} series")
+        raise HTTPException(500, result["errors"])
+    return JSONResponse(result)
 
 
 # This should actually be a get request but since the body is too large for a get request
 # we use a post request
 @router.post("/series")
-async def get_series(data: dict = Body(...), os_client=Depends(get_opensearch)):
-    import pandas as pd
-
+def get_series(data: dict = Body(...), os_client=Depends(get_opensearch)):
     structured: bool = data.get("structured", False)
+    stream: bool = data.get("stream", False)
     query: dict = data.get("query", {"query_string": {"query": "*"}})
 
-    if structured:
-        hits = execute_opensearch_query(
-            os_client,
-            query=query,
-            source={
-                "includes": [
-                    "00100020 PatientID_keyword",
-                    "0020000D StudyInstanceUID_keyword",
-                    "0020000E SeriesInstanceUID_keyword",
-                ]
-            },
-        )
-
-        res_array = [
-            [
-                hit["_source"].get("00100020 PatientID_keyword") or "N/A",
-                hit["_source"]["0020000D StudyInstanceUID_keyword"],
-                hit["_source"]["0020000E SeriesInstanceUID_keyword"],
-            ]
-            for hit in hits
-        ]
-
-        df = pd.DataFrame(
-            res_array,
-            columns=["Patient ID", "Study Instance UID", "Series Instance UID"],
-        )
-        return JSONResponse(
-            {
-                k: f.groupby("Study Instance UID")["Series Instance UID"]
-                .apply(list)
-                .to_dict()
-                for k, f in df.groupby("Patient ID")
-            }
+    if structured and stream:
+        # One JSON object per study, see iter_series_by_study
+        return StreamingResponse(
+            iter_structured_series_ndjson(os_client, query),
+            media_type="application/x-ndjson",
         )
+    elif structured:
+        return JSONResponse(get_structured_series(os_client, query))
     elif not structured:
         return JSONResponse(
-            [d["_id"] for d in execute_opensearch_query(os_client, query)]
+            [d["_id"] for d in iter_opensearch_query(os_client, query, source=False)]
         )
 
 
@@ -132,15 +83,43 @@ async def get_data(series_instance_uid, os_client=Depends(get_opensearch)):
 # we use a post request
 @router.post("/dashboard")
 async def get_dashboard(config: dict = Body(...), os_client=Depends(get_opensearch)):
+    """
+    Metrics and histograms of the selected fields for the dashboard.
+
+    By default all buckets of a field are returned with terms aggregations.
+    If config contains page_size, every histogram contains at most page_size buckets in key order
+    and an 'after' key, which is passed back as config['after'][name] to get the next page.
+    Results are cached for AGGREGATION_CACHE_TTL seconds or until the index is written to.
+    """
     series_instance_uids = config.get("series_instance_uids")
     names = config.get("names", [])
+    page_size = config.get("page_size")
+    after = config.get("after", {})
 
     name_field_map = await get_field_mapping(os_client)
     filtered_name_field_map = {
         name: name_field_map[name] for name in names if name in name_field_map
     }
+    if page_size:
+        field_aggs = {
+            name: {
+                "composite": {
+                    "size": page_size,
+                    "sources": [{name: {"terms": {"field": field}}}],
+                    **({"after": after[name]} if name in after else {}),
+                }
+            }
+            for name, field in filtered_name_field_map.items()
+        }
+    else:
+        field_aggs = {
+            name: {"terms": {"field": field, "size": 10000}}
+            for name, field in filtered_name_field_map.items()
+        }
 
-    res = os_client.search(
+    res = aggregation_cache.search(
+        os_client,
+        index="meta-index",
         body={
             "size": 0,
             **(
@@ -164,21 +143,20 @@ async def get_dashboard(config: dict = Body(...), os_client=Depends(get_opensear
                         "field": "00100020 PatientID_keyword.keyword",
                     }
                 },
-                **{
-                    name: {"terms": {"field": field, "size": 10000}}
-                    for name, field in filtered_name_field_map.items()
-                },
+                **field_aggs,
             },
-        }
+        },
     )["aggregations"]
 
     histograms = {
         k: {
             "items": (
                 {
-                    (i["key_as_string"] if "key_as_string" in i else i["key"]): i[
-                        "doc_count"
-                    ]
+                    (
+                        i["key"][k]
+                        if isinstance(i["key"], dict)
+                        else i["key_as_string"] if "key_as_string" in i else i["key"]
+                    ): i["doc_count"]
                     # dict(
                     # text=f"{(i['key_as_string'] if 'key_as_string' in i else i['key'])}  ({i['doc_count']})",
                     # value=(
@@ -192,6 +170,7 @@ async def get_dashboard(config: dict = Body(...), os_client=Depends(get_opensear
                 }
             ),
             "key": name_field_map[k],
+            **({"after": item["after_key"]} if "after_key" in item else {}),
         }
         for k, item in res.items()
         if "buckets" in item and len(item["buckets"]) > 0
@@ -212,13 +191,15 @@ async def get_all_values(os_client, item_name, query):
     if not item_key:
         return {}  # todo: maybe better default
 
-    item = os_client.search(
+    item = aggregation_cache.search(
+        os_client,
+        index="meta-index",
         body={
             "size": 0,
             # {"query":"D","field":"00000000 Tags_keyword.keyword","boolFilter":[]}
             "query": query,  # {"query": {"ids": {"values": series_instance_uids}}}
             "aggs": {item_name: {"terms": {"field": item_key, "size": 10000}}},
-        }
+        },
     )["aggregations"][item_name]
 
     if "buckets" in item and len(item["buckets"]) > 0:
@@ -1,6 +1,12 @@
+import hashlib
+import json
 import logging
+import os
 import re
-from typing import Dict, List
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List
 
 import requests
 from fastapi import HTTPException
@@ -11,11 +17,17 @@ from app.workflows.utils import (
     raise_kaapana_connection_error,
 )
 from app.logger import get_logger
+from kaapanapy.helper import iter_opensearch_query
 
 logger = get_logger(__name__, logging.DEBUG)
 
-
-#  from kaapana.operators.HelperOpensearch import HelperOpensearch
+# Seconds between two checks whether the mapping of an index changed
+FIELD_MAPPING_CHECK_INTERVAL = 10.0
+# Seconds aggregation results are reused, e.g. for repeated views of the dashboard
+AGGREGATION_CACHE_TTL = float(os.getenv("AGGREGATION_CACHE_TTL", 30.0))
+AGGREGATION_CACHE_MAX_ENTRIES = 256
+# Seconds until writes are visible to searches, the default refresh_interval of OpenSearch
+INDEX_REFRESH_INTERVAL = 1.0
 
 
 def execute_opensearch_query(
@@ -27,45 +39,81 @@ def execute_opensearch_query(
     scroll=False,
 ) -> List:
     """
-    Since Opensearch has a strict size limit of 10000 but sometimes scrolling or
-    pagination is not desirable, this helper function aggregates paginated results
-    into a single one.
-
-    Caution: Removing or adding entries between requests will lead to inconsistencies.
-    Opensearch offers the 'scroll' functionality which prevents this, but creating
-    the required sessions takes too much time for most requests.
-    Therefore, it is not implemented yet
+    Aggregate all hits of a query into a single list.
+    Prefer iter_opensearch_query for large result sets, it yields the hits lazily
+    from a consistent point-in-time snapshot.
 
     :param query: query to execute
     :param source: opensearch _source parameter
     :param index: index on which to execute the query
-    :param sort: TODO
-    :param scroll: use scrolling or pagination -> scrolling currently not impelmented
+    :param sort: sort order, must be unique per document
+    :param scroll: unused, kept for backwards compatibility
     :return: aggregated search results
     """
+    return list(
+        iter_opensearch_query(
+            os_client, query=query, source=source, index=index, sort=sort
+        )
+    )
 
-    def _execute_opensearch_query(os_client, search_after=None, size=10000) -> List:
-        res = os_client.search(
-            body={
-                "query": query,
-                "size": size,
-                "_source": source,
-                "sort": sort,
-                **({"search_after": search_after} if search_after else {}),
-            },
-            index=index,
+
+PATIENT_ID_TAG = "00100020 PatientID_keyword"
+STUDY_UID_TAG = "0020000D StudyInstanceUID_keyword"
+SERIES_UID_TAG = "0020000E SeriesInstanceUID_keyword"
+
+
+def iter_series_by_study(os_client, query: Dict) -> Iterator[Dict]:
+    """
+    Yield one record per study with all matching series of that study.
+
+    The series are scanned sorted by study and series uid, so every study is complete
+    as soon as the next study starts and no more than one study is held in memory.
+
+    :return: Iterator over {"Patient ID": ..., "Study Instance UID": ..., "Series Instance UIDs": [...]}
+    """
+    hits = iter_opensearch_query(
+        os_client,
+        query=query,
+        source={"includes": [PATIENT_ID_TAG, STUDY_UID_TAG, SERIES_UID_TAG]},
+        sort=[
+            {f"{STUDY_UID_TAG}.keyword": "asc"},
+            {f"{SERIES_UID_TAG}.keyword": "asc"},
+        ],
+    )
+    study = None
+    for hit in hits:
+        study_uid = hit["_source"][STUDY_UID_TAG]
+        if study is None or study["Study Instance UID"] != study_uid:
+            if study is not None:
+                yield study
+            study = {
+                "Patient ID": hit["_source"].get(PATIENT_ID_TAG) or "N/A",
+                "Study Instance UID": study_uid,
+                "Series Instance UIDs": [],
+            }
+        study["Series Instance UIDs"].append(hit["_source"][SERIES_UID_TAG])
+    if study is not None:
+        yield study
+
+
+def get_structured_series(os_client, query: Dict) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Return all matching series as mapping patient -> study -> series.
+    """
+    structured = {}
+    for study in iter_series_by_study(os_client, query):
+        structured.setdefault(study["Patient ID"], {})[study["Study Instance UID"]] = (
+            study["Series Instance UIDs"]
         )
-        if len(res["hits"]["hits"]) > 0:
-            return [
-                *res["hits"]["hits"],
-                *_execute_opensearch_query(
-                    os_client, res["hits"]["hits"][-1]["sort"], size
-                ),
-            ]
-        else:
-            return res["hits"]["hits"]
+    return structured
 
-    return _execute_opensearch_query(os_client=os_client)
+
+def iter_structured_series_ndjson(os_client, query: Dict) -> Iterator[str]:
+    """
+    Stream all matching series as newline delimited JSON with one study per line.
+    """
+    for study in iter_series_by_study(os_client, query):
+        yield json.dumps(study) + "\n"
 
 
 def contains_numbers(s):
@@ -178,6 +226,28 @@ async def get_metadata_pacs(study_instance_UID: str, series_instance_UID: str) -
     return res
 
 
+def get_index_version(os_client, index="meta-index"):
+    """
+    Returns the uuid and mapping_version of an index.
+    They change if the index is recreated or fields are added to its mapping.
+    Returns None if the cluster state is not accessible.
+    """
+    try:
+        res = os_client.cluster.state(
+            metric="metadata",
+            index=index,
+            filter_path="metadata.indices.*.mapping_version,metadata.indices.*.settings.index.uuid",
+        )
+        metadata = next(iter(res["metadata"]["indices"].values()))
+        return metadata["settings"]["index"]["uuid"], metadata["mapping_version"]
+    except Exception as e:
+        logger.debug(f"Could not get the version of {index}: {e}")
+        return None
+
+
+_field_mappings = {}
+
+
 async def get_field_mapping(os_client, index="meta-index") -> Dict:
     """
     Returns a mapping of field for a given index form open search.
@@ -187,8 +257,21 @@ async def get_field_mapping(os_client, index="meta-index") -> Dict:
     #   'Image Type': '00080008 ImageType_keyword.keyword'
     #   ...
     # }
+    The mapping is cached per index and only fetched again once get_index_version() changed.
+    If the version is not available, it is fetched again every FIELD_MAPPING_CHECK_INTERVAL seconds.
     """
-    import re
+    now = time.monotonic()
+    cached = _field_mappings.get(index)
+    if (
+        cached is not None
+        and now - cached["time_checked"] < FIELD_MAPPING_CHECK_INTERVAL
+    ):
+        return cached["mapping"]
+
+    version = get_index_version(os_client, index)
+    if cached is not None and version is not None and version == cached["version"]:
+        cached["time_checked"] = now
+        return cached["mapping"]
 
     res = os_client.indices.get_mapping(index=index)[index]["mappings"]["properties"]
 
@@ -201,4 +284,85 @@ async def get_field_mapping(os_client, index="meta-index") -> Dict:
         for k, v in name_field_map.items()
         if len(re.findall("\d", k)) == 0 and k != "" and v != ""
     }
+    _field_mappings[index] = {
+        "version": version,
+        "time_checked": now,
+        "mapping": name_field_map,
+    }
     return name_field_map
+
+
+def get_index_write_count(os_client, index="meta-index"):
+    """
+    Returns the number of index and delete operations on the primary shards of an index.
+    Scripted updates, e.g. of tags, are counted as index operations.
+    Returns None if the index stats are not accessible.
+    """
+    try:
+        res = os_client.indices.stats(
+            index=index,
+            metric="indexing",
+            filter_path="_all.primaries.indexing.index_total,_all.primaries.indexing.delete_total",
+        )
+        indexing = res["_all"]["primaries"]["indexing"]
+        return indexing["index_total"] + indexing["delete_total"]
+    except Exception as e:
+        logger.debug(f"Could not get the write count of {index}: {e}")
+        return None
+
+
+class AggregationCache:
+    """
+    Results of aggregation searches for ttl seconds, keyed by a hash of the index, its write count and the query body.
+
+    Every write to the index, no matter from which backend worker or Airflow operator, changes the key,
+    so cached results are not reused after tagging or indexing.
+    Results are only stored once the write count did not change for INDEX_REFRESH_INTERVAL seconds,
+    since writes are not visible to searches before the next refresh of the index.
+    If the write count is not available, results are reused for ttl seconds.
+    At most max_entries results are kept, the least recently used ones are dropped first.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # index: (write count, time it was seen first)
+        self.write_counts = {}
+        self.lock = threading.Lock()
+
+    def search(self, os_client, body: Dict, index: str = "meta-index") -> Dict:
+        write_count = get_index_write_count(os_client, index)
+        key = hashlib.sha256(
+            json.dumps([index, write_count, body], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                return entry[1]
+            if write_count is not None and (
+                index not in self.write_counts
+                or self.write_counts[index][0] != write_count
+            ):
+                self.write_counts[index] = (write_count, now)
+
+        res = os_client.search(index=index, body=body)
+
+        with self.lock:
+            if (
+                write_count is not None
+                and now - self.write_counts[index][1] < INDEX_REFRESH_INTERVAL
+            ):
+                return res
+            self.entries[key] = (now, res)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return res
+
+
+aggregation_cache = AggregationCache(
+    AGGREGATION_CACHE_TTL, AGGREGATION_CACHE_MAX_ENTRIES
+)
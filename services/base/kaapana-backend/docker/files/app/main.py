@@ -14,7 +14,11 @@ from .dependencies import get_token_header
 from .middlewares import SecurityMiddleware
 from .monitoring import routers as monitoring
 from .workflows import models
-from .workflows.crud import get_remote_updates, sync_states_from_airflow
+from .workflows.crud import (
+    get_remote_updates,
+    resubmit_queued_jobs,
+    sync_states_from_airflow,
+)
 from .workflows.routers import client, remote
 
 models.Base.metadata.create_all(bind=engine)
@@ -45,8 +49,10 @@ def periodically_get_remote_updates():
                 logging.warning(traceback.format_exc())
 
 
+# Airflow pushes state transitions to /client/airflow-states as they happen.
+# This sweep only reconciles transitions that were lost on the way.
 @app.on_event("startup")
-@repeat_every(seconds=float(os.getenv("AIRFLOW_SYNC_INTERVAL", 10.0)))
+@repeat_every(seconds=float(os.getenv("AIRFLOW_SYNC_INTERVAL", 60.0)))
 def periodically_sync_states_from_airflow():
     # From: https://github.com/dmontagu/fastapi-utils/issues/230
     # In the future also think about integrating celery, this might help with the issue of repeated execution: https://testdriven.io/blog/fastapi-and-celery/
@@ -65,6 +71,23 @@ def periodically_sync_states_from_airflow():
                 logging.warning(traceback.format_exc())
 
 
+# Jobs submitted to the job dispatcher of a worker are lost, if the worker is restarted.
+@app.on_event("startup")
+@repeat_every(seconds=float(os.getenv("AIRFLOW_RESUBMIT_INTERVAL", 60.0)))
+def periodically_resubmit_queued_jobs():
+    parent_process = psutil.Process(os.getppid())
+    children = parent_process.children(recursive=True)  # List of all child processes
+    if children[0].pid == os.getpid():
+        with SessionLocal() as db:
+            try:
+                resubmit_queued_jobs(db)
+            except Exception as e:
+                logging.warning(
+                    "Something went wrong updating in crud.resubmit_queued_jobs()"
+                )
+                logging.warning(traceback.format_exc())
+
+
 # @app.on_event("startup")
 # @repeat_every(seconds=float(60.0))
 # def periodically_sync_n_clean_qsr_jobs_with_airflow():
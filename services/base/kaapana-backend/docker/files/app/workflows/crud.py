@@ -1,10 +1,11 @@
+import base64
 import copy
 import datetime
 import json
 import logging
 import os
 import random
-import string
+import time
 import traceback
 import uuid
 from typing import List, Optional
@@ -15,12 +16,14 @@ from app.database import SessionLocal
 from cryptography.fernet import Fernet
 from fastapi import HTTPException, Response
 from psycopg2.errors import UniqueViolation
-from sqlalchemy import JSON, String, cast, desc, func
-from sqlalchemy.exc import IntegrityError, NoResultFound
-from sqlalchemy.orm import Session
+from sqlalchemy import JSON, String, cast, delete, desc, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, defer, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from urllib3.util import Timeout
 
-from . import models, schemas
+from . import dispatcher, models, remote_sync, schemas
 from .schemas import DatasetCreate
 from .utils import (
     HelperMinio,
@@ -29,6 +32,7 @@ from .utils import (
     execute_job_airflow,
     get_dag_list,
     get_dagrun_details_airflow,
+    get_dagrun_states_airflow,
     get_dagrun_tasks_airflow,
     get_dagruns_airflow,
     get_utc_timestamp,
@@ -38,9 +42,18 @@ from .utils import (
 
 logging.getLogger().setLevel(logging.INFO)
 
+# Rows per INSERT/DELETE statement when writing dataset identifiers in bulk.
+# Keeps every statement well below the postgres limit of 65535 bind parameters.
+IDENTIFIER_CHUNK_SIZE = 10000
+# Rows per INSERT when creating jobs in bulk, a job row has about a dozen bind parameters.
+JOB_CHUNK_SIZE = 1000
+
 TIMEOUT_SEC = 5
 TIMEOUT = Timeout(TIMEOUT_SEC)
 
+# Delta syncs of remote instances overlap, so that jobs committed during a sync are not missed
+DELTA_SYNC_OVERLAP_SECONDS = 30
+
 
 def delete_kaapana_instance(db: Session, kaapana_instance_id: int):
     db_kaapana_instance = (
@@ -406,6 +419,224 @@ def create_job(db: Session, job: schemas.JobCreate, service_job: str = False):
     return db_job
 
 
+def bulk_create_jobs(
+    db: Session,
+    db_kaapana_instance: models.KaapanaInstance,
+    db_workflow: models.Workflow,
+    jobs: List[dict],
+) -> List[int]:
+    """
+    Create queued jobs of db_workflow on db_kaapana_instance with one INSERT per chunk.
+
+    Each job is a dict with conf_data, dag_id and username.
+    Jobs of the local instance with automatic execution are handed to the job_dispatcher to be triggered in Airflow.
+    :return: ids of the created jobs
+    """
+    utc_timestamp = get_utc_timestamp()
+    minio_urls = None
+    job_ids = []
+    for chunk in _chunks(jobs, JOB_CHUNK_SIZE):
+        rows = []
+        for job in chunk:
+            conf_data = job["conf_data"]
+            if "federated_form" in conf_data and (
+                "federated_dir" in conf_data["federated_form"]
+                and "federated_bucket" in conf_data["federated_form"]
+                and "federated_operators" in conf_data["federated_form"]
+            ):
+                # the presigned urls only depend on federated_form, which all jobs share
+                if minio_urls is None:
+                    minio_urls = HelperMinio().add_minio_urls(
+                        conf_data["federated_form"], db_kaapana_instance.instance_name
+                    )
+                conf_data["federated_form"]["minio_urls"] = minio_urls
+            rows.append(
+                {
+                    "conf_data": conf_data,
+                    "dag_id": job["dag_id"],
+                    "username": job["username"],
+                    "status": "queued",
+                    "kaapana_id": db_kaapana_instance.id,
+                    "owner_kaapana_instance_name": settings.instance_name,
+                    "automatic_execution": db_workflow.automatic_execution,
+                    "service_job": False,
+                    "task_states": {},
+                    "workflow_id": db_workflow.workflow_id,
+                    "time_created": utc_timestamp,
+                    "time_updated": utc_timestamp,
+                }
+            )
+        job_ids.extend(
+            db.execute(
+                insert(models.Job).values(rows).returning(models.Job.id)
+            ).scalars()
+        )
+    db_workflow.time_updated = utc_timestamp
+    db.commit()
+
+    if db_kaapana_instance.remote is False and db_workflow.automatic_execution is True:
+        job_dispatcher.submit(job_ids)
+    return job_ids
+
+
+def prepare_dispatched_jobs(job_ids: List[int]) -> List[tuple]:
+    """
+    Claim the queued jobs of job_ids and return (job_id, dag_id, run_id, conf) of all jobs to be triggered.
+
+    The run_ids are generated and committed before the dag-runs are triggered,
+    so that state updates pushed by Airflow always find their jobs.
+    Jobs which already have a run_id or are claimed by another worker are skipped.
+    Jobs which are not allowed to be triggered are set to failed, like in update_job().
+    """
+    dispatched_jobs = []
+    with SessionLocal() as db:
+        utc_timestamp = get_utc_timestamp()
+        db_jobs = (
+            db.query(models.Job)
+            .options(joinedload(models.Job.kaapana_instance))
+            .filter(
+                models.Job.id.in_(job_ids),
+                models.Job.status == "queued",
+                models.Job.run_id.is_(None),
+            )
+            .with_for_update(skip_locked=True, of=models.Job)
+            .all()
+        )
+        for db_job in db_jobs:
+            db_job.conf_data["client_job_id"] = db_job.id
+            dag_id_and_dataset = check_dag_id_and_dataset(
+                db_job.kaapana_instance,
+                db_job.conf_data,
+                db_job.dag_id,
+                db_job.owner_kaapana_instance_name,
+            )
+            if dag_id_and_dataset is not None:
+                db_job.status = "failed"
+                db_job.description = dag_id_and_dataset
+                db_job.time_updated = utc_timestamp
+                continue
+            db_job.run_id = dispatcher.generate_run_id(db_job.dag_id)
+            db_job.time_updated = utc_timestamp
+            dispatched_jobs.append(
+                (
+                    db_job.id,
+                    db_job.dag_id,
+                    db_job.run_id,
+                    copy.deepcopy(db_job.conf_data),
+                )
+            )
+        db.commit()
+    return dispatched_jobs
+
+
+def complete_dispatched_jobs(results: dict):
+    """
+    Set triggered jobs to scheduled, jobs which could not be triggered are set to failed.
+
+    Jobs whose state was already updated by Airflow in the meantime are left as they are.
+    """
+    with SessionLocal() as db:
+        utc_timestamp = get_utc_timestamp()
+        db_jobs = (
+            db.query(models.Job)
+            .filter(models.Job.id.in_(results), models.Job.status == "queued")
+            .all()
+        )
+        for db_job in db_jobs:
+            result = results[db_job.id]
+            if "error" in result:
+                db_job.status = "failed"
+                db_job.description = result["error"]
+            else:
+                db_job.status = "scheduled"
+                db_job.dag_id = result["dag_id"]
+                db_job.run_id = result["run_id"]
+            db_job.time_updated = utc_timestamp
+        db.commit()
+        for db_job in db_jobs:
+            update_external_job(db, db_job)
+
+
+# Triggers the dag-runs of jobs created by bulk_create_jobs()
+job_dispatcher = dispatcher.AirflowJobDispatcher(
+    prepare_dispatched_jobs, complete_dispatched_jobs
+)
+
+
+def release_stale_claim(db: Session, db_job: models.Job) -> bool:
+    """
+    Release the run_id of a queued job of the local instance with automatic execution, if its dag-run does not exist in Airflow.
+
+    The claim was not triggered, e.g. because the worker was stopped between claim and trigger.
+    time_updated is kept, so that resubmit_queued_jobs() submits the job again right away.
+    :return: True if the run_id was released.
+    """
+    if (
+        db_job.status != "queued"
+        or db_job.run_id is None
+        or db_job.automatic_execution is not True
+        or db_job.kaapana_instance.remote
+    ):
+        return False
+    airflow_details_resp = get_dagrun_details_airflow(db_job.dag_id, db_job.run_id)
+    # unknown run_ids are answered with 400
+    if airflow_details_resp.ok or airflow_details_resp.status_code >= 500:
+        return False
+    logging.warning(
+        f"Dag-run {db_job.run_id} of job {db_job.id} was never triggered -> releasing its run_id"
+    )
+    db_job.run_id = None
+    db.commit()
+    return True
+
+
+def resubmit_queued_jobs(db: Session) -> List[int]:
+    """
+    Submit unclaimed queued jobs of the local instance with automatic execution to the job_dispatcher again.
+
+    Submitted job ids only live in the memory of one worker and are lost e.g. if the worker is restarted.
+    Only jobs which were not updated for AIRFLOW_DISPATCH_CLAIM_TIMEOUT seconds are submitted,
+    submitting a job twice is harmless, since prepare_dispatched_jobs() only claims jobs without a run_id.
+    Claims of these jobs whose dag-runs were never triggered are released first, see release_stale_claim().
+    :return: ids of the submitted jobs
+    """
+    time_claim_timeout = get_utc_timestamp() - datetime.timedelta(
+        seconds=dispatcher.AIRFLOW_DISPATCH_CLAIM_TIMEOUT
+    )
+    for db_job in (
+        db.query(models.Job)
+        .join(models.Job.kaapana_instance)
+        .filter(
+            models.KaapanaInstance.remote == False,
+            models.Job.status == "queued",
+            models.Job.run_id.isnot(None),
+            models.Job.automatic_execution == True,
+            models.Job.time_updated < time_claim_timeout,
+        )
+        .all()
+    ):
+        release_stale_claim(db, db_job)
+
+    job_ids = [
+        job_id
+        for job_id, in db.query(models.Job.id)
+        .join(models.Job.kaapana_instance)
+        .filter(
+            models.KaapanaInstance.remote == False,
+            models.Job.status == "queued",
+            models.Job.run_id.is_(None),
+            models.Job.automatic_execution == True,
+            models.Job.time_updated < time_claim_timeout,
+        )
+        .order_by(models.Job.id)
+        .all()
+    ]
+    if len(job_ids) > 0:
+        logging.warning(f"Submitting {len(job_ids)} unclaimed queued jobs again")
+        job_dispatcher.submit(job_ids)
+    return job_ids
+
+
 def get_job(db: Session, job_id: int = None, run_id: str = None):
     if job_id is not None:
         db_job = db.query(models.Job).filter_by(id=job_id).first()
@@ -522,6 +753,88 @@ def get_jobs(
         # explanation: db.query(models.Job) returns a Query object; .join() creates more narrow Query objects ; filter_by() applies the filter criterion to the remaining Query (source: https://docs.sqlalchemy.org/en/14/orm/query.html#sqlalchemy.orm.Query)
 
 
+def encode_cursor(time_updated: datetime.datetime, key) -> str:
+    """
+    Opaque cursor pointing behind the row with the given (time_updated, primary key).
+    """
+    return base64.urlsafe_b64encode(
+        json.dumps([time_updated.isoformat(), key]).encode()
+    ).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        time_updated, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.datetime.fromisoformat(time_updated), key
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def get_jobs_page(
+    db: Session,
+    instance_name: str = None,
+    workflow_name: str = None,
+    status: str = None,
+    dag_id: str = None,
+    remote: bool = True,
+    limit: int = None,
+    cursor: str = None,
+    include_details: bool = False,
+    updated_since: datetime.datetime = None,
+):
+    """
+    Jobs ordered by (time_updated, id) descending, starting behind cursor.
+
+    Filters are combined like in get_jobs(), the remote filter only applies if neither instance_name,
+    workflow_name nor status are given.
+    If updated_since is given, only jobs updated after it are returned.
+    Unless include_details is True, conf_data, description and task_states are not loaded and returned as None.
+    """
+    query = db.query(models.Job).options(
+        joinedload(models.Job.kaapana_instance), joinedload(models.Job.workflow)
+    )
+    if instance_name is not None:
+        query = query.filter(
+            models.Job.kaapana_instance.has(instance_name=instance_name)
+        )
+    if workflow_name is not None:
+        query = query.filter(models.Job.workflow.has(workflow_name=workflow_name))
+    if status is not None:
+        query = query.filter(models.Job.status == status)
+    if dag_id is not None:
+        query = query.filter(models.Job.dag_id == dag_id)
+    if instance_name is None and workflow_name is None and status is None:
+        query = query.filter(
+            models.Job.workflow.has(models.Workflow.kaapana_instance.has(remote=remote))
+        )
+    if updated_since is not None:
+        query = query.filter(models.Job.time_updated > updated_since)
+    if cursor is not None:
+        time_updated, job_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(models.Job.time_updated, models.Job.id)
+            < tuple_(time_updated, job_id)
+        )
+    if not include_details:
+        query = query.options(
+            defer(models.Job.conf_data),
+            defer(models.Job.description),
+            defer(models.Job.task_states),
+        )
+
+    db_jobs = (
+        query.order_by(desc(models.Job.time_updated), desc(models.Job.id))
+        .limit(limit)
+        .all()
+    )
+    if not include_details:
+        for db_job in db_jobs:
+            set_committed_value(db_job, "conf_data", None)
+            set_committed_value(db_job, "description", None)
+            set_committed_value(db_job, "task_states", None)
+    return db_jobs
+
+
 def update_job(db: Session, job=schemas.JobUpdate, remote: bool = True):
     utc_timestamp = get_utc_timestamp()
 
@@ -591,6 +904,8 @@ def update_job(db: Session, job=schemas.JobUpdate, remote: bool = True):
         db_job.run_id = job.run_id
     if job.description is not None:
         db_job.description = job.description
+    if job.task_states is not None:
+        db_job.task_states = job.task_states
     db_job.time_updated = utc_timestamp
     update_external_job(db, db_job)
     db.commit()
@@ -636,16 +951,36 @@ def sync_client_remote(
     remote_kaapana_instance: schemas.RemoteKaapanaInstanceUpdateExternal,
     instance_name: str = None,
     status: str = None,
+    since: float = None,
 ):
+    """
+    Jobs and workflows to be synced to the remote instance instance_name.
+
+    If since is given, only jobs updated after the sync_timestamp of a previous answer are returned.
+    """
     db_client_kaapana = get_kaapana_instance(db)
 
     create_and_update_remote_kaapana_instance(
         db=db, remote_kaapana_instance=remote_kaapana_instance, action="external_update"
     )
 
+    # taken before the query, the remote instance sends it back as since with its next sync
+    sync_timestamp = time.time()
+    updated_since = (
+        datetime.datetime.fromtimestamp(
+            since - DELTA_SYNC_OVERLAP_SECONDS, tz=datetime.timezone.utc
+        )
+        if since is not None
+        else None
+    )
     # get jobs on client_kaapana_instance with instance="instance_name" and status="status"
-    db_outgoing_jobs = get_jobs(
-        db, instance_name=instance_name, status=status, remote=True
+    db_outgoing_jobs = get_jobs_page(
+        db,
+        instance_name=instance_name,
+        status=status,
+        remote=True,
+        include_details=True,
+        updated_since=updated_since,
     )
     # outgoing_jobs = [schemas.Job(**job.__dict__).dict() for job in db_outgoing_jobs]
 
@@ -683,6 +1018,7 @@ def sync_client_remote(
         "incoming_jobs": outgoing_jobs,
         "incoming_workflows": outgoing_workflows,
         "update_remote_instance_payload": update_remote_instance_payload,
+        "sync_timestamp": sync_timestamp,
     }
 
 
@@ -728,6 +1064,7 @@ def update_external_job(db: Session, db_job):
                 "run_id": db_job.run_id,
                 "status": db_job.status,
                 "description": db_job.description,
+                "task_states": db_job.task_states,
             }
 
             # if db_remote_kaapana_instance.instance_name == settings.instance_name:
@@ -761,127 +1098,148 @@ def get_remote_updates(db: Session, periodically=False):
     db_client_kaapana = get_kaapana_instance(db)
     if periodically is True and db_client_kaapana.automatic_update is False:
         return
-    db_kaapana_instances = get_kaapana_instances(db)
-    for db_remote_kaapana_instance in db_kaapana_instances:
-        if not db_remote_kaapana_instance.remote:
-            # Skipping locally running jobs
+    db_remote_kaapana_instances = [
+        db_kaapana_instance
+        for db_kaapana_instance in get_kaapana_instances(db)
+        # Skipping locally running jobs
+        if db_kaapana_instance.remote
+    ]
+    update_remote_instance_payload = {
+        "instance_name": db_client_kaapana.instance_name,
+        "allowed_dags": db_client_kaapana.allowed_dags,
+        "allowed_datasets": db_client_kaapana.allowed_datasets,
+        "automatic_update": db_client_kaapana.automatic_update,
+        "automatic_workflow_execution": db_client_kaapana.automatic_workflow_execution,
+    }
+    job_params = {
+        "instance_name": db_client_kaapana.instance_name,
+        "status": "queued",
+    }
+    # all remote instances are requested concurrently, unreachable ones are backed off
+    incoming = remote_sync.fetch_remote_updates(
+        db_remote_kaapana_instances,
+        job_params,
+        update_remote_instance_payload,
+        Fernet(db_client_kaapana.encryption_key),
+    )
+    for db_remote_kaapana_instance in db_remote_kaapana_instances:
+        if db_remote_kaapana_instance.id not in incoming:
             continue
-        update_remote_instance_payload = {
-            "instance_name": db_client_kaapana.instance_name,
-            "allowed_dags": db_client_kaapana.allowed_dags,
-            "allowed_datasets": db_client_kaapana.allowed_datasets,
-            "automatic_update": db_client_kaapana.automatic_update,
-            "automatic_workflow_execution": db_client_kaapana.automatic_workflow_execution,
-        }
-
-        job_params = {
-            "instance_name": db_client_kaapana.instance_name,
-            "status": "queued",
-        }
-        remote_backend_url = f"{db_remote_kaapana_instance.protocol}://{db_remote_kaapana_instance.host}:{db_remote_kaapana_instance.port}/kaapana-backend/remote"
-        with requests.Session() as s:
-            r = requests_retry_session(session=s).put(
-                f"{remote_backend_url}/sync-client-remote",
-                params=job_params,
-                json=update_remote_instance_payload,
-                verify=db_remote_kaapana_instance.ssl_check,
-                headers={
-                    "FederatedAuthorization": f"{db_remote_kaapana_instance.token}"
-                },
-                timeout=TIMEOUT,
+        incoming_data = incoming[db_remote_kaapana_instance.id]
+        try:
+            apply_remote_updates(
+                db, db_client_kaapana, db_remote_kaapana_instance, incoming_data
             )
-        if r.status_code != 200:
+        except Exception:
+            # rolls back the uncommitted rest, the updates are applied again with the next sync
+            db.rollback()
             logging.warning(
-                f"Warning!!! We could not reach the following backend {db_remote_kaapana_instance.host}"
+                f"Could not apply updates of {db_remote_kaapana_instance.host}"
             )
+            logging.warning(traceback.format_exc())
             continue
-        raise_kaapana_connection_error(r)
-        incoming_data = r.json()
+        remote_sync.confirm_remote_updates(db_remote_kaapana_instance.id, incoming_data)
+    if periodically is True:
+        # manual checks may run on any worker, only the periodic sync owns the stats
+        remote_sync.write_stats()
 
-        incoming_jobs = incoming_data["incoming_jobs"]
-        incoming_workflows = incoming_data["incoming_workflows"]
-        remote_kaapana_instance = schemas.RemoteKaapanaInstanceUpdateExternal(
-            **incoming_data["update_remote_instance_payload"]
-        )
 
-        create_and_update_remote_kaapana_instance(
-            db=db,
-            remote_kaapana_instance=remote_kaapana_instance,
-            action="external_update",
-        )
+def apply_remote_updates(
+    db: Session,
+    db_client_kaapana: models.KaapanaInstance,
+    db_remote_kaapana_instance: models.KaapanaInstance,
+    incoming_data: dict,
+):
+    """
+    Create the workflows and jobs a remote instance queued for this instance.
 
-        # create workflow for incoming workflow if does NOT exist yet
-        for incoming_workflow in incoming_workflows:
-            # check if incoming_workflow already exists
-            db_incoming_workflow = get_workflow(
-                db, workflow_id=incoming_workflow["workflow_id"]
-            )
-            # db_incoming_workflow = get_workflow(db, workflow_name=incoming_workflow['workflow_name']) # rather query via workflow_name than via workflow_id
-            if db_incoming_workflow is None:
-                # if not: create incoming workflows
-                incoming_workflow["kaapana_instance_id"] = db_remote_kaapana_instance.id
-                # incoming_workflow['external_workflow_id'] = incoming_workflow["id"]
-                # convert string "{node81_gpu, node82_gpu}" to list ['node81_gpu', 'node82_gpu']
-                incoming_workflow["involved_kaapana_instances"] = incoming_workflow[
-                    "involved_kaapana_instances"
-                ][1:-1].split(",")
-                # Todo why is incoming_workflow such a strange object?
-                # print('helllo', incoming_workflow[
-                #     "involved_kaapana_instances"
-                # ])
-                # incoming_workflow["involved_kaapana_instances"] = json.dumps(incoming_workflow[
-                #     "involved_kaapana_instances"
-                # ])
-                workflow = schemas.WorkflowCreate(**incoming_workflow)
-                db_workflow = create_workflow(db, workflow)
-                logging.debug(f"Created incoming remote workflow: {db_workflow}")
-
-        # create incoming jobs
-        fernet = Fernet(db_client_kaapana.encryption_key)
-        db_jobs = []
-        for incoming_job in incoming_jobs:
-            if (
-                "conf_data" in incoming_job
-                and "data_form" in incoming_job["conf_data"]
-                and "identifiers" in incoming_job["conf_data"]["data_form"]
-            ):
-                incoming_job["conf_data"]["data_form"]["identifiers"] = [
-                    fernet.decrypt(identifier.encode()).decode()
-                    for identifier in incoming_job["conf_data"]["data_form"][
-                        "identifiers"
-                    ]
-                ]
+    Workflows and jobs are committed one by one, so a failing apply leaves the ones before applied.
+    The delta-sync timestamp of the remote instance is only advanced after a complete apply,
+    so the answer is sent again with the next sync and applied on top: existing workflows are kept
+    and jobs that were picked up before are acknowledged to the owner again.
+    """
+    incoming_jobs = incoming_data["incoming_jobs"]
+    incoming_workflows = incoming_data["incoming_workflows"]
+    remote_kaapana_instance = schemas.RemoteKaapanaInstanceUpdateExternal(
+        **incoming_data["update_remote_instance_payload"]
+    )
 
-            incoming_job["kaapana_instance_id"] = db_client_kaapana.id
-            incoming_job["owner_kaapana_instance_name"] = (
-                db_remote_kaapana_instance.instance_name
-            )
-            incoming_job["external_job_id"] = incoming_job["id"]
-            incoming_job["status"] = "pending"
-            job = schemas.JobCreate(**incoming_job)
-            job.automatic_execution = (
-                db_incoming_workflow.automatic_execution
-                if db_incoming_workflow is not None
-                else db_workflow.automatic_execution
-            )
-            db_job = create_job(db, job)
-            db_jobs.append(db_job)
+    create_and_update_remote_kaapana_instance(
+        db=db,
+        remote_kaapana_instance=remote_kaapana_instance,
+        action="external_update",
+    )
 
-        # update incoming workflows
-        for incoming_workflow in incoming_workflows:
-            workflow_update = schemas.WorkflowUpdate(
-                **{
-                    "workflow_id": incoming_workflow["workflow_id"],
-                    # incoming_workflow["workflow_name"] instead of db_incoming_workflow.workflow_name
-                    "workflow_name": incoming_workflow["workflow_name"],
-                    # db_jobs instead of incoming_jobs
-                    "workflow_jobs": db_jobs,
-                }
+    # create workflow for incoming workflow if does NOT exist yet
+    for incoming_workflow in incoming_workflows:
+        # check if incoming_workflow already exists
+        db_incoming_workflow = get_workflow(
+            db, workflow_id=incoming_workflow["workflow_id"]
+        )
+        # db_incoming_workflow = get_workflow(db, workflow_name=incoming_workflow['workflow_name']) # rather query via workflow_name than via workflow_id
+        if db_incoming_workflow is None:
+            # if not: create incoming workflows
+            incoming_workflow["kaapana_instance_id"] = db_remote_kaapana_instance.id
+            # incoming_workflow['external_workflow_id'] = incoming_workflow["id"]
+            # convert string "{node81_gpu, node82_gpu}" to list ['node81_gpu', 'node82_gpu']
+            incoming_workflow["involved_kaapana_instances"] = incoming_workflow[
+                "involved_kaapana_instances"
+            ][1:-1].split(",")
+            # Todo why is incoming_workflow such a strange object?
+            # print('helllo', incoming_workflow[
+            #     "involved_kaapana_instances"
+            # ])
+            # incoming_workflow["involved_kaapana_instances"] = json.dumps(incoming_workflow[
+            #     "involved_kaapana_instances"
+            # ])
+            workflow = schemas.WorkflowCreate(**incoming_workflow)
+            db_workflow = create_workflow(db, workflow)
+            logging.debug(f"Created incoming remote workflow: {db_workflow}")
+
+    # create incoming jobs, their identifiers were already decrypted by remote_sync
+    db_jobs = []
+    for incoming_job in incoming_jobs:
+        db_job = (
+            db.query(models.Job)
+            .filter_by(
+                external_job_id=incoming_job["id"],
+                owner_kaapana_instance_name=db_remote_kaapana_instance.instance_name,
             )
-            db_workflow = put_workflow_jobs(db, workflow_update)
-            logging.debug(f"Updated remote workflow: {db_workflow}")
+            .first()
+        )
+        if db_job is not None:
+            # still queued on the owner, e.g. the acknowledgement of the pickup failed
+            update_external_job(db, db_job)
+            db_jobs.append(db_job)
+            continue
+        incoming_job["kaapana_instance_id"] = db_client_kaapana.id
+        incoming_job["owner_kaapana_instance_name"] = (
+            db_remote_kaapana_instance.instance_name
+        )
+        incoming_job["external_job_id"] = incoming_job["id"]
+        incoming_job["status"] = "pending"
+        job = schemas.JobCreate(**incoming_job)
+        job.automatic_execution = (
+            db_incoming_workflow.automatic_execution
+            if db_incoming_workflow is not None
+            else db_workflow.automatic_execution
+        )
+        db_job = create_job(db, job)
+        db_jobs.append(db_job)
 
-    return  # schemas.RemoteKaapanaInstanceUpdateExternal(**udpate_instance_payload)
+    # update incoming workflows
+    for incoming_workflow in incoming_workflows:
+        workflow_update = schemas.WorkflowUpdate(
+            **{
+                "workflow_id": incoming_workflow["workflow_id"],
+                # incoming_workflow["workflow_name"] instead of db_incoming_workflow.workflow_name
+                "workflow_name": incoming_workflow["workflow_name"],
+                # db_jobs instead of incoming_jobs
+                "workflow_jobs": db_jobs,
+            }
+        )
+        db_workflow = put_workflow_jobs(db, workflow_update)
+        logging.debug(f"Updated remote workflow: {db_workflow}")
 
 
 def sync_states_from_airflow(db: Session, status: str = None, periodically=False):
@@ -890,17 +1248,16 @@ def sync_states_from_airflow(db: Session, status: str = None, periodically=False
     # get list from db with all db_jobs in status=status
     db_jobs_in_state = get_jobs(db, status=status)
 
+    db_run_ids = {db_job.run_id for db_job in db_jobs_in_state}
+    airflow_run_ids = {job["run_id"] for job in airflow_jobs_in_state}
+
     # find elements which are in current airflow_jobs_runids but not in db_jobs_runids from previous round
     diff_airflow_to_db = [
-        job
-        for job in airflow_jobs_in_state
-        if job["run_id"] not in [db_job.run_id for db_job in db_jobs_in_state]
+        job for job in airflow_jobs_in_state if job["run_id"] not in db_run_ids
     ]
     # find elements which are in db_jobs_runids from previous round but not in current airflow_jobs_runids
     diff_db_to_airflow = [
-        db_job
-        for db_job in db_jobs_in_state
-        if db_job.run_id not in [job["run_id"] for job in airflow_jobs_in_state]
+        db_job for db_job in db_jobs_in_state if db_job.run_id not in airflow_run_ids
     ]
 
     if len(diff_airflow_to_db) > 0:
@@ -932,6 +1289,18 @@ def sync_states_from_airflow(db: Session, status: str = None, periodically=False
                     "Remote db_job --> created to be executed on remote instance!"
                 )
                 continue
+            if (
+                diff_db_job.status == "queued"
+                and diff_db_job.time_updated is not None
+                and diff_db_job.time_updated
+                > get_utc_timestamp()
+                - datetime.timedelta(seconds=dispatcher.AIRFLOW_DISPATCH_CLAIM_TIMEOUT)
+            ):
+                # run_id is claimed by the job dispatcher, the dag-run might not be triggered yet
+                continue
+            if release_stale_claim(db, diff_db_job):
+                # submitted again by resubmit_queued_jobs() instead of being set to deleted
+                continue
             # update db_job w/ updated state
             job_update = schemas.JobUpdate(
                 **{
@@ -950,13 +1319,46 @@ def sync_states_from_airflow(db: Session, status: str = None, periodically=False
         logging.error("Error while syncing kaapana-backend with Airflow")
 
     # check operator details for jobs in status="running"
-    if status == "running":
-        for airflow_job_in_state in airflow_jobs_in_state:
-            # get corresponding db_job object from db
-            db_job = get_job(db, run_id=airflow_job_in_state["run_id"])
+    if status == "running" and len(airflow_jobs_in_state) > 0:
+        sync_dagrun_states_from_airflow(
+            db, [(job["dag_id"], job["run_id"]) for job in airflow_jobs_in_state]
+        )
+
+
+def sync_dagrun_states_from_airflow(db: Session, dag_runs: List[tuple]):
+    """
+    Fetch the dag-run and task-instance states of all dag_runs with one request and apply them in one transaction.
+    """
+    timestamp = time.time()
+    updates = []
+    for dag_run in get_dagrun_states_airflow(dag_runs):
+        updates.append(
+            schemas.AirflowStateUpdate(
+                dag_id=dag_run["dag_id"],
+                run_id=dag_run["run_id"],
+                state=dag_run["state"],
+                timestamp=timestamp,
+            )
+        )
+        for task_id, task_state in dag_run["tasks"].items():
+            updates.append(
+                schemas.AirflowStateUpdate(
+                    dag_id=dag_run["dag_id"],
+                    run_id=dag_run["run_id"],
+                    task_id=task_id,
+                    timestamp=timestamp,
+                    **task_state,
+                )
+            )
+    return apply_airflow_state_updates(db, updates)
+
 
-            # update running job's operator states
-            update_running_jobs_operator(db, db_job)
+def normalize_task_state(task_state: dict) -> dict:
+    # None values are stored as empty strings
+    return {
+        key: "" if value is None or value == "None" else value
+        for key, value in task_state.items()
+    }
 
 
 def update_running_jobs_operator(db: Session, db_job: models.Job):
@@ -965,32 +1367,93 @@ def update_running_jobs_operator(db: Session, db_job: models.Job):
         db_job.dag_id, db_job.run_id
     )
     if airflow_dagrun_operator_details.ok:
-        # extract operator state details from airflow response
-        airflow_dagrun_operator_details_text = json.loads(
-            airflow_dagrun_operator_details.text
-        )
+        task_states = {
+            task_id: normalize_task_state(task_state)
+            for task_id, task_state in json.loads(
+                airflow_dagrun_operator_details.text
+            ).items()
+        }
+        # only write the job if an operator changed its state
+        if task_states == db_job.task_states:
+            return
+        db_job.task_states = task_states
+        db_job.time_updated = get_utc_timestamp()
+        db.commit()
+        update_external_job(db, db_job)
 
-        # convert None values in dict to empty strings
-        def replace_none_with_empty(d):
-            for key, value in d.items():
-                if isinstance(value, dict):
-                    replace_none_with_empty(value)
-                elif value is None or value == "None":
-                    d[key] = ""
-            return d
 
-        airflow_dagrun_operator_details_text = replace_none_with_empty(
-            airflow_dagrun_operator_details_text
+def apply_airflow_state_updates(db: Session, updates: List[schemas.AirflowStateUpdate]):
+    """
+    Apply a batch of state transitions pushed by the Airflow listener in one transaction.
+
+    Dag-run transitions set the job status, task-instance transitions update the task states of the job.
+    Jobs are only written if a transition changes them.
+    Transitions of unknown dag-runs create service jobs, as sync_states_from_airflow() does.
+    Dag-runs of jobs are never taken for service dag-runs, their job might not be committed yet.
+    """
+    updates = sorted(updates, key=lambda update: update.timestamp)
+    db_jobs = {
+        db_job.run_id: db_job
+        for db_job in db.query(models.Job).filter(
+            models.Job.run_id.in_({update.run_id for update in updates})
         )
+    }
+    utc_timestamp = get_utc_timestamp()
+    changed_jobs = {}
+    unknown_dag_runs = {}
+
+    for update in updates:
+        db_job = db_jobs.get(update.run_id)
+        if db_job is None:
+            # transitions of jobs not committed yet are reconciled by the periodic sync
+            if update.task_id is None and not update.client_job:
+                unknown_dag_runs[update.run_id] = update
+            continue
 
-        # update job object with operator's state as description
-        job_update = schemas.JobUpdate(
-            **{
-                "job_id": db_job.id,
-                "description": f"{airflow_dagrun_operator_details_text}",
+        if update.task_id is None:
+            status = "finished" if update.state == "success" else update.state
+            if db_job.status == status:
+                continue
+            db_job.status = status
+        else:
+            task_state = normalize_task_state(
+                {
+                    "state": update.state,
+                    "execution_date": update.execution_date,
+                    "duration": update.duration,
+                    "start_date": update.start_date,
+                }
+            )
+            if (db_job.task_states or {}).get(update.task_id) == task_state:
+                continue
+            db_job.task_states = {
+                **(db_job.task_states or {}),
+                update.task_id: task_state,
             }
+        db_job.time_updated = utc_timestamp
+        changed_jobs[db_job.id] = db_job
+
+    db.commit()
+    logging.debug(
+        f"Applied {len(updates)} Airflow state updates to {len(changed_jobs)} jobs"
+    )
+
+    for db_job in changed_jobs.values():
+        try:
+            update_external_job(db, db_job)
+        except Exception:
+            logging.warning(f"Could not update external job of job {db_job.id}")
+            logging.warning(traceback.format_exc())
+
+    for update in unknown_dag_runs.values():
+        create_and_update_service_workflows_and_jobs(
+            db,
+            diff_job_dagid=update.dag_id,
+            diff_job_runid=update.run_id,
+            status="finished" if update.state == "success" else update.state,
         )
-        update_job(db, job_update, remote=False)
+
+    return {"updated_jobs": len(changed_jobs), "service_jobs": len(unknown_dag_runs)}
 
 
 global_service_jobs = {}
@@ -1174,17 +1637,59 @@ def sync_n_clean_qsr_jobs_with_airflow(db: Session, periodically=False):
         update_job(db, job_update, remote=False)
 
 
-def create_or_get_identifier(db: Session, identifier: string) -> models.Identifier:
-    try:
-        return db.query(models.Identifier).filter_by(id=identifier).one()
-    except NoResultFound:
-        try:
-            with db.begin_nested():
-                instance = models.Identifier(id=identifier)
-                db.add(instance)
-                return instance
-        except IntegrityError:
-            return db.query(models.Identifier).filter_by(id=identifier).one()
+def _chunks(items: list, size: int = IDENTIFIER_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def bulk_create_identifiers(db: Session, identifiers: List[str]):
+    """
+    Insert all identifiers that do not exist yet with INSERT ... ON CONFLICT DO NOTHING.
+    """
+    for chunk in _chunks(identifiers):
+        db.execute(
+            insert(models.Identifier)
+            .values([{"id": identifier} for identifier in chunk])
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+
+
+def bulk_add_identifiers_to_dataset(
+    db: Session, dataset_name: str, identifiers: List[str]
+):
+    """
+    Create the identifiers and link them to the dataset, skipping existing links.
+    """
+    bulk_create_identifiers(db, identifiers)
+    for chunk in _chunks(identifiers):
+        db.execute(
+            insert(models.identifiers2dataset)
+            .values(
+                [
+                    {"identifier": identifier, "dataset": dataset_name}
+                    for identifier in chunk
+                ]
+            )
+            .on_conflict_do_nothing()
+        )
+
+
+def bulk_remove_identifiers_from_dataset(
+    db: Session, dataset_name: str, identifiers: Optional[List[str]] = None
+):
+    """
+    Unlink the identifiers from the dataset or, if identifiers is None, unlink all of them.
+    """
+    table = models.identifiers2dataset
+    if identifiers is None:
+        db.execute(delete(table).where(table.c.dataset == dataset_name))
+        return
+    for chunk in _chunks(identifiers):
+        db.execute(
+            delete(table).where(
+                table.c.dataset == dataset_name, table.c.identifier.in_(chunk)
+            )
+        )
 
 
 def create_dataset(db: Session, dataset: schemas.DatasetCreate):
@@ -1209,18 +1714,19 @@ def create_dataset(db: Session, dataset: schemas.DatasetCreate):
 
     utc_timestamp = get_utc_timestamp()
 
-    db_identifiers = [create_or_get_identifier(db, idx) for idx in dataset.identifiers]
-
     db_dataset = models.Dataset(
         username=dataset.username,
         name=dataset.name,
-        identifiers=db_identifiers,
         time_created=utc_timestamp,
         time_updated=utc_timestamp,
     )
 
     db_kaapana_instance.datasets.append(db_dataset)
     db.add(db_kaapana_instance)
+    db.flush()
+    bulk_add_identifiers_to_dataset(
+        db, dataset.name, list(dict.fromkeys(dataset.identifiers))
+    )
     db.commit()
     logging.debug(f"Successfully created dataset: {dataset.name}")
 
@@ -1289,17 +1795,15 @@ def update_dataset(db: Session, dataset=schemas.DatasetUpdate):
         )
         logging.debug(f"Dataset {dataset.name} created.")
 
-    db_identifiers = [create_or_get_identifier(db, idx) for idx in dataset.identifiers]
+    identifiers = list(dict.fromkeys(dataset.identifiers))
 
     if dataset.action == "ADD":
-        for identifier in db_identifiers:
-            if identifier not in db_dataset.identifiers:
-                db_dataset.identifiers.append(identifier)
+        bulk_add_identifiers_to_dataset(db, dataset.name, identifiers)
     elif dataset.action == "DELETE":
-        for identifier in db_identifiers:
-            db_dataset.identifiers.remove(identifier)
+        bulk_remove_identifiers_from_dataset(db, dataset.name, identifiers)
     elif dataset.action == "UPDATE":
-        db_dataset.identifiers = db_identifiers
+        bulk_remove_identifiers_from_dataset(db, dataset.name)
+        bulk_add_identifiers_to_dataset(db, dataset.name, identifiers)
     else:
         raise ValueError(f"Invalid action {dataset.action}")
 
@@ -1384,6 +1888,7 @@ def queue_generate_jobs_and_add_to_workflow(
     # open separate db session if method is called with db=None, i.e. called in Thread while workflow creation
     if db is None:
         db = SessionLocal()
+    db_workflow = get_workflow(db, workflow_id=db_workflow.workflow_id)
 
     conf_data = json_schema_data.conf_data
     # get variables
@@ -1424,7 +1929,7 @@ def queue_generate_jobs_and_add_to_workflow(
             }
         ),
     )
-    db_jobs = []
+    job_ids = []
     for db_kaapana_instance in db_kaapana_instances:
         identifiers = []
         if "data_form" in conf_data and "dataset_name" in conf_data["data_form"]:
@@ -1447,10 +1952,16 @@ def queue_generate_jobs_and_add_to_workflow(
         # compose queued_jobs according to 'single_execution'
         queued_jobs = []
         if single_execution is True:
+            # jobs only differ in their identifier, all other parts of conf_data are shared
+            # and serialized separately for every job row on insert
             for identifier in conf_data["data_form"]["identifiers"][:dataset_limit]:
-                # Copying due to reference?!
-                single_conf_data = copy.deepcopy(conf_data)
-                single_conf_data["data_form"]["identifiers"] = [identifier]
+                single_conf_data = {
+                    **conf_data,
+                    "data_form": {
+                        **conf_data["data_form"],
+                        "identifiers": [identifier],
+                    },
+                }
                 queued_jobs.append(
                     {
                         "conf_data": single_conf_data,
@@ -1469,28 +1980,17 @@ def queue_generate_jobs_and_add_to_workflow(
                     "username": username,
                 }
             ]
-        for jobs_to_create in queued_jobs:
-            job = schemas.JobCreate(
-                **{
-                    "status": "queued",
-                    "kaapana_instance_id": db_kaapana_instance.id,
-                    "owner_kaapana_instance_name": settings.instance_name,
-                    "automatic_execution": db_workflow.automatic_execution,
-                    **jobs_to_create,
-                }
-            )
-            db_job = create_job(db, job)
-            db_jobs.append(db_job)
+        # jobs are created and added to db_workflow in bulk, Airflow is triggered in the background
+        job_ids.extend(
+            bulk_create_jobs(db, db_kaapana_instance, db_workflow, queued_jobs)
+        )
 
-    # update workflow w/ created db_jobs
-    workflow = schemas.WorkflowUpdate(
-        **{
-            "workflow_id": db_workflow.workflow_id,
-            "workflow_name": db_workflow.workflow_name,
-            "workflow_jobs": db_jobs,
-        }
+    db_jobs = (
+        db.query(models.Job)
+        .filter(models.Job.id.in_(job_ids))
+        .order_by(models.Job.id)
+        .all()
     )
-    db_workflow = put_workflow_jobs(db, workflow)
 
     # would be better to solve this with a lamba function instead of putting it directly here
     # db.close()
@@ -1523,10 +2023,15 @@ def get_workflows(
     limit: Optional[int] = -1,  # v-data-table return -1 for option `all
     offset: int = 0,
     search: Optional[str] = None,
+    dag_id: Optional[str] = None,
+    cursor: Optional[str] = None,
 ):
     if limit == -1:
         limit = None
-    base_query = db.query(models.Workflow)
+    base_query = db.query(models.Workflow).options(
+        joinedload(models.Workflow.kaapana_instance),
+        selectinload(models.Workflow.workflow_jobs),
+    )
 
     if instance_name is not None:
         query = (
@@ -1548,17 +2053,31 @@ def get_workflows(
         )
     if search is not None:
         query = query.filter(models.Workflow.workflow_name.ilike(f"%{search}%"))
+    if dag_id is not None:
+        query = query.filter(models.Workflow.dag_id == dag_id)
+
+    total_count_subquery = query.statement.with_only_columns([func.count()]).order_by(
+        None
+    )
+    total_count = db.execute(total_count_subquery).scalar()
+
+    if cursor is not None:
+        # keyset pagination replaces the offset
+        time_updated, workflow_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(models.Workflow.time_updated, models.Workflow.workflow_id)
+            < tuple_(time_updated, workflow_id)
+        )
+        offset = 0
 
     workflows = (
-        query.order_by(desc(models.Workflow.time_updated))
+        query.order_by(
+            desc(models.Workflow.time_updated), desc(models.Workflow.workflow_id)
+        )
         .limit(limit)
         .offset(offset)
         .all()
     )
-    total_count_subquery = query.statement.with_only_columns([func.count()]).order_by(
-        None
-    )
-    total_count = db.execute(total_count_subquery).scalar()
     return workflows, total_count
 
 
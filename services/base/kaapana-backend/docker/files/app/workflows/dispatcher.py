@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+import httpx
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Creates the dag-runs of a batch of jobs in one Airflow transaction
+AIRFLOW_TRIGGER_URL = f"http://airflow-webserver-service.{settings.services_namespace}.svc:8080/flow/kaapana/api/dagruns/trigger"
+# Batches triggered at the same time
+AIRFLOW_DISPATCH_CONCURRENCY = int(os.getenv("AIRFLOW_DISPATCH_CONCURRENCY", 2))
+# Dag-runs triggered per second, protects the Airflow scheduler from bursts
+AIRFLOW_DISPATCH_RATE = float(os.getenv("AIRFLOW_DISPATCH_RATE", 50.0))
+# Jobs prepared with one query and triggered with one request
+AIRFLOW_DISPATCH_BATCH_SIZE = 100
+AIRFLOW_DISPATCH_TIMEOUT = 60.0
+AIRFLOW_DISPATCH_RETRIES = 3
+# Seconds a claimed job may stay queued before its dag-run has to exist in Airflow
+AIRFLOW_DISPATCH_CLAIM_TIMEOUT = 300
+
+_run_id_lock = threading.Lock()
+_run_id_time_last = None
+# Distinguishes the run_ids of the backend workers, which claim jobs independently
+_run_id_token = uuid.uuid4().hex[:8]
+
+
+def _reset_run_id_token():
+    global _run_id_token
+    _run_id_token = uuid.uuid4().hex[:8]
+
+
+# the workers are forked from the gunicorn master
+os.register_at_fork(after_in_child=_reset_run_id_token)
+
+
+def generate_run_id(dag_id: str) -> str:
+    """
+    Returns a run_id unique across the backend workers, which ends with a timestamp like kaapana_utils.generate_run_id().
+
+    The timestamp is strictly increasing within a process and the token differs between processes.
+    """
+    global _run_id_time_last
+    with _run_id_lock:
+        now = datetime.now()
+        if _run_id_time_last is not None and now <= _run_id_time_last:
+            now = _run_id_time_last + timedelta(microseconds=1)
+        _run_id_time_last = now
+    return "{}-{}-{}".format(dag_id, _run_id_token, now.strftime("%y%m%d%H%M%S%f"))
+
+
+class RateLimiter:
+    """
+    Token bucket allowing rate acquisitions per second with bursts of up to burst.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.time_last_refill = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 1):
+        tokens = min(tokens, self.burst)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.time_last_refill) * self.rate
+                )
+                self.time_last_refill = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class AirflowJobDispatcher:
+    """
+    Triggers the dag-runs of queued jobs in the background of a backend worker.
+
+    Job ids are submitted from any thread and processed in batches by an event loop in a daemon thread.
+    The dag-runs of a batch are created with one request to /api/dagruns/trigger of the kaapana Airflow plugin.
+    prepare(job_ids) claims the jobs and returns a (job_id, dag_id, run_id, conf) tuple for each job to be triggered,
+    complete(results) stores {job_id: {"dag_id", "run_id"} or {"error"}} of triggered jobs.
+    Both access the database and run in the default thread pool of the event loop.
+    """
+
+    def __init__(
+        self,
+        prepare: Callable[[List[int]], List[tuple]],
+        complete: Callable[[Dict[int, dict]], None],
+    ):
+        self.prepare = prepare
+        self.complete = complete
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, job_ids: List[int]):
+        for job_id in job_ids:
+            self.queue.put(job_id)
+        with self.lock:
+            # a dispatcher which stopped on an error is started again, the submitted job ids stay queued
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run,
+                    name="airflow-job-dispatcher",
+                    daemon=True,
+                )
+                self.thread.start()
+
+    def _next_batch(self) -> List[int]:
+        # waits with a timeout, so that the executor thread can be joined on shutdown
+        try:
+            job_ids = [self.queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        while len(job_ids) < AIRFLOW_DISPATCH_BATCH_SIZE:
+            try:
+                job_ids.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return job_ids
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except Exception:
+            logger.exception(
+                "Job dispatcher stopped, it is started again with the next submit"
+            )
+
+    async def _serve(self):
+        rate_limiter = RateLimiter(AIRFLOW_DISPATCH_RATE, AIRFLOW_DISPATCH_BATCH_SIZE)
+        semaphore = asyncio.Semaphore(AIRFLOW_DISPATCH_CONCURRENCY)
+        tasks = set()
+        async with httpx.AsyncClient(timeout=AIRFLOW_DISPATCH_TIMEOUT) as client:
+            while True:
+                job_ids = await asyncio.to_thread(self._next_batch)
+                if len(job_ids) == 0:
+                    continue
+                await semaphore.acquire()
+                task = asyncio.create_task(
+                    self._dispatch(client, rate_limiter, semaphore, job_ids)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+    async def _dispatch(self, client, rate_limiter, semaphore, job_ids):
+        try:
+            jobs = await asyncio.to_thread(self.prepare, job_ids)
+            if len(jobs) == 0:
+                return
+            try:
+                results = await self._trigger(client, rate_limiter, jobs)
+            except Exception as e:
+                logger.warning(f"Could not trigger {len(jobs)} jobs: {e}")
+                results = {
+                    job_id: {"error": f"Could not trigger {dag_id}: {e}"}
+                    for job_id, dag_id, _, _ in jobs
+                }
+            await asyncio.to_thread(self.complete, results)
+        except Exception:
+            logger.exception(f"Could not dispatch jobs {job_ids}")
+        finally:
+            semaphore.release()
+
+    async def _trigger(self, client, rate_limiter, jobs) -> Dict[int, dict]:
+        await rate_limiter.acquire(len(jobs))
+        payload = {
+            "dag_runs": [
+                {"dag_id": dag_id, "run_id": run_id, "conf": conf}
+                for _, dag_id, run_id, conf in jobs
+            ]
+        }
+        for attempt in range(AIRFLOW_DISPATCH_RETRIES):
+            if attempt > 0:
+                await asyncio.sleep(2 ** (attempt - 1))
+            try:
+                r = await client.post(AIRFLOW_TRIGGER_URL, json=payload)
+                # the batch is rolled back on server errors, so it can be sent again
+                if r.status_code < 500:
+                    break
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # other transport errors are not retried, the dag-runs might have been created
+                if attempt == AIRFLOW_DISPATCH_RETRIES - 1:
+                    raise
+        r.raise_for_status()
+        return {
+            job_id: dag_run
+            for (job_id, _, _, _), dag_run in zip(jobs, r.json()["dag_runs"])
+        }
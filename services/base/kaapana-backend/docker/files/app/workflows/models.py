@@ -113,6 +113,11 @@ class Workflow(Base):
         "Job", back_populates="workflow"
     )  # , cascade="all, delete")
 
+    __table_args__ = (
+        # keyset pagination of the workflow list, see crud.get_workflows()
+        Index("ix_workflow_time_updated_workflow_id", "time_updated", "workflow_id"),
+    )
+
 
 class Job(Base):
     __tablename__ = "job"
@@ -123,7 +128,9 @@ class Job(Base):
     conf_data = Column(mutable_json_type(dbtype=JSONB, nested=True))
     status = Column(String(64), index=True)
     run_id = Column(String(64), index=True)
-    description = Column(String(1024000), index=True)
+    description = Column(String(1024000))
+    # {task_id: {"state", "execution_date", "duration", "start_date"}} of the dag-run
+    task_states = Column(mutable_json_type(dbtype=JSONB, nested=True), default={})
     username = Column(String(64))
     time_created = Column(DateTime(timezone=True))
     time_updated = Column(DateTime(timezone=True))
@@ -146,4 +153,11 @@ class Job(Base):
             unique=True,
             postgresql_where=(external_job_id.isnot(None)),
         ),  # The condition
+        # keyset pagination of the job list, see crud.get_jobs_page()
+        Index("ix_job_time_updated_id", "time_updated", "id"),
+        Index("ix_job_status_time_updated_id", "status", "time_updated", "id"),
+        Index("ix_job_dag_id_time_updated_id", "dag_id", "time_updated", "id"),
+        Index(
+            "ix_job_workflow_id_time_updated_id", "workflow_id", "time_updated", "id"
+        ),
     )
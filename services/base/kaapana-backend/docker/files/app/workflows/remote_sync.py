@@ -0,0 +1,234 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List
+
+import httpx
+from cryptography.fernet import Fernet
+
+logger = logging.getLogger(__name__)
+
+# Seconds a single remote instance may take to answer a sync request
+REMOTE_SYNC_TIMEOUT = float(os.getenv("REMOTE_SYNC_TIMEOUT", 5.0))
+# Unreachable remote instances are retried after 5s, 10s, 20s, ... up to 5min
+BACKOFF_BASE_SECONDS = 5.0
+BACKOFF_MAX_SECONDS = 300.0
+# Delta syncs are complemented by a full sync every 10min
+FULL_SYNC_INTERVAL_SECONDS = 600.0
+# Shared by all workers of the backend, only one of them runs the sync
+REMOTE_SYNC_STATS_FILE = os.getenv(
+    "REMOTE_SYNC_STATS_FILE", "/tmp/kaapana_remote_sync_stats.json"
+)
+
+
+class RemoteSite:
+    """
+    Sync state of a remote Kaapana instance: delta-sync timestamp, backoff and latency metrics.
+    """
+
+    def __init__(self, instance_name: str):
+        self.instance_name = instance_name
+        self.since = None
+        self.time_last_full_sync = 0.0
+        self.full_sync_requested = False
+        self.failures = 0
+        self.time_next_attempt = 0.0
+        self.latency_seconds = None
+        self.time_last_success = None
+        self.last_error = None
+
+    def is_due(self, now: float) -> bool:
+        return now >= self.time_next_attempt
+
+    def sync_params(self, now: float) -> dict:
+        self.full_sync_requested = (
+            self.since is None
+            or now - self.time_last_full_sync > FULL_SYNC_INTERVAL_SECONDS
+        )
+        return {} if self.full_sync_requested else {"since": self.since}
+
+    def record_success(self, latency_seconds: float, now: float):
+        self.failures = 0
+        self.time_next_attempt = 0.0
+        self.latency_seconds = latency_seconds
+        self.time_last_success = now
+        self.last_error = None
+
+    def record_failure(self, error: str, now: float):
+        self.failures += 1
+        delay = min(
+            BACKOFF_BASE_SECONDS * 2 ** (self.failures - 1), BACKOFF_MAX_SECONDS
+        )
+        # jitter keeps many backends from retrying a recovered site at the same time
+        self.time_next_attempt = now + delay * random.uniform(0.5, 1.0)
+        self.last_error = error
+
+    def confirm(self, sync_timestamp: float, now: float):
+        """
+        Advance the delta-sync timestamp once the answer of the remote instance was applied.
+        """
+        if sync_timestamp is None:
+            # remote instance does not support delta syncs
+            return
+        if self.full_sync_requested:
+            self.time_last_full_sync = now
+        self.since = sync_timestamp
+
+    def stats(self) -> dict:
+        return {
+            "instance_name": self.instance_name,
+            "latency_seconds": self.latency_seconds,
+            "time_last_success": self.time_last_success,
+            "failures": self.failures,
+            "time_next_attempt": self.time_next_attempt or None,
+            "last_error": self.last_error,
+            "since": self.since,
+        }
+
+
+sites: Dict[int, RemoteSite] = {}
+# The periodic sync and manual checks of /check-for-remote-updates may run at the same time
+sites_lock = threading.Lock()
+
+
+def decrypt_identifiers(fernet: Fernet, incoming_jobs: List[dict]):
+    for incoming_job in incoming_jobs:
+        if (
+            "conf_data" in incoming_job
+            and "data_form" in incoming_job["conf_data"]
+            and "identifiers" in incoming_job["conf_data"]["data_form"]
+        ):
+            incoming_job["conf_data"]["data_form"]["identifiers"] = [
+                fernet.decrypt(identifier.encode()).decode()
+                for identifier in incoming_job["conf_data"]["data_form"]["identifiers"]
+            ]
+
+
+async def _sync_site(
+    site_id: int,
+    remote_backend_url: str,
+    ssl_check: bool,
+    token: str,
+    params: dict,
+    payload: dict,
+    fernet: Fernet,
+):
+    with sites_lock:
+        site = sites.get(site_id)
+        # a site removed by a concurrent sync gets a full sync
+        site_params = {} if site is None else site.sync_params(time.time())
+    start = time.perf_counter()
+    async with httpx.AsyncClient(
+        verify=ssl_check, timeout=REMOTE_SYNC_TIMEOUT
+    ) as client:
+        r = await client.put(
+            f"{remote_backend_url}/sync-client-remote",
+            params={**params, **site_params},
+            json=payload,
+            headers={"FederatedAuthorization": f"{token}"},
+        )
+    r.raise_for_status()
+    incoming_data = r.json()
+    latency_seconds = time.perf_counter() - start
+    # decrypting runs besides the requests to the other sites
+    await asyncio.to_thread(decrypt_identifiers, fernet, incoming_data["incoming_jobs"])
+    return incoming_data, latency_seconds
+
+
+async def _sync_sites(db_remote_kaapana_instances, params, payload, fernet):
+    now = time.time()
+    due_instances = []
+    with sites_lock:
+        for db_remote_kaapana_instance in db_remote_kaapana_instances:
+            site = sites.setdefault(
+                db_remote_kaapana_instance.id,
+                RemoteSite(db_remote_kaapana_instance.instance_name),
+            )
+            if site.is_due(now):
+                due_instances.append(db_remote_kaapana_instance)
+
+    results = await asyncio.gather(
+        *[
+            _sync_site(
+                db_remote_kaapana_instance.id,
+                f"{db_remote_kaapana_instance.protocol}://{db_remote_kaapana_instance.host}:{db_remote_kaapana_instance.port}/kaapana-backend/remote",
+                db_remote_kaapana_instance.ssl_check,
+                db_remote_kaapana_instance.token,
+                params,
+                payload,
+                fernet,
+            )
+            for db_remote_kaapana_instance in due_instances
+        ],
+        return_exceptions=True,
+    )
+
+    incoming = {}
+    now = time.time()
+    for db_remote_kaapana_instance, result in zip(due_instances, results):
+        with sites_lock:
+            # removed by a concurrent sync in the meantime
+            site = sites.setdefault(
+                db_remote_kaapana_instance.id,
+                RemoteSite(db_remote_kaapana_instance.instance_name),
+            )
+            if isinstance(result, Exception):
+                site.record_failure(f"{type(result).__name__}: {result}", now)
+                time_next_attempt, last_error = site.time_next_attempt, site.last_error
+            else:
+                site.record_success(result[1], now)
+        if isinstance(result, Exception):
+            logger.warning(
+                f"Could not sync with {db_remote_kaapana_instance.host}, "
+                f"next attempt in {time_next_attempt - now:.0f}s: {last_error}"
+            )
+            continue
+        incoming[db_remote_kaapana_instance.id] = result[0]
+    return incoming
+
+
+def fetch_remote_updates(
+    db_remote_kaapana_instances, params: dict, payload: dict, fernet: Fernet
+) -> Dict[int, dict]:
+    """
+    Request /sync-client-remote from all due remote instances concurrently.
+
+    :return: Decrypted answers of all instances that responded, by kaapana instance id.
+    """
+    with sites_lock:
+        for site_id in set(sites) - {
+            db_remote_kaapana_instance.id
+            for db_remote_kaapana_instance in db_remote_kaapana_instances
+        }:
+            del sites[site_id]
+    return asyncio.run(
+        _sync_sites(db_remote_kaapana_instances, params, payload, fernet)
+    )
+
+
+def confirm_remote_updates(site_id: int, incoming_data: dict):
+    with sites_lock:
+        site = sites.get(site_id)
+        if site is not None:
+            site.confirm(incoming_data.get("sync_timestamp"), time.time())
+
+
+def write_stats():
+    with sites_lock:
+        stats = [site.stats() for site in sites.values()]
+    tmp_file = f"{REMOTE_SYNC_STATS_FILE}.{os.getpid()}"
+    with open(tmp_file, "w") as f:
+        json.dump(stats, f)
+    os.replace(tmp_file, REMOTE_SYNC_STATS_FILE)
+
+
+def read_stats() -> List[dict]:
+    try:
+        with open(REMOTE_SYNC_STATS_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
@@ -13,9 +13,9 @@ from typing import List, Tuple, Union
 
 import jsonschema
 import jsonschema.exceptions
-from app.datasets.utils import execute_opensearch_query
+from app.datasets.utils import iter_opensearch_query
 from app.dependencies import get_db, get_opensearch
-from app.workflows import crud, schemas
+from app.workflows import crud, remote_sync, schemas
 from app.workflows.utils import get_dag_list
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse, Response
@@ -270,15 +270,33 @@ def get_job(job_id: int = None, run_id: str = None, db: Session = Depends(get_db
 @router.get("/jobs", response_model=List[schemas.JobWithWorkflowWithKaapanaInstance])
 # also okay: JobWithWorkflow; JobWithKaapanaInstance
 def get_jobs(
+    response: Response,
     instance_name: str = None,
     workflow_name: str = None,
     status: str = None,
+    dag_id: str = None,
     limit: int = None,
+    cursor: str = None,
+    include_details: bool = False,
     db: Session = Depends(get_db),
 ):
-    jobs = crud.get_jobs(
-        db, instance_name, workflow_name, status, remote=False, limit=limit
+    # conf_data, description and task_states are only returned with include_details=true
+    # Pass the X-Next-Cursor header of a response as cursor to get the next page
+    jobs = crud.get_jobs_page(
+        db,
+        instance_name=instance_name,
+        workflow_name=workflow_name,
+        status=status,
+        dag_id=dag_id,
+        remote=False,
+        limit=limit,
+        cursor=cursor,
+        include_details=include_details,
     )
+    if limit is not None and len(jobs) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(
+            jobs[-1].time_updated, jobs[-1].id
+        )
     for job in jobs:
         if job.kaapana_instance:
             job.kaapana_instance = schemas.KaapanaInstance.clean_full_return(
@@ -299,6 +317,14 @@ def put_job(job: schemas.JobUpdate, db: Session = Depends(get_db)):
         return crud.update_job(db, job, remote=False)
 
 
+@router.post("/airflow-states")
+def post_airflow_states(
+    updates: List[schemas.AirflowStateUpdate], db: Session = Depends(get_db)
+):
+    # state transitions pushed by the kaapana Airflow listener
+    return crud.apply_airflow_state_updates(db, updates)
+
+
 @router.delete("/job")
 def delete_job(job_id: int, db: Session = Depends(get_db)):
     return crud.delete_job(db, job_id, remote=False)
@@ -498,6 +524,12 @@ def check_for_remote_updates(db: Session = Depends(get_db)):
     return {f"Federated backend is up and running!"}
 
 
+@router.get("/remote-sync-stats")
+def get_remote_sync_stats():
+    # latency, failures and backoff of the periodic sync per remote instance
+    return remote_sync.read_stats()
+
+
 @router.post("/dataset", response_model=schemas.Dataset)
 def create_dataset(
     request: Request,
@@ -512,7 +544,9 @@ def create_dataset(
             name=query_dict["name"],
             identifiers=[
                 d["_id"]
-                for d in execute_opensearch_query(os_client, query_dict["query"])
+                for d in iter_opensearch_query(
+                    os_client, query_dict["query"], source=False
+                )
             ],
         )
     dataset.username = request.headers["x-forwarded-preferred-username"]
@@ -720,14 +754,18 @@ def get_workflow(
 # also okay: response_model=List[schemas.Workflow] ; List[schemas.WorkflowWithKaapanaInstance]
 def get_workflows(
     request: Request,
+    response: Response,
     instance_name: str = None,
     involved_instance_name: str = None,
     workflow_job_id: int = None,
     limit: int = -1,  # v-data-table return -1 for option `all`
     offset: int = 0,
     search: str = None,
+    dag_id: str = None,
+    cursor: str = None,
     db: Session = Depends(get_db),
 ):
+    # Pass the X-Next-Cursor header of a response as cursor to get the next page, offset is ignored then
     workflows, total_items = crud.get_workflows(
         db,
         instance_name,
@@ -736,7 +774,13 @@ def get_workflows(
         limit=limit,
         offset=offset,
         search=search,
+        dag_id=dag_id,
+        cursor=cursor,
     )
+    if limit > 0 and len(workflows) == limit:
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(
+            workflows[-1].time_updated, workflows[-1].workflow_id
+        )
     for workflow in workflows:
         if workflow.kaapana_instance:
             workflow.kaapana_instance = schemas.KaapanaInstance.clean_full_return(
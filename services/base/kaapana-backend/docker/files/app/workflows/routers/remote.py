@@ -103,6 +103,7 @@ def put_remote_kaapana_instance(
     remote_kaapana_instance: schemas.RemoteKaapanaInstanceUpdateExternal,
     instance_name: str = None,
     status: str = None,
+    since: float = None,
     db: Session = Depends(get_db),
 ):
     return crud.sync_client_remote(
@@ -110,6 +111,7 @@ def put_remote_kaapana_instance(
         remote_kaapana_instance=remote_kaapana_instance,
         instance_name=instance_name,
         status=status,
+        since=since,
     )
 
 
@@ -91,6 +91,7 @@ class JobBase(BaseModel):
     dag_id: Optional[str] = None
     run_id: Optional[str] = None
     description: Optional[str] = None
+    task_states: Optional[dict] = None
     external_job_id: Optional[int] = None  # job_id on another system
     # Remote Kaapana instance that is addressed, not external kaapana_instance_id!
     owner_kaapana_instance_name: Optional[str] = None
@@ -152,6 +153,20 @@ class JobUpdate(JobBase):
     job_id: Optional[int] = None
 
 
+class AirflowStateUpdate(BaseModel):
+    # dag-run transition if task_id is None, task-instance transition otherwise
+    dag_id: str
+    run_id: str
+    state: Optional[str] = None
+    task_id: Optional[str] = None
+    execution_date: Optional[str] = None
+    start_date: Optional[str] = None
+    duration: Optional[str] = None
+    # True if the dag-run was triggered for a job of the backend
+    client_job: bool = False
+    timestamp: float
+
+
 class JobWithKaapanaInstance(Job):
     kaapana_instance: Optional[KaapanaInstance] = None
 
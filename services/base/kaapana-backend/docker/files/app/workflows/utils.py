@@ -296,6 +296,24 @@ def get_dagrun_tasks_airflow(dag_id, dag_run_id):
     return resp
 
 
+def get_dagrun_states_airflow(dag_runs):
+    """
+    Get the states of many dag-runs and their task-instances with one request.
+
+    :param dag_runs: List of (dag_id, run_id) tuples.
+    """
+    with requests.Session() as s:
+        resp = requests_retry_session(session=s).post(
+            f"http://airflow-webserver-service.{settings.services_namespace}.svc:8080/flow/kaapana/api/dagruns/states",
+            timeout=TIMEOUT,
+            json={
+                "dag_runs": [list(dag_run) for dag_run in dag_runs],
+            },
+        )
+    raise_kaapana_connection_error(resp)
+    return json.loads(resp.text)
+
+
 def get_dagrun_details_airflow(dag_id, dag_run_id):
     with requests.Session() as s:
         resp = requests_retry_session(session=s).get(
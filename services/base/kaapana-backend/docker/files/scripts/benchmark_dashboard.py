@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Measure the latency of the gallery dashboard for a cold and for repeated views.
+
+Requests /dataset/dashboard with the given field names, first once with an empty aggregation cache
+(after AGGREGATION_CACHE_TTL or a write to the index) and then repeatedly,
+optionally paging through the histograms with composite aggregations of --page-size buckets.
+
+Runs against a running backend, e.g.:
+    python3 scripts/benchmark_dashboard.py --names Modality Tags "Body Part Examined"
+    python3 scripts/benchmark_dashboard.py --names Modality --page-size 100
+"""
+
+import argparse
+import statistics
+import time
+
+import requests
+
+
+def view(s, url, names, page_size):
+    start = time.perf_counter()
+    config = {"names": names}
+    pages = 0
+    while True:
+        if page_size:
+            config["page_size"] = page_size
+        r = s.post(url, json=config)
+        r.raise_for_status()
+        pages += 1
+        histograms = r.json()["histograms"]
+        after = {
+            name: histogram["after"]
+            for name, histogram in histograms.items()
+            if "after" in histogram
+        }
+        if not page_size or not after:
+            break
+        config["after"] = after
+    return time.perf_counter() - start, pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:5000/dataset/dashboard")
+    parser.add_argument("--names", nargs="+", default=["Modality", "Tags"])
+    parser.add_argument("--page-size", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with requests.Session() as s:
+        cold, pages = view(s, args.url, args.names, args.page_size)
+        latencies = sorted(
+            view(s, args.url, args.names, args.page_size)[0] for _ in range(args.repeat)
+        )
+    print(
+        f"pages={pages} cold={cold * 1000:8.1f}ms "
+        f"repeated p50={statistics.median(latencies) * 1000:8.1f}ms "
+        f"max={latencies[-1] * 1000:8.1f}ms"
+    )
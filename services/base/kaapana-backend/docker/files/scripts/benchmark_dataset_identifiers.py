@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Compare dataset create/update with per-identifier and bulk identifier writes.
+
+Measures wall time of
+- the previous implementation (SELECT + savepoint INSERT per identifier, relationship append)
+- the bulk implementation (chunked INSERT ... ON CONFLICT DO NOTHING, association table writes)
+for creating a dataset, adding the same number of identifiers again and deleting half of them.
+
+Writes to the database in DATABASE_URL and removes everything it created afterwards.
+Runs inside the backend container, e.g.:
+    PYTHONPATH=$PWD python3 scripts/benchmark_dataset_identifiers.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import time
+import uuid
+
+from sqlalchemy.exc import IntegrityError, NoResultFound
+
+from app.database import SessionLocal
+from app.workflows import crud, models, schemas
+
+PREFIX = "benchmark-identifier"
+
+
+def legacy_get_identifier(db, identifier):
+    try:
+        return db.query(models.Identifier).filter_by(id=identifier).one()
+    except NoResultFound:
+        try:
+            with db.begin_nested():
+                instance = models.Identifier(id=identifier)
+                db.add(instance)
+                return instance
+        except IntegrityError:
+            return db.query(models.Identifier).filter_by(id=identifier).one()
+
+
+def legacy_create(db, name, identifiers):
+    db_kaapana_instance = db.query(models.KaapanaInstance).filter_by(remote=False).one()
+    utc_timestamp = crud.get_utc_timestamp()
+    db_dataset = models.Dataset(
+        name=name,
+        identifiers=[legacy_get_identifier(db, idx) for idx in identifiers],
+        time_created=utc_timestamp,
+        time_updated=utc_timestamp,
+    )
+    db_kaapana_instance.datasets.append(db_dataset)
+    db.commit()
+
+
+def legacy_add(db, name, identifiers):
+    db_dataset = crud.get_dataset(db, name)
+    for identifier in [legacy_get_identifier(db, idx) for idx in identifiers]:
+        if identifier not in db_dataset.identifiers:
+            db_dataset.identifiers.append(identifier)
+    db.commit()
+
+
+def legacy_delete(db, name, identifiers):
+    db_dataset = crud.get_dataset(db, name)
+    for identifier in [legacy_get_identifier(db, idx) for idx in identifiers]:
+        db_dataset.identifiers.remove(identifier)
+    db.commit()
+
+
+def bulk_create(db, name, identifiers):
+    crud.create_dataset(db, schemas.DatasetCreate(name=name, identifiers=identifiers))
+
+
+def bulk_add(db, name, identifiers):
+    crud.update_dataset(
+        db, schemas.DatasetUpdate(name=name, action="ADD", identifiers=identifiers)
+    )
+
+
+def bulk_delete(db, name, identifiers):
+    crud.update_dataset(
+        db, schemas.DatasetUpdate(name=name, action="DELETE", identifiers=identifiers)
+    )
+
+
+def cleanup(db, name):
+    crud.bulk_remove_identifiers_from_dataset(db, name)
+    db.query(models.Dataset).filter_by(name=name).delete()
+    db.query(models.Identifier).filter(models.Identifier.id.startswith(PREFIX)).delete(
+        synchronize_session=False
+    )
+    db.commit()
+
+
+def measure(name, size, steps):
+    db = SessionLocal()
+    dataset_name = f"{PREFIX}-{uuid.uuid4().hex[:8]}"
+    identifiers = [f"{PREFIX}.{i}" for i in range(size)]
+    added = [f"{PREFIX}.{i}" for i in range(size // 2, size + size // 2)]
+    durations = []
+    try:
+        for step, ids in zip(steps, (identifiers, added, identifiers[::2])):
+            start = time.perf_counter()
+            step(db, dataset_name, ids)
+            durations.append(time.perf_counter() - start)
+            db.expire_all()
+    finally:
+        cleanup(db, dataset_name)
+        db.close()
+    print(
+        f"{name:7s} n={size:8d} create={durations[0]:8.2f}s "
+        f"add={durations[1]:8.2f}s delete={durations[2]:8.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument(
+        "--legacy-max-size",
+        type=int,
+        default=100000,
+        help="Skip the previous implementation for larger datasets, as it takes hours.",
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        if size <= args.legacy_max_size:
+            measure("legacy", size, (legacy_create, legacy_add, legacy_delete))
+        measure("bulk", size, (bulk_create, bulk_add, bulk_delete))
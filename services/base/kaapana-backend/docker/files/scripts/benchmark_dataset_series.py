@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Compare the structured /dataset/series response modes on synthetic data.
+
+Measures time to first byte and peak Python heap usage of
+- the previous implementation (materialize all hits, group with pandas, one JSON document)
+- the streaming NDJSON implementation (sorted scan, one study per line)
+
+Runs inside the backend container, e.g.:
+    PYTHONPATH=$PWD python3 scripts/benchmark_dataset_series.py --series 200000
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from app.datasets.utils import (
+    PATIENT_ID_TAG,
+    SERIES_UID_TAG,
+    STUDY_UID_TAG,
+    iter_structured_series_ndjson,
+)
+
+
+class SyntheticOpensearch:
+    """
+    Minimal stand-in for the opensearch client serving sorted synthetic series.
+    """
+
+    def __init__(self, series_count, series_per_study, studies_per_patient):
+        self.series_count = series_count
+        self.series_per_study = series_per_study
+        self.studies_per_patient = studies_per_patient
+
+    def _hit(self, i):
+        study = i // self.series_per_study
+        patient = study // self.studies_per_patient
+        series_uid = f"1.2.826.0.1.3680043.8.498.{study:09d}.{i:09d}"
+        study_uid = f"1.2.826.0.1.3680043.8.498.{study:09d}"
+        return {
+            "_id": series_uid,
+            "_source": {
+                PATIENT_ID_TAG: f"patient-{patient}",
+                STUDY_UID_TAG: study_uid,
+                SERIES_UID_TAG: series_uid,
+            },
+            "sort": [study_uid, series_uid, i],
+        }
+
+    def create_pit(self, index, keep_alive):
+        return {"pit_id": "synthetic"}
+
+    def delete_pit(self, body):
+        pass
+
+    def search(self, body, index=None):
+        start = body["search_after"][-1] + 1 if "search_after" in body else 0
+        end = min(start + body["size"], self.series_count)
+        return {"hits": {"hits": [self._hit(i) for i in range(start, end)]}}
+
+
+def legacy_response(os_client):
+    import pandas as pd
+
+    hits = []
+    search_after = None
+    while True:
+        body = {
+            "size": 10000,
+            **({"search_after": search_after} if search_after else {}),
+        }
+        page = os_client.search(body=body)["hits"]["hits"]
+        if not page:
+            break
+        hits.extend(page)
+        search_after = page[-1]["sort"]
+    res_array = [
+        [
+            hit["_source"].get(PATIENT_ID_TAG) or "N/A",
+            hit["_source"][STUDY_UID_TAG],
+            hit["_source"][SERIES_UID_TAG],
+        ]
+        for hit in hits
+    ]
+    df = pd.DataFrame(
+        res_array,
+        columns=["Patient ID", "Study Instance UID", "Series Instance UID"],
+    )
+    yield json.dumps(
+        {
+            k: f.groupby("Study Instance UID")["Series Instance UID"]
+            .apply(list)
+            .to_dict()
+            for k, f in df.groupby("Patient ID")
+        }
+    )
+
+
+def measure(name, chunks):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_byte = None
+    size = 0
+    for chunk in chunks:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:10s} ttfb={first_byte * 1000:9.1f}ms total={total:7.2f}s "
+        f"peak={peak / 1024**2:8.1f}MiB bytes={size}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--series", type=int, default=100000)
+    parser.add_argument("--series-per-study", type=int, default=5)
+    parser.add_argument("--studies-per-patient", type=int, default=2)
+    args = parser.parse_args()
+
+    os_client = SyntheticOpensearch(
+        args.series, args.series_per_study, args.studies_per_patient
+    )
+    query = {"match_all": {}}
+    measure("legacy", legacy_response(os_client))
+    measure("ndjson", iter_structured_series_ndjson(os_client, query))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Compare job creation of single_execution workflows with per-job and bulk writes.
+
+Measures wall time of
+- the previous implementation (deep copy of conf_data and crud.create_job() per identifier, put_workflow_jobs())
+- the bulk implementation (crud.bulk_create_jobs(), chunked INSERT ... RETURNING)
+for creating one job per identifier of a synthetic workflow.
+Jobs are created without automatic execution, so Airflow is not triggered.
+
+Writes to the database in DATABASE_URL and removes everything it created afterwards.
+Runs inside the backend container, e.g.:
+    PYTHONPATH=$PWD python3 scripts/benchmark_job_creation.py --sizes 1000 20000
+"""
+
+import argparse
+import copy
+import time
+import uuid
+
+from app.database import SessionLocal
+from app.workflows import crud, models, schemas
+
+PREFIX = "benchmark-job"
+
+
+def conf_data(size):
+    return {
+        "workflow_form": {"single_execution": True, "username": PREFIX},
+        "data_form": {
+            "dataset_name": PREFIX,
+            "identifiers": [f"{PREFIX}.{i}" for i in range(size)],
+        },
+    }
+
+
+def legacy_create(db, db_kaapana_instance, db_workflow, conf):
+    db_jobs = []
+    for identifier in conf["data_form"]["identifiers"]:
+        single_conf_data = copy.deepcopy(conf)
+        single_conf_data["data_form"]["identifiers"] = [identifier]
+        job = schemas.JobCreate(
+            conf_data=single_conf_data,
+            dag_id=PREFIX,
+            username=PREFIX,
+            status="queued",
+            kaapana_instance_id=db_kaapana_instance.id,
+            owner_kaapana_instance_name=db_kaapana_instance.instance_name,
+            automatic_execution=False,
+        )
+        db_jobs.append(crud.create_job(db, job))
+    crud.put_workflow_jobs(
+        db,
+        schemas.WorkflowUpdate(
+            workflow_id=db_workflow.workflow_id,
+            workflow_name=db_workflow.workflow_name,
+            workflow_jobs=db_jobs,
+        ),
+    )
+
+
+def bulk_create(db, db_kaapana_instance, db_workflow, conf):
+    crud.bulk_create_jobs(
+        db,
+        db_kaapana_instance,
+        db_workflow,
+        [
+            {
+                "conf_data": {
+                    **conf,
+                    "data_form": {**conf["data_form"], "identifiers": [identifier]},
+                },
+                "dag_id": PREFIX,
+                "username": PREFIX,
+            }
+            for identifier in conf["data_form"]["identifiers"]
+        ],
+    )
+
+
+def measure(name, size, create):
+    db = SessionLocal()
+    workflow_id = f"{PREFIX}-{uuid.uuid4().hex[:8]}"
+    db_kaapana_instance = db.query(models.KaapanaInstance).filter_by(remote=False).one()
+    db_workflow = models.Workflow(
+        workflow_id=workflow_id,
+        workflow_name=workflow_id,
+        dag_id=PREFIX,
+        username=PREFIX,
+        automatic_execution=False,
+        kaapana_id=db_kaapana_instance.id,
+        time_created=crud.get_utc_timestamp(),
+        time_updated=crud.get_utc_timestamp(),
+    )
+    db.add(db_workflow)
+    db.commit()
+    conf = conf_data(size)
+    try:
+        start = time.perf_counter()
+        create(db, db_kaapana_instance, db_workflow, conf)
+        duration = time.perf_counter() - start
+    finally:
+        db.rollback()
+        db.query(models.Job).filter(models.Job.dag_id == PREFIX).delete(
+            synchronize_session=False
+        )
+        db.query(models.Workflow).filter_by(workflow_id=workflow_id).delete()
+        db.commit()
+        db.close()
+    print(f"{name:7s} n={size:8d} create={duration:8.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 20000])
+    parser.add_argument(
+        "--legacy-max-size",
+        type=int,
+        default=20000,
+        help="Skip the previous implementation for larger workflows.",
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        if size <= args.legacy_max_size:
+            measure("legacy", size, legacy_create)
+        measure("bulk", size, bulk_create)
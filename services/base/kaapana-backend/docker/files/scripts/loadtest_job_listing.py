@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Load test of the paginated job and workflow listing.
+
+Optionally seeds synthetic jobs into the database in DATABASE_URL, then lets concurrent clients
+walk through /client/jobs and /client/workflows page by page via the X-Next-Cursor header
+and reports latency percentiles per page and the throughput of the whole run.
+
+Runs inside the backend container, e.g.:
+    PYTHONPATH=$PWD python3 scripts/loadtest_job_listing.py --seed 100000 --clients 8
+    PYTHONPATH=$PWD python3 scripts/loadtest_job_listing.py --no-details --status finished
+"""
+
+import argparse
+import datetime
+import statistics
+import time
+import uuid
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+SEED_CHUNK_SIZE = 10000
+
+
+def seed_jobs(count, jobs_per_workflow):
+    from app.database import SessionLocal
+    from app.workflows import models
+
+    prefix = f"loadtest-{uuid.uuid4().hex[:8]}"
+    with SessionLocal() as db:
+        db_kaapana_instance = (
+            db.query(models.KaapanaInstance).filter_by(remote=False).one()
+        )
+        now = datetime.datetime.now(datetime.timezone.utc)
+        workflow_count = -(-count // jobs_per_workflow)
+        db.bulk_insert_mappings(
+            models.Workflow,
+            [
+                {
+                    "workflow_id": f"{prefix}-{i}",
+                    "workflow_name": f"{prefix}-{i}",
+                    "dag_id": "loadtest",
+                    "username": "loadtest",
+                    "kaapana_id": db_kaapana_instance.id,
+                    "time_created": now,
+                    "time_updated": now - datetime.timedelta(seconds=i),
+                }
+                for i in range(workflow_count)
+            ],
+        )
+        for start in range(0, count, SEED_CHUNK_SIZE):
+            db.bulk_insert_mappings(
+                models.Job,
+                [
+                    {
+                        "dag_id": "loadtest",
+                        "status": ("finished", "failed", "running")[i % 3],
+                        "run_id": f"{prefix}-{i}",
+                        "description": "x" * 4096,
+                        "conf_data": {"data_form": {"identifiers": [str(i)] * 50}},
+                        "username": "loadtest",
+                        "kaapana_id": db_kaapana_instance.id,
+                        "workflow_id": f"{prefix}-{i // jobs_per_workflow}",
+                        "time_created": now,
+                        "time_updated": now - datetime.timedelta(seconds=i),
+                    }
+                    for i in range(start, min(start + SEED_CHUNK_SIZE, count))
+                ],
+            )
+            db.commit()
+    print(f"Seeded {count} jobs in {workflow_count} workflows with prefix {prefix}")
+
+
+def walk_pages(url, params, max_pages):
+    latencies = []
+    cursor = None
+    with requests.Session() as s:
+        for _ in range(max_pages):
+            start = time.perf_counter()
+            r = s.get(url, params={**params, **({"cursor": cursor} if cursor else {})})
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            cursor = r.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+    return latencies
+
+
+def run(name, url, params, clients, max_pages):
+    start = time.perf_counter()
+    with ThreadPool(clients) as pool:
+        results = pool.map(lambda _: walk_pages(url, params, max_pages), range(clients))
+    duration = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result)
+    p50 = statistics.median(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(
+        f"{name:10s} pages={len(latencies):6d} p50={p50 * 1000:8.1f}ms "
+        f"p95={p95 * 1000:8.1f}ms max={latencies[-1] * 1000:8.1f}ms "
+        f"throughput={len(latencies) / duration:7.1f} pages/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:5000/client")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs-per-workflow", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--max-pages", type=int, default=200)
+    parser.add_argument("--status", default=None)
+    parser.add_argument("--dag-id", default=None)
+    parser.add_argument("--no-details", action="store_true")
+    args = parser.parse_args()
+
+    if args.seed > 0:
+        seed_jobs(args.seed, args.jobs_per_workflow)
+
+    job_params = {
+        "limit": args.page_size,
+        "include_details": not args.no_details,
+        **({"status": args.status} if args.status else {}),
+        **({"dag_id": args.dag_id} if args.dag_id else {}),
+    }
+    workflow_params = {
+        "limit": args.page_size,
+        **({"dag_id": args.dag_id} if args.dag_id else {}),
+    }
+    run("jobs", f"{args.url}/jobs", job_params, args.clients, args.max_pages)
+    run(
+        "workflows",
+        f"{args.url}/workflows",
+        workflow_params,
+        args.clients,
+        args.max_pages,
+    )
@@ -641,15 +641,17 @@ class SchedulerJobRunner(BaseJobRunner, LoggingMixin):
                             continue
                 (
                     util_service_success,
-                    gpu_device,
+                    scheduling_config,
                 ) = UtilService.check_operator_scheduling(
-                    task_instance=task_instance, logger=self.log
+                    task_instance=task_instance, logger=self.log, session=session
                 )
 
-                if util_service_success and gpu_device is not None:
-                    self.log.info("-> setting gpu_device in executor_config ...")
+                if util_service_success and scheduling_config is not None:
+                    self.log.info(
+                        f"-> setting {', '.join(scheduling_config)} in executor_config ..."
+                    )
                     new_config = dict(task_instance.executor_config)
-                    new_config["gpu_device"] = gpu_device
+                    new_config.update(scheduling_config)
                     task_instance.executor_config = new_config
                     session.merge(task_instance)
                     session.flush()
@@ -198,7 +198,10 @@ def _get_ti(
         ti_or_none is not None
         and hasattr(ti_or_none, "executor_config")
         and ti_or_none.executor_config is not None
-        and "gpu_device" in ti_or_none.executor_config
+        and (
+            "gpu_device" in ti_or_none.executor_config
+            or "node_affinity" in ti_or_none.executor_config
+        )
     ):
         log.info(f"Override TI executor_config: {ti_or_none.executor_config} !")
         override_executor_config = dict(ti_or_none.executor_config)
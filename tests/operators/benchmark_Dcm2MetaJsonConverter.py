@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of Dcm2MetaJsonConverter on synthetic DICOM JSON.
+
+Compares the conversion rate with and without memoized date/time parsing.
+Dates, times and station names are drawn from small pools, as they repeat across a real archive.
+
+Run from the repository root:
+    python -m tests.operators.benchmark_Dcm2MetaJsonConverter --docs 2000
+"""
+
+import argparse
+import logging
+import random
+import sys
+import time
+
+from pydicom.uid import generate_uid
+
+from .utils import mock_modules, PLUGIN_DIR, DICOM_TAG_DICT
+from .generator import generate_dcm
+
+sys.path.insert(0, str(PLUGIN_DIR))
+mock_modules()
+from kaapana.operators.Dcm2MetaJsonConverter import Dcm2MetaJsonConverter
+
+
+def synthetic_documents(count, distinct_values):
+    rng = random.Random(0)
+    dates = [f"2023{month:02d}{day:02d}" for month in range(1, 13) for day in (1, 15)]
+    times = [f"{hour:02d}{minute:02d}00" for hour in range(24) for minute in (0, 30)]
+    stations = [f"STATION{i}" for i in range(distinct_values)]
+    template = generate_dcm({}).to_json_dict()
+    documents = []
+    for _ in range(count):
+        date = rng.choice(dates[:distinct_values])
+        series_time = rng.choice(times[:distinct_values])
+        document = dict(template)
+        document.update(
+            generate_dcm(
+                {
+                    "SOPInstanceUID": generate_uid(),
+                    "StudyDate": date,
+                    "SeriesDate": date,
+                    "ContentDate": date,
+                    "StudyTime": series_time,
+                    "SeriesTime": series_time,
+                    "AcquisitionDateTime": f"{date}{series_time}.000000",
+                    "StationName": rng.choice(stations),
+                    "PixelSpacing": ["0.5", "0.5"],
+                    "ImagePositionPatient": [
+                        f"{rng.uniform(-200, 200):.6f}" for _ in range(3)
+                    ],
+                }
+            ).to_json_dict()
+        )
+        documents.append(document)
+    return documents
+
+
+def measure(name, converter, documents):
+    start = time.perf_counter()
+    for document in documents:
+        converter.dcmJson2metaJson(document)
+    duration = time.perf_counter() - start
+    print(
+        f"{name:10s} {len(documents) / duration:9.1f} docs/s ({duration:6.2f}s for {len(documents)} docs)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--distinct-values", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    documents = synthetic_documents(args.docs, args.distinct_values)
+    for name, cache_size in (("uncached", 0), ("memoized", 4096)):
+        converter = Dcm2MetaJsonConverter(
+            exception_on_error=False,
+            dict_path=str(DICOM_TAG_DICT),
+            cache_size=cache_size,
+        )
+        measure(name, converter, documents)
@@ -0,0 +1,164 @@
+"""
+Benchmark of HelperDcmWeb.downloadSeries against a simulated DICOMweb archive.
+
+Compares the throughput of the retrieval modes: WADO-URI requests per instance with
+different numbers of parallel downloads and a single WADO-RS request per series.
+The archive is served from memory on localhost, a round trip latency per request can be added
+to approximate an archive that is reached over the network.
+
+Run from the repository root:
+    python -m tests.operators.benchmark_HelperDcmWeb --instances 500 --instance-kb 512 --latency-ms 5
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+from urllib.parse import parse_qs, urlparse
+
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from .utils import PLUGIN_DIR
+
+sys.path.insert(0, str(PLUGIN_DIR))
+# requests is used for real, only the cluster configuration is not available
+sys.modules["kaapana.blueprints"] = MagicMock()
+sys.modules["kaapana.blueprints.kaapana_global_variables"] = MagicMock()
+from kaapana.operators.HelperDcmWeb import HelperDcmWeb
+
+APPLICATION_ENTITY = "KAAPANA"
+BOUNDARY = uuid.uuid4().hex
+
+
+def synthetic_instances(count, instance_kb):
+    study_uid = generate_uid()
+    series_uid = generate_uid()
+    instances = {}
+    for _ in range(count):
+        ds = Dataset()
+        ds.StudyInstanceUID = study_uid
+        ds.SeriesInstanceUID = series_uid
+        ds.SOPInstanceUID = generate_uid()
+        ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+        ds.PatientName = "Benchmark^DcmWeb"
+        ds.BitsAllocated = 8
+        ds.PixelData = bytes(instance_kb * 1024)
+        ds.file_meta = FileMetaDataset()
+        ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+        ds.file_meta.MediaStorageSOPClassUID = ds.SOPClassUID
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds.is_little_endian = True
+        ds.is_implicit_VR = False
+        buffer = io.BytesIO()
+        ds.save_as(buffer, write_like_original=False)
+        instances[ds.SOPInstanceUID] = buffer.getvalue()
+    return study_uid, series_uid, instances
+
+
+def archive_handler(study_uid, series_uid, instances, latency):
+    class ArchiveHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlparse(self.path)
+            if url.path.endswith("/rs/instances"):
+                body = json.dumps(
+                    [
+                        {
+                            "0020000D": {"vr": "UI", "Value": [study_uid]},
+                            "00080018": {"vr": "UI", "Value": [object_uid]},
+                            "00280008": {"vr": "IS"},
+                        }
+                        for object_uid in instances
+                    ]
+                ).encode()
+                self.respond(body, "application/dicom+json")
+            elif url.path.endswith("/wado"):
+                object_uid = parse_qs(url.query)["objectUID"][0]
+                self.respond(instances[object_uid], "application/dicom")
+            elif url.path.endswith(f"/series/{series_uid}"):
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type",
+                    f'multipart/related; type="application/dicom"; boundary={BOUNDARY}',
+                )
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for instance in instances.values():
+                    self.write_chunk(
+                        f"\r\n--{BOUNDARY}\r\nContent-Type: application/dicom\r\n\r\n".encode()
+                        + instance
+                    )
+                self.write_chunk(f"\r\n--{BOUNDARY}--\r\n".encode())
+                self.write_chunk(b"")
+            else:
+                self.send_error(404)
+
+        def respond(self, body, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        def log_message(self, format, *args):
+            pass
+
+    return ArchiveHandler
+
+
+def measure(name, helper, series_uid, instances, **kwargs):
+    target_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        # downloadSeries prints the object list of the series
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert helper.downloadSeries(series_uid, target_dir, **kwargs)
+        duration = time.perf_counter() - start
+    finally:
+        shutil.rmtree(target_dir)
+    megabytes = sum(len(instance) for instance in instances.values()) / 1024**2
+    print(
+        f"{name:14s} {duration:8.2f}s {len(instances) / duration:10.1f} instances/s {megabytes / duration:8.1f} MB/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--instances", type=int, default=500)
+    parser.add_argument("--instance-kb", type=int, default=512)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    study_uid, series_uid, instances = synthetic_instances(
+        args.instances, args.instance_kb
+    )
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        archive_handler(study_uid, series_uid, instances, args.latency_ms / 1000),
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    helper = HelperDcmWeb(APPLICATION_ENTITY, access_token="benchmark")
+    helper.dcmweb_endpoint = f"http://127.0.0.1:{server.server_port}/dcm4chee-arc/aets"
+    for parallel_instance_downloads in (1, 4, 10):
+        measure(
+            f"instances x{parallel_instance_downloads}",
+            helper,
+            series_uid,
+            instances,
+            parallel_instance_downloads=parallel_instance_downloads,
+        )
+    measure("series", helper, series_uid, instances, retrieval_mode="series")
+    server.shutdown()
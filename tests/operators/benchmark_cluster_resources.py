@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of the resource model behind UtilService.check_operator_scheduling on a simulated cluster.
+
+Compares the cost of a scheduling check that sums the requests of all pods (as done per list_pod scan)
+with reading the per-node totals of the ClusterResourceModel, and measures relisting, watch event handling
+and the bin-packing admission of a task.
+Kubernetes API latency of the scans is not included.
+
+Run from the repository root:
+    python -m tests.operators.benchmark_cluster_resources --pods 5000 --nodes 4
+"""
+
+import argparse
+import random
+import time
+
+from .test_cluster_resources import cluster_resources, create_node, create_pod
+
+
+def synthetic_pods(count, node_names):
+    rng = random.Random(0)
+    cpus = ["100m", "250m", "500m", "1", "2"]
+    memories = ["128Mi", "512Mi", "1Gi", "2Gi", "4Gi"]
+    return [
+        create_pod(
+            f"pod-{i}",
+            rng.choice(node_names),
+            cpu=rng.choice(cpus),
+            memory=rng.choice(memories),
+        )
+        for i in range(count)
+    ]
+
+
+def scan(pods, node_name):
+    totals = [0, 0, 0, 0, 0]
+    for pod in pods:
+        if pod.spec.node_name != node_name:
+            continue
+        for i, value in enumerate(cluster_resources.pod_resources(pod)):
+            totals[i] += value
+    return totals
+
+
+def measure(name, func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    duration = (time.perf_counter() - start) / repeat
+    print(f"{name:8s} {duration * 1e6:12.1f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pods", type=int, default=5000)
+    parser.add_argument("--nodes", type=int, default=4)
+    parser.add_argument("--checks", type=int, default=200)
+    args = parser.parse_args()
+
+    node_names = [f"node-{i}" for i in range(args.nodes)]
+    pods = synthetic_pods(args.pods, node_names)
+    model = cluster_resources.ClusterResourceModel()
+    # large enough for all pods, so that every admission succeeds
+    model.replace_nodes(
+        [create_node(node_name, cpu="10k", memory="100Ti") for node_name in node_names]
+    )
+
+    measure("relist", lambda: model.replace_pods(pods), 5)
+    events = iter([("DELETED", pod) for pod in pods] + [("ADDED", pod) for pod in pods])
+    measure("event", lambda: model.apply_pod_event(*next(events)), 2 * len(pods))
+    assert model.node_stats(node_names[0])["cpu_req"] == scan(pods, node_names[0])[0]
+    measure("scan", lambda: scan(pods, node_names[0]), args.checks)
+    measure("read", lambda: model.node_stats(node_names[0]), args.checks)
+    measure(
+        "admit",
+        lambda: model.release(model.admit(500, 1024**3)[1]),
+        args.checks,
+    )
@@ -0,0 +1,87 @@
+import sys
+
+import pytest
+
+from .utils import mock_modules, PLUGIN_DIR, DICOM_TAG_DICT
+from .generator import generate_dcm
+
+sys.path.insert(0, str(PLUGIN_DIR))
+mock_modules()
+from kaapana.operators.Dcm2MetaJsonConverter import (
+    Dcm2MetaJsonConverter,
+    Dcm2MetaJsonConversionException,
+)
+
+
+@pytest.fixture
+def converter():
+    return Dcm2MetaJsonConverter(
+        exception_on_error=False, dict_path=str(DICOM_TAG_DICT)
+    )
+
+
+def dicom_json(params={}):
+    return generate_dcm(params).to_json_dict()
+
+
+def test_dict_path_argument(converter):
+    assert converter.dict_path == str(DICOM_TAG_DICT)
+    assert converter.get_new_key("00080020") == "00080020 StudyDate"
+
+
+def test_temporal_values(converter):
+    meta = converter.replace_tags(
+        dicom_json(
+            {
+                "StudyDate": "20240205",
+                "StudyTime": "120000",
+                "AcquisitionDateTime": "20240205120000.000000",
+            }
+        )
+    )
+
+    assert meta["00080020 StudyDate_date"] == "2024-02-05"
+    assert meta["00080030 StudyTime_time"] == "12:00:00.000000"
+    # Berlin -> UTC
+    assert meta["0008002A AcquisitionDateTime_datetime"] == "2024-02-05 11:00:00.000000"
+
+
+def test_multi_valued_elements(converter):
+    meta = converter.replace_tags(
+        dicom_json(
+            {
+                "PixelSpacing": ["0.5", "0.75"],
+                "DateOfLastCalibration": ["20240101", "", "20240102"],
+            }
+        )
+    )
+
+    assert meta["00280030 PixelSpacing_float"] == [0.5, 0.75]
+    assert meta["00181200 DateofLastCalibration_date"] == ["2024-01-01", "2024-01-02"]
+
+
+def test_repeated_values_are_memoized(converter):
+    metadata = dicom_json()
+    first = converter.dcmJson2metaJson(metadata)
+    second = converter.dcmJson2metaJson(metadata)
+
+    assert first["timestamp"] == second["timestamp"]
+    assert converter.cache_stats()["parse_date"].hits > 0
+
+
+def test_memoization_disabled():
+    uncached = Dcm2MetaJsonConverter(
+        exception_on_error=False, dict_path=str(DICOM_TAG_DICT), cache_size=0
+    )
+    cached = Dcm2MetaJsonConverter(
+        exception_on_error=False, dict_path=str(DICOM_TAG_DICT)
+    )
+    metadata = dicom_json()
+
+    assert uncached.replace_tags(metadata) == cached.replace_tags(metadata)
+
+
+def test_unsupported_datetime_raises():
+    converter = Dcm2MetaJsonConverter(dict_path=str(DICOM_TAG_DICT))
+    with pytest.raises(Dcm2MetaJsonConversionException):
+        converter.replace_tags(dicom_json({"AcquisitionDateTime": "2024020512"}))
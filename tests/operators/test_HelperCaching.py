@@ -0,0 +1,36 @@
+import sys
+from types import SimpleNamespace
+
+from .utils import mock_modules, PLUGIN_DIR
+
+sys.path.insert(0, str(PLUGIN_DIR))
+mock_modules()
+from kaapana.operators.HelperCaching import get_params_digest
+
+
+def workflow_conf(workflow_id, **form):
+    workflow_form = {
+        "username": "kaapana",
+        "workflow_id": workflow_id,
+        "workflow_name": f"nnunet-predict-{workflow_id}",
+        "involved_instances": ["central"],
+        "runner_instances": ["central"],
+        **form,
+    }
+    return {"workflow_form": workflow_form, "form_data": dict(workflow_form)}
+
+
+def test_params_digest_ignores_workflow_identity():
+    operator = SimpleNamespace(task_id="nnunet-predict", model="Task001")
+
+    assert get_params_digest(operator, workflow_conf("abc123")) == get_params_digest(
+        operator, workflow_conf("xyz789")
+    )
+
+
+def test_params_digest_covers_workflow_form():
+    operator = SimpleNamespace(task_id="nnunet-predict", model="Task001")
+
+    assert get_params_digest(
+        operator, workflow_conf("abc123", threshold=0.5)
+    ) != get_params_digest(operator, workflow_conf("abc123", threshold=0.7))
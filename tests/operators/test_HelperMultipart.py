@@ -0,0 +1,84 @@
+import sys
+
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from .utils import mock_modules, PLUGIN_DIR
+
+sys.path.insert(0, str(PLUGIN_DIR))
+mock_modules()
+from kaapana.operators.HelperMultipart import (
+    get_multipart_boundary,
+    write_multipart_dicom,
+)
+
+BOUNDARY = "0f4c6e2a-boundary"
+CONTENT_TYPE = f'multipart/related; type="application/dicom"; boundary={BOUNDARY}'
+
+
+def create_instance(path):
+    ds = Dataset()
+    ds.SOPInstanceUID = generate_uid()
+    ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+    ds.PatientName = "Multipart^Test"
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+    ds.file_meta.MediaStorageSOPClassUID = ds.SOPClassUID
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.save_as(path, write_like_original=False)
+    return ds.SOPInstanceUID, path.read_bytes()
+
+
+def build_body(instances):
+    body = b"preamble"
+    for _, content in instances:
+        body += f"\r\n--{BOUNDARY}\r\nContent-Type: application/dicom\r\n\r\n".encode()
+        body += content
+    body += f"\r\n--{BOUNDARY}--\r\n".encode()
+    return body
+
+
+def chunked(data, chunk_size):
+    for i in range(0, len(data), chunk_size):
+        yield data[i : i + chunk_size]
+
+
+def test_get_multipart_boundary():
+    assert get_multipart_boundary(CONTENT_TYPE) == BOUNDARY.encode()
+    assert get_multipart_boundary('multipart/related; boundary="abc"') == b"abc"
+    with pytest.raises(ValueError):
+        get_multipart_boundary("application/dicom")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024, 1024 * 1024])
+def test_write_multipart_dicom(tmp_path, chunk_size):
+    source_dir = tmp_path / "source"
+    target_dir = tmp_path / "target"
+    source_dir.mkdir()
+    target_dir.mkdir()
+    instances = [create_instance(source_dir / f"{i}.dcm") for i in range(3)]
+
+    written_files = write_multipart_dicom(
+        chunked(build_body(instances), chunk_size), CONTENT_TYPE, str(target_dir)
+    )
+
+    assert len(written_files) == len(instances)
+    for sop_instance_uid, content in instances:
+        assert (target_dir / f"{sop_instance_uid}.dcm").read_bytes() == content
+    assert not list(target_dir.glob("*.part"))
+
+
+def test_write_multipart_dicom_truncated(tmp_path):
+    instances = [create_instance(tmp_path / "instance.dcm")]
+    target_dir = tmp_path / "target"
+    target_dir.mkdir()
+    body = build_body(instances)
+
+    with pytest.raises(ValueError):
+        write_multipart_dicom(
+            chunked(body[: len(body) // 2], 64), CONTENT_TYPE, str(target_dir)
+        )
+    assert not list(target_dir.iterdir())
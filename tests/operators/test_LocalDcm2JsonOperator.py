@@ -161,6 +161,57 @@ def test_plus_timezone_datetime(op):
         op.start()
 
 
+# BULK
+def test_bulk_aggregates_series(op):
+    from pydicom.uid import generate_uid
+
+    instance_paths = [
+        RUN_DIR / BATCH_NAME / "ct" / OPERATOR_IN_DIR / f"ct_{idx}.dcm"
+        for idx in range(3)
+    ]
+    sop_instance_uids = [generate_uid() for _ in instance_paths]
+    for idx, (path, sop_instance_uid) in enumerate(
+        zip(instance_paths, sop_instance_uids)
+    ):
+        generate_ct(
+            path,
+            {
+                "SOPInstanceUID": sop_instance_uid,
+                "InstanceNumber": idx,
+                "ImagePositionPatient": [0.0, 0.0, float(idx)],
+            },
+        )
+
+    op.bulk = True
+    try:
+        op.start()
+    finally:
+        for path in instance_paths:
+            path.unlink()
+    json_ct = read_ct()
+
+    # The ct.dcm of the fixture is sorted before the generated instances
+    assert json_ct["00080018 SOPInstanceUID_keyword"][1:] == sop_instance_uids
+    assert json_ct["00200013 InstanceNumber_integer"] == [0, 1, 2]
+    assert json_ct["00100020 PatientID_keyword"] == "123456"
+    # the coordinates of every position stay together
+    assert json_ct["00200032 ImagePosition(Patient)_float"] == [
+        [0.0, 0.0, 0.0],
+        [0.0, 0.0, 1.0],
+        [0.0, 0.0, 2.0],
+    ]
+
+
+# PARALLEL
+def test_parallel_processes(op):
+    op.parallel_processes = 2
+    op.start()
+
+    assert read_ct()["00080060 Modality_keyword"] == "CT"
+    assert read_seg()["00080060 Modality_keyword"] == "SEG"
+    assert read_rtst()["00080060 Modality_keyword"] == "RTSTRUCT"
+
+
 @pytest.mark.parametrize(
     "input_age, expected_output",
     [
@@ -0,0 +1,173 @@
+import importlib.util
+from types import SimpleNamespace
+
+import pytest
+
+from .utils import PLUGIN_DIR
+
+# loaded from its file, kaapana.kubetools is replaced by a mock in the other tests
+spec = importlib.util.spec_from_file_location(
+    "cluster_resources", PLUGIN_DIR / "kaapana/kubetools/cluster_resources.py"
+)
+cluster_resources = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(cluster_resources)
+
+
+def create_node(
+    name,
+    cpu="8",
+    memory="16Gi",
+    gpus=None,
+    memory_pressure="False",
+    unschedulable=None,
+):
+    capacity = {"cpu": cpu, "memory": memory}
+    if gpus is not None:
+        capacity["nvidia.com/gpu"] = gpus
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name),
+        spec=SimpleNamespace(unschedulable=unschedulable),
+        status=SimpleNamespace(
+            allocatable={"cpu": cpu, "memory": memory, "pods": "110"},
+            capacity=capacity,
+            conditions=[
+                SimpleNamespace(type="MemoryPressure", status=memory_pressure),
+                SimpleNamespace(type="DiskPressure", status="False"),
+            ],
+        ),
+    )
+
+
+def create_pod(
+    uid,
+    node_name,
+    cpu="500m",
+    memory="1Gi",
+    phase="Running",
+    gpus=None,
+    labels=None,
+):
+    limits = {"cpu": "1", "memory": memory}
+    if gpus is not None:
+        limits["nvidia.com/gpu"] = gpus
+    container = SimpleNamespace(
+        resources=SimpleNamespace(
+            requests={"cpu": cpu, "memory": memory}, limits=limits
+        )
+    )
+    return SimpleNamespace(
+        metadata=SimpleNamespace(uid=uid, labels=labels),
+        spec=SimpleNamespace(node_name=node_name, containers=[container, container]),
+        status=SimpleNamespace(phase=phase),
+    )
+
+
+@pytest.mark.parametrize(
+    "quantity, scale, expected",
+    [
+        ("250m", 1000, 250),
+        ("2", 1000, 2000),
+        ("0.5", 1000, 500),
+        ("1Ki", 1, 1024),
+        ("1.5Gi", 1, 1610612736),
+        ("128M", 1, 128000000),
+        ("1e3", 1, 1000),
+        ("100n", 1000, 1),
+        (None, 1, 0),
+    ],
+)
+def test_parse_quantity(quantity, scale, expected):
+    assert cluster_resources.parse_quantity(quantity, scale) == expected
+
+
+def test_parse_quantity_invalid():
+    with pytest.raises(ValueError):
+        cluster_resources.parse_quantity("12XB")
+
+
+def test_incremental_totals():
+    model = cluster_resources.ClusterResourceModel()
+    model.replace_nodes([create_node("node-1", gpus="2")])
+    model.replace_pods([create_pod("a", "node-1"), create_pod("b", None)])
+    model.apply_pod_event("ADDED", create_pod("c", "node-1", cpu="1", gpus="1"))
+
+    node = model.node_stats()
+    assert node["cpu_alloc"] == 8000
+    assert node["mem_alloc"] == 16 * 1024**3
+    assert node["gpu_dev_count"] == 2
+    assert node["cpu_req"] == 2 * 500 + 2 * 1000
+    assert node["cpu_lmt"] == 4 * 1000
+    assert node["mem_req"] == 4 * 1024**3
+    assert node["gpu_req"] == 2
+
+    # bound to a node, then finished and deleted
+    model.apply_pod_event("MODIFIED", create_pod("b", "node-1"))
+    assert model.node_stats("node-1")["cpu_req"] == 4000
+    model.apply_pod_event("MODIFIED", create_pod("b", "node-1", phase="Succeeded"))
+    model.apply_pod_event("DELETED", create_pod("a", "node-1"))
+    model.apply_pod_event("DELETED", create_pod("b", "node-1"))
+    node = model.node_stats("node-1")
+    assert node["cpu_req"] == 2000
+    assert node["mem_req"] == 2 * 1024**3
+    assert len(model.pods) == 1
+
+
+def test_node_events():
+    model = cluster_resources.ClusterResourceModel()
+    model.replace_pods([create_pod("a", "node-2")])
+    # pods bound before their node was seen are counted
+    model.apply_node_event("ADDED", create_node("node-2"))
+    assert model.node_stats("node-2")["cpu_req"] == 1000
+    model.apply_node_event("MODIFIED", create_node("node-2", memory_pressure="True"))
+    assert model.node_stats("node-2")["memory_pressure"]
+    assert model.node_stats("node-2")["cpu_req"] == 1000
+    model.apply_node_event("DELETED", create_node("node-2"))
+    assert model.node_stats("node-2") is None
+    assert model.node_stats() is None
+
+    # relisting replaces all totals
+    model.replace_nodes([create_node("node-2")])
+    model.replace_pods([create_pod("b", "node-2", cpu="2")])
+    assert model.node_stats()["cpu_req"] == 4000
+
+
+def test_admit_bin_packing():
+    model = cluster_resources.ClusterResourceModel()
+    model.replace_nodes(
+        [
+            create_node("small", cpu="4", memory="8Gi"),
+            create_node("large", cpu="16", memory="64Gi"),
+            create_node("cordoned", memory="64Gi", unschedulable=True),
+            create_node("pressure", memory="64Gi", memory_pressure="True"),
+        ]
+    )
+    model.replace_pods([create_pod("a", "small", memory="2Gi")])
+
+    # best fit on the small node while the task fits there
+    node_name, reservation_id = model.admit(mem_bytes=2 * 1024**3)
+    assert node_name == "small"
+    assert model.node_stats("small")["reserved_mem"] == 2 * 1024**3
+    assert model.admit(mem_bytes=3 * 1024**3)[0] == "large"
+    assert model.admit(cpu_millicores=17000, mem_bytes=1024**3) is None
+    assert model.admit(mem_bytes=1024**3, node_names=["cordoned"]) is None
+    assert model.cluster_stats()["nodes"] == 2
+    assert model.cluster_stats()["memory_pressure"]
+
+    # the reservation is replaced by the pod of the task
+    model.apply_pod_event(
+        "ADDED",
+        create_pod(
+            "b",
+            "small",
+            memory="1Gi",
+            labels={cluster_resources.RESERVATION_LABEL: reservation_id},
+        ),
+    )
+    node = model.node_stats("small")
+    assert node["reserved_mem"] == 0
+    assert node["mem_req"] == 6 * 1024**3
+    assert model.admit(mem_bytes=2 * 1024**3, mem_offset=0.05)[0] == "large"
+
+    model._expire_reservations(float("inf"))
+    assert model.reservations == {}
+    assert model.node_stats("large")["reserved_mem"] == 0
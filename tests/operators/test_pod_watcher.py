@@ -0,0 +1,52 @@
+import importlib.util
+import threading
+import time
+from types import SimpleNamespace
+
+from .utils import PLUGIN_DIR
+
+# loaded from its file, kaapana.kubetools is replaced by a mock in the other tests
+spec = importlib.util.spec_from_file_location(
+    "pod_watcher", PLUGIN_DIR / "kaapana/kubetools/pod_watcher.py"
+)
+pod_watcher = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pod_watcher)
+
+
+def create_pod(name, resource_version, phase="Pending"):
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name, resource_version=resource_version),
+        status=SimpleNamespace(phase=phase),
+    )
+
+
+def test_launcher_id():
+    launcher_id = pod_watcher.get_launcher_id()
+    assert 0 < len(launcher_id) <= 63
+    assert launcher_id[-1].isalnum()
+
+
+def test_wait_wakes_on_event():
+    watcher = pod_watcher.PodWatcher(client=None, namespace="jobs", launcher_id="1")
+    watcher.apply("ADDED", create_pod("pod-a", "1"))
+    assert watcher.read("pod-a").status.phase == "Pending"
+
+    # changed since the last read
+    watcher.apply("MODIFIED", create_pod("pod-a", "2", phase="Running"))
+    assert watcher.wait("pod-a", "1", timeout=5).status.phase == "Running"
+
+    threading.Timer(
+        0.1,
+        watcher.apply,
+        args=("MODIFIED", create_pod("pod-a", "3", phase="Succeeded")),
+    ).start()
+    start = time.monotonic()
+    assert watcher.wait("pod-a", "2", timeout=5).status.phase == "Succeeded"
+    assert time.monotonic() - start < 4
+
+    # unchanged pods are returned after the timeout
+    assert watcher.wait("pod-a", "3", timeout=0.1).metadata.resource_version == "3"
+
+    watcher.apply("DELETED", create_pod("pod-a", "4"))
+    assert watcher.read("pod-a") is None
+    assert watcher.wait("pod-a", "3", timeout=0.1) is None
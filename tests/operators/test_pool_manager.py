@@ -0,0 +1,85 @@
+import importlib.util
+
+import pytest
+from airflow.models.pool import Pool
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from .utils import PLUGIN_DIR
+
+spec = importlib.util.spec_from_file_location(
+    "pool_manager", PLUGIN_DIR / "kaapana/kubetools/pool_manager.py"
+)
+pool_manager = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(pool_manager)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+
+    # pysqlite does not begin transactions itself, which breaks savepoints
+    @event.listens_for(engine, "connect")
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def do_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    Pool.__table__.create(engine)
+    with Session(bind=engine) as session:
+        yield session
+
+
+def get_slots(session, pool_name):
+    return session.query(Pool.slots).filter(Pool.pool == pool_name).scalar()
+
+
+def test_set_pool(session):
+    manager = pool_manager.PoolManager(debounce_seconds=60)
+    assert manager.set_pool("NODE_RAM", 10000, "RAM", tolerance=512, session=session)
+    session.commit()
+    assert get_slots(session, "NODE_RAM") == 10000
+
+    # hysteresis
+    assert manager.set_pool("NODE_RAM", 10400, "RAM", tolerance=512, session=session)
+    assert get_slots(session, "NODE_RAM") == 10000
+
+    # debounced, retried by the next call
+    assert not manager.set_pool("NODE_RAM", 8000, "RAM", session=session)
+    assert get_slots(session, "NODE_RAM") == 10000
+    manager.time_last_resize["NODE_RAM"] -= 60
+    assert manager.set_pool("NODE_RAM", 8000, "RAM", session=session)
+    session.commit()
+    assert get_slots(session, "NODE_RAM") == 8000
+    assert manager.resizes == {"NODE_RAM": 2}
+
+
+def test_set_pool_rollback(session):
+    manager = pool_manager.PoolManager(debounce_seconds=60)
+    assert manager.set_pool("NODE_RAM", 10000, "RAM", session=session)
+    # the scheduler rolls back its transaction, e.g. on a lock error
+    session.rollback()
+    assert get_slots(session, "NODE_RAM") is None
+    assert manager.slots == {}
+    assert manager.resizes == {}
+
+    # neither skipped by the tolerance nor debounced
+    assert manager.set_pool("NODE_RAM", 10000, "RAM", session=session)
+    session.commit()
+    assert get_slots(session, "NODE_RAM") == 10000
+    assert manager.slots == {"NODE_RAM": 10000}
+    assert manager.resizes == {"NODE_RAM": 1}
+
+
+def test_set_pool_existing(session):
+    session.add(Pool(pool="NODE_CPU_CORES", slots=8000, include_deferred=False))
+    session.flush()
+    manager = pool_manager.PoolManager()
+    # the pool in the database is already up to date
+    assert manager.set_pool("NODE_CPU_CORES", 8000, "CPU", session=session)
+    session.commit()
+    assert manager.resizes == {}
+    assert manager.set_pool("NODE_CPU_CORES", 8000, "CPU", session=session)
+    assert manager.slots == {"NODE_CPU_CORES": 8000}
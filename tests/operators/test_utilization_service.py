@@ -0,0 +1,94 @@
+import importlib.util
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from .test_cluster_resources import create_node
+from .utils import PLUGIN_DIR
+
+
+def load_module(name):
+    spec = importlib.util.spec_from_file_location(
+        name, PLUGIN_DIR / f"kaapana/kubetools/{name}.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+cluster_resources = load_module("cluster_resources")
+# the Kubernetes client and Prometheus are not used by the admission
+with patch.dict(
+    "sys.modules",
+    {
+        "kubernetes": MagicMock(),
+        "kubernetes.client.models.v1_container_image": MagicMock(),
+        "kaapana.kubetools.cluster_resources": cluster_resources,
+        "kaapana.kubetools.pool_manager": load_module("pool_manager"),
+        "kaapana.kubetools.prometheus_query": MagicMock(),
+    },
+):
+    utilization_service = load_module("utilization_service")
+UtilService = utilization_service.UtilService
+
+
+@pytest.fixture
+def cluster(monkeypatch):
+    cluster = cluster_resources.ClusterResourceModel()
+    cluster.replace_nodes([create_node("node-1"), create_node("node-2")])
+    monkeypatch.setattr(UtilService, "cluster", cluster)
+    monkeypatch.setattr(UtilService, "last_update", datetime.now())
+    UtilService.update_resources()
+    return cluster
+
+
+def create_task_instance(ram_mem_mb, launches_pod=False):
+    executor_config = {
+        "cpu_millicores": None,
+        "ram_mem_mb": ram_mem_mb,
+        "gpu_mem_mb": None,
+        "enable_job_scheduler": True,
+    }
+    if launches_pod:
+        executor_config["launches_pod"] = True
+    return SimpleNamespace(task_id="task", executor_config=executor_config)
+
+
+def test_admit_local_tasks(cluster):
+    # e.g. KaapanaPythonBaseOperator, which never binds a pod to release a reservation
+    for _ in range(1000):
+        assert UtilService.check_operator_scheduling(create_task_instance(100)) == (
+            True,
+            {},
+        )
+    assert cluster.reservations == {}
+    assert not UtilService.check_operator_scheduling(create_task_instance(64 * 1024))[0]
+
+    success, config = UtilService.check_operator_scheduling(
+        create_task_instance(500, launches_pod=True)
+    )
+    assert success
+    assert config["node_affinity"]["reservation_id"] in cluster.reservations
+
+
+def test_admit_rollback(cluster):
+    with Session(bind=create_engine("sqlite://")) as session:
+        session.execute(text("SELECT 1"))
+        assert UtilService.check_operator_scheduling(
+            create_task_instance(500, launches_pod=True), session=session
+        )[0]
+        assert len(cluster.reservations) == 1
+        # the critical section of the scheduler is rolled back
+        session.rollback()
+        assert cluster.reservations == {}
+
+        session.execute(text("SELECT 1"))
+        success, config = UtilService.check_operator_scheduling(
+            create_task_instance(500, launches_pod=True), session=session
+        )
+        session.commit()
+        assert list(cluster.reservations) == [config["node_affinity"]["reservation_id"]]
@@ -11,6 +11,7 @@ def mock_modules():
     sys.modules["kaapana.kubetools.pod"] = MagicMock()
     sys.modules["kaapana.kubetools.pod_stopper"] = MagicMock()
     sys.modules["kaapana.kubetools.resources"] = MagicMock()
+    sys.modules["kaapana.kubetools.cluster_resources"] = MagicMock()
 
     # Flask
     sys.modules["requests"] = MagicMock()